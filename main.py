@@ -1,98 +1,171 @@
-import io
+import time
+
+# Taken before the other imports so the cold-start numbers include them
+STARTED_AT = time.perf_counter()
+
+import asyncio
+import importlib
 import logging
+from contextlib import asynccontextmanager
 from pathlib import Path
 
 import dotenv
-from fastapi import FastAPI, Request, Response, WebSocket
-from fastapi.responses import StreamingResponse
 
-from utils.action_handling import ActionHandler
-from utils.agent import ActionType, FunctionCaller
+# Several utils modules read their settings at import time, so .env has to be loaded first
+dotenv.load_dotenv()
+
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect
+from fastapi.responses import PlainTextResponse
+
 from utils.logging_config import setup_logging
-from utils.STT_utils import AudioTranscriptionHandler
-from utils.TTS_utils import stream_to_elevenlabs  # You'll need to implement this
+from utils.metrics import metrics
+from utils.rate_limits import LIVE, request_priority
 
 # Initialize logging
 setup_logging(log_file=Path("logs/app.log"), log_level="DEBUG")
 logger = logging.getLogger(__name__)
 
-dotenv.load_dotenv()
+# Only FastAPI, logging and metrics are imported up front. The agent (litellm, pydantic, action
+# handlers) and Deepgram are imported in a background thread once the server is accepting
+# connections, so a cold start isn't held up by them. Run `python profile_startup.py` to check.
+_first_accept = True
+
+
+def _import_subsystems():
+    """Import the heavy modules (blocking, run in a thread)."""
+    start = time.perf_counter()
+    agent_module = importlib.import_module("utils.agent")
+    stt_module = importlib.import_module("utils.STT_utils")
+    metrics.observe("startup_import_seconds", time.perf_counter() - start)
+    logger.info(f"Agent and transcription modules imported in {time.perf_counter() - start:.2f}s")
+    return agent_module.Agent, stt_module.AudioTranscriptionHandler
 
 
-app = FastAPI()
+async def _warm_up():
+    agent_class, transcription_class = await asyncio.to_thread(_import_subsystems)
+    # Keep the Google token fresh in the background so actions never wait on a refresh
+    google_auth = await asyncio.to_thread(importlib.import_module, "utils.api.google_auth")
+    google_auth.credential_store.start()
+    # One agent per process, so every connection shares the action executor and outbox
+    agent = agent_class()
+    agent.start()
+    await agent.action_handler.prewarm()
+    return agent, transcription_class
 
 
-async def determine_action(text: str):
-    """
-    Determine which action to take based on user input using the FunctionCaller.
-    Returns the action type and any additional details.
-    """
-    function_caller = FunctionCaller()
-    return await function_caller.determine_action(text)
+async def _sync_calendar() -> None:
+    """Bring the local calendar store up to date, so calendar actions read events locally."""
+    try:
+        calendar_store = await asyncio.to_thread(importlib.import_module, "utils.api.calendar_store")
+        google = await asyncio.to_thread(importlib.import_module, "utils.api.google")
+        await calendar_store.get_calendar_store().async_sync(await google.aget_google_api())
+    except Exception as e:
+        logger.warning(f"Calendar sync failed: {e}")
+
+
+async def _preload_contacts(participant_emails: list[str]) -> None:
+    """Add the session's participants, and the Google contacts once per process, so spoken names resolve."""
+    from utils.contact_directory import contact_directory
+
+    # Participants go in right away, the first request may come before Google answers
+    await contact_directory.preload(None, participant_emails)
+    try:
+        google = await asyncio.to_thread(importlib.import_module, "utils.api.google")
+        await contact_directory.preload(await google.aget_google_api(), [])
+    except Exception as e:
+        logger.warning(f"Google contacts unavailable, only participants can be resolved by name: {e}")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    app.state.warm_up = asyncio.create_task(_warm_up())
+    # Incremental, so after the first run this only fetches what changed since the last start
+    app.state.calendar_sync = asyncio.create_task(_sync_calendar())
+    logger.info(f"Server ready in {time.perf_counter() - STARTED_AT:.2f}s, warming up in the background")
+    yield
+    app.state.calendar_sync.cancel()
+    warm_up = app.state.warm_up
+    if not warm_up.done():
+        warm_up.cancel()
+    elif not warm_up.cancelled() and warm_up.exception() is None:
+        agent, _ = warm_up.result()
+        await agent.cleanup()
+        importlib.import_module("utils.api.google_auth").credential_store.stop()
+
+
+app = FastAPI(lifespan=lifespan)
+
+
+@app.get("/metrics")
+async def metrics_endpoint():
+    """Expose in-process metrics (LLM cache hit rates, saved latency, ...) in Prometheus format."""
+    return PlainTextResponse(metrics.render_prometheus())
 
 
 @app.websocket("/ws-audio")
 async def websocket_endpoint(websocket: WebSocket):
+    global _first_accept
     await websocket.accept()
     logger.info("New WebSocket connection accepted")
+    if _first_accept:
+        _first_accept = False
+        metrics.observe("startup_first_accept_seconds", time.perf_counter() - STARTED_AT)
+
+    # Comma-separated participant emails, e.g. /ws-audio?participants=a@x.com,b@y.com
+    participant_emails = [
+        email.strip() for email in websocket.query_params.get("participants", "").split(",") if email.strip()
+    ]
 
-    transcription_handler = AudioTranscriptionHandler()
-    function_caller = FunctionCaller()
-    action_handler = ActionHandler()
+    # Each connection runs in its own task, and everything on it is a live turn
+    request_priority.set(LIVE)
+
+    # Shielded so a client dropping mid-warm-up doesn't cancel it for everyone else
+    agent, transcription_class = await asyncio.shield(websocket.app.state.warm_up)
+    from utils.meeting_segments import SegmentStore, current_segments
+
+    # Catch-up material for this session only, inherited by the actions it starts
+    segments = SegmentStore()
+    current_segments.set(segments)
+    transcription_handler = transcription_class(on_utterance=segments.add_utterance)
+    # Held so the task isn't garbage collected mid-run
+    contacts = asyncio.create_task(_preload_contacts(participant_emails))
+
+    conversation_history = []
+    last_transcript = ""
 
     try:
         while True:
             audio_data = await websocket.receive_bytes()
-            # logger.debug(f"Received {len(audio_data)} bytes of audio data")
-
-            # Process the audio chunk
-            is_active, text, full_context = await transcription_handler.process_audio_chunk(audio_data)
-
-            if text:
-                logger.info(f"Transcribed text: {text}")
-
-                if is_active:
-                    logger.debug("System is actively listening")
-                    # Pass both the immediate text and context to determine_action
-                    action_type, details = await function_caller.determine_action(
-                        text, full_context
-                    )
-
-                    # Process the action and get response
-                    action_response = await action_handler.process_action(
-                        action_type, text, details
-                    )
-
-                    # Send response back to client
-                    response = {
-                        "transcription": text,
-                        "context": context,
-                        "action": action_type.value,
-                        "details": details,
-                        "response": action_response,
-                    }
-                    await websocket.send_json(response)
-                    logger.debug(f"Sent response: {response}")
-
-                    # Reset listening state after processing
-                    transcription_handler.reset_listening_state()
-                else:
-                    # Just send back transcription when not actively listening
-                    await websocket.send_json({"transcription": text})
-                    logger.debug(f"Sent transcription: {text}")
 
+            # Latest complete utterance, repeated until the next one arrives
+            transcript = await transcription_handler.process_audio_chunk(audio_data)
+            if not transcript or transcript == last_transcript or transcript.startswith("ElevenLabs:"):
+                continue
+
+            last_transcript = transcript
+            logger.info(f"Transcribed text: {transcript}")
+            conversation_history.append(f"User: {transcript}")
+
+            response_dict = await agent.call_llm(" ".join(conversation_history), participant_emails)
+            answer = response_dict.pop("answer", None)
+            if answer is not None:
+                # No speakers here, the client gets the web answer as text once it has streamed in
+                response_dict["response"] = "".join([chunk async for chunk in answer]).strip()
+            if response_dict.get("response"):
+                conversation_history.append(f"ElevenLabs: {response_dict['response']}")
+
+            response = {"transcription": transcript, **response_dict}
+            await websocket.send_json(response)
+            logger.debug(f"Sent response: {response}")
+
+    except WebSocketDisconnect:
+        logger.info("WebSocket client disconnected")
     except Exception as e:
         logger.exception(f"Error in WebSocket connection: {e}")
+        await websocket.close()
     finally:
         logger.info("Closing WebSocket connection")
         await transcription_handler.close()
-        await websocket.close()
-
-
-async def create_and_stream_audio(action: str):
-    # Stream to ElevenLabs
-    # Return response
-    pass
 
 
 if __name__ == "__main__":
@@ -5,6 +5,11 @@ import os
 import time
 from pathlib import Path
 
+import dotenv
+
+# Several utils modules read their settings at import time, so .env has to be loaded first
+dotenv.load_dotenv()
+
 import numpy as np
 import pyaudio
 from pydub import AudioSegment
@@ -14,17 +19,27 @@ from selenium.webdriver.common.keys import Keys
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.support.ui import WebDriverWait
 
-from utils.action_handling import ActionHandler
 from utils.agent import Agent
+from utils.api.calendar_store import get_calendar_store
+from utils.api.google import aget_google_api
+from utils.api.google_auth import credential_store
+from utils.browser_pool import amazon_browser_pool
+from utils.contact_directory import contact_directory
+from utils.live_minutes import LiveMinutes
+from utils.meeting_segments import SegmentStore, current_segments
 from utils.logging_config import setup_logging
+from utils.metrics import metrics
 from utils.post_meeting_items import send_post_meeting_email
+from utils.rate_limits import live_priority
 from utils.STT_utils import AudioTranscriptionHandler
-from utils.TTS_utils import handle_audio_output, handle_audio_to_microphone, stream_to_elevenlabs
+from utils.TTS_utils import handle_audio_output, handle_audio_to_microphone, speak_stream, stream_to_elevenlabs
 
 # Initialize logging
 setup_logging(log_file=Path("logs/meeting_agent.log"), log_level="INFO")
 logger = logging.getLogger(__name__)
 
+PARTICIPANT_EMAILS = ["haz@pally.com", "wylansford@gmail.com"]
+
 
 class MeetingAgent:
     def __init__(self):
@@ -42,13 +57,21 @@ class MeetingAgent:
         # Initialize audio components
         logger.info("Initializing audio components...")
         self.p = pyaudio.PyAudio()
-        self.transcription_handler = AudioTranscriptionHandler()
+        # Minutes are kept as the meeting goes, so the summary email is ready when it ends
+        self.minutes = LiveMinutes()
+        # Catch-up material for this meeting only
+        self.segments = SegmentStore()
+        self.transcription_handler = AudioTranscriptionHandler(on_utterance=self.on_utterance)
         self.function_caller = Agent()
-        self.action_handler = ActionHandler()
         self.driver = None
 
         logger.info("MeetingAgent initialization completed successfully")
 
+    def on_utterance(self, utterance: str):
+        """Feed each complete utterance to the live minutes and the catch-up segments."""
+        self.minutes.add_utterance(utterance)
+        self.segments.add_utterance(utterance)
+
     def setup_chrome(self):
         """Configure and return ChromeDriver with appropriate options"""
         logger.info("Setting up Chrome driver with custom options...")
@@ -210,7 +233,7 @@ class MeetingAgent:
 
                         logger.info("Calling LLM for response...")
                         response_dict = await self.function_caller.call_llm(
-                            full_context, ["haz@pally.com", "wylansford@gmail.com"]
+                            full_context, PARTICIPANT_EMAILS
                         )
 
                         response = response_dict.get("response")
@@ -223,6 +246,13 @@ class MeetingAgent:
                             await handle_audio_output(audio_data, output_mode="speak")
                             logger.info("Audio response playback completed")
 
+                        # Web answers stream in while the acknowledgement plays, then are spoken sentence by sentence
+                        answer = response_dict.get("answer")
+                        if answer is not None:
+                            response = await speak_stream(answer)
+                            print(f"\n💬 Answer: {response}")
+
+                        if response:
                             conversation_history.append(f"ElevenLabs: {response}")
 
                             logger.info("Reinitializing Deepgram connection...")
@@ -258,20 +288,47 @@ class MeetingAgent:
         try:
             logger.info("Closing transcription handler...")
             await self.transcription_handler.close()
+            logger.info("Waiting for background actions...")
+            await self.function_caller.cleanup()
             if self.p:
                 logger.info("Terminating PyAudio...")
                 self.p.terminate()
             if self.driver:
                 logger.info("Closing Chrome driver...")
                 self.driver.quit()
+            logger.info("Closing browser pool...")
+            await amazon_browser_pool.stop()
+            logger.info(f"Meeting metrics: {metrics.snapshot()}")
             logger.info("Cleanup completed successfully")
         except Exception as e:
             logger.error(f"Error during cleanup: {str(e)}", exc_info=True)
 
 
+async def sync_calendar():
+    """Bring the local calendar store up to date in the background once the meeting has started."""
+    try:
+        await get_calendar_store().async_sync(await aget_google_api())
+    except Exception as e:
+        logger.warning(f"Calendar sync failed: {e}")
+
+
+async def preload_contacts():
+    """Load participants and Google contacts so spoken names resolve without another LLM call."""
+    await contact_directory.preload(None, PARTICIPANT_EMAILS)
+    try:
+        await contact_directory.preload(await aget_google_api(), [])
+    except Exception as e:
+        logger.warning(f"Contact preload failed: {e}")
+
+
 async def main():
     logger.info("Starting main process...")
     agent = MeetingAgent()
+    current_segments.set(agent.segments)
+    # Keep the Google token fresh in the background so actions never wait on a refresh
+    credential_store.start()
+    # Replay actions that didn't finish before the last shutdown
+    agent.function_caller.start()
     try:
         meet_url = "https://meet.google.com/fbb-gsfv-osg?authuser=0"
         email = "elevenlabsagent@gmail.com"
@@ -280,20 +337,36 @@ async def main():
         # logger.info("Attempting to join meeting...")
         if await agent.join_meeting(meet_url, email, password):
             # logger.info("Successfully joined meeting, starting audio processing...")
-            await agent.process_audio()
+            # Warm the headless browsers used for Amazon orders
+            amazon_browser_pool.start()
+            # Hold references so the tasks aren't garbage collected mid-run
+            background = [
+                asyncio.create_task(sync_calendar()),
+                asyncio.create_task(preload_contacts()),
+                # Import action handlers now rather than on the first request
+                asyncio.create_task(agent.function_caller.action_handler.prewarm()),
+            ]
+            # The agent's replies, web answers and speech go ahead of background work on shared rate limits
+            with live_priority():
+                await agent.process_audio()
         # else:
         # logger.error("Failed to join meeting")
     except Exception as e:
         logger.exception("Critical error in main process")
     finally:
-        logger.info("Starting cleanup process...")
-        await agent.cleanup()
-
-        agent.transcription_handler._full_transcript
         full_transcript = agent.transcription_handler.get_full_transcript()
         print("full transcript is here:")
         print(full_transcript)
-        await send_post_meeting_email(full_transcript)
+        # Only the last few minutes are left to fold, so send while cleanup runs
+        email = asyncio.create_task(send_post_meeting_email(full_transcript, agent.minutes, PARTICIPANT_EMAILS))
+
+        logger.info("Starting cleanup process...")
+        await agent.cleanup()
+        try:
+            await email
+        except Exception:
+            logger.exception("Failed to send the post-meeting email")
+        credential_store.stop()
 
 
 # async def generate_email_summary(transcript, action_items):
@@ -0,0 +1,131 @@
+"""
+Profile cold start: which imports are slow, and how long until the server accepts a websocket.
+
+    python profile_startup.py                      # import breakdown of main.py + time to first accept
+    python profile_startup.py --module meeting_agent --no-server
+    python profile_startup.py --budget 1.0         # exit non-zero if the first accept takes longer
+"""
+
+import argparse
+import base64
+import os
+import socket
+import subprocess
+import sys
+import time
+from collections import defaultdict
+
+WS_PATH = "/ws-audio"
+
+
+def import_times(module: str) -> list[tuple[str, int, int]]:
+    """Run `python -X importtime -c "import <module>"` and return (name, self_us, cumulative_us) rows."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+    )
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:") :].split("|", 2)
+        rows.append((name.strip(), int(self_us), int(cumulative_us)))
+    if result.returncode != 0:
+        print(f"import {module} failed:\n{result.stderr.splitlines()[-1] if result.stderr else ''}")
+    return rows
+
+
+def print_import_report(module: str, top: int) -> None:
+    rows = import_times(module)
+    if not rows:
+        return
+    # The last row is the module itself, its cumulative time is the whole import
+    total_us = rows[-1][2]
+    print(f"\nimport {module}: {total_us / 1e6:.3f}s total")
+
+    # Top-level packages (litellm, deepgram, ...) are what lazy imports can actually move
+    by_package = defaultdict(int)
+    for name, self_us, _ in rows:
+        by_package[name.split(".")[0]] += self_us
+    print(f"\n{'package':<32}{'seconds':>10}{'share':>8}")
+    for package, self_us in sorted(by_package.items(), key=lambda item: -item[1])[:top]:
+        print(f"{package:<32}{self_us / 1e6:>10.3f}{self_us / total_us:>8.0%}")
+
+    print(f"\n{'slowest modules (cumulative)':<48}{'seconds':>10}")
+    for name, _, cumulative_us in sorted(rows, key=lambda row: -row[2])[:top]:
+        print(f"{name:<48}{cumulative_us / 1e6:>10.3f}")
+
+
+def websocket_accepted(port: int, timeout: float = 1.0) -> bool:
+    """Open a websocket handshake by hand and report whether the server switched protocols."""
+    key = base64.b64encode(os.urandom(16)).decode()
+    request = (
+        f"GET {WS_PATH} HTTP/1.1\r\n"
+        f"Host: 127.0.0.1:{port}\r\n"
+        "Upgrade: websocket\r\n"
+        "Connection: Upgrade\r\n"
+        f"Sec-WebSocket-Key: {key}\r\n"
+        "Sec-WebSocket-Version: 13\r\n\r\n"
+    )
+    try:
+        with socket.create_connection(("127.0.0.1", port), timeout=timeout) as sock:
+            sock.sendall(request.encode())
+            return b" 101 " in sock.recv(1024).split(b"\r\n", 1)[0]
+    except OSError:
+        return False
+
+
+def time_to_first_accept(app: str, port: int, timeout: float) -> float:
+    """Start uvicorn in a fresh interpreter and return seconds until a websocket handshake succeeds."""
+    start = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", app, "--port", str(port), "--log-level", "warning"],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        text=True,
+    )
+    try:
+        while time.perf_counter() - start < timeout:
+            if server.poll() is not None:
+                raise RuntimeError(f"Server exited early:\n{server.stderr.read()}")
+            if websocket_accepted(port):
+                return time.perf_counter() - start
+            time.sleep(0.01)
+        raise TimeoutError(f"No websocket accept within {timeout}s")
+    finally:
+        server.terminate()
+        try:
+            server.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            server.kill()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", default="main", help="Module to profile imports for")
+    parser.add_argument("--app", default="main:app", help="ASGI app to start for the accept timing")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--top", type=int, default=15, help="Rows to show per table")
+    parser.add_argument("--runs", type=int, default=3, help="Server cold starts to time")
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--budget", type=float, help="Fail if the median first accept exceeds this many seconds")
+    parser.add_argument("--no-server", action="store_true", help="Only profile imports")
+    args = parser.parse_args()
+
+    print_import_report(args.module, args.top)
+    if args.no_server:
+        return
+
+    timings = sorted(time_to_first_accept(args.app, args.port, args.timeout) for _ in range(args.runs))
+    median = timings[len(timings) // 2]
+    print(f"\ntime to first websocket accept ({args.app}): median {median:.3f}s, "
+          f"min {timings[0]:.3f}s, max {timings[-1]:.3f}s over {len(timings)} runs")
+
+    if args.budget is not None and median > args.budget:
+        print(f"Over the {args.budget:.2f}s budget")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+import asyncio
+
+from utils.action_executor import ActionExecutor, ActionStatus
+from utils.action_type import ActionType
+
+
+def test_higher_priority_action_takes_the_next_slot():
+    started = []
+
+    async def scenario():
+        executor = ActionExecutor(concurrency_limits={ActionType.NOTE_CREATION: 1})
+        release = asyncio.Event()
+
+        async def blocker():
+            started.append("blocker")
+            await release.wait()
+
+        def action(label):
+            async def run():
+                started.append(label)
+
+            return run
+
+        executor.submit(ActionType.NOTE_CREATION, blocker)
+        await asyncio.sleep(0)
+        low = executor.submit(ActionType.NOTE_CREATION, action("low"), priority=0)
+        high = executor.submit(ActionType.NOTE_CREATION, action("high"), priority=10)
+        await asyncio.sleep(0)
+        release.set()
+        await executor.wait_all()
+        assert executor.status(low)["status"] == executor.status(high)["status"] == "succeeded"
+
+    asyncio.run(scenario())
+    assert started == ["blocker", "high", "low"]
+
+
+def test_dependency_wait_does_not_count_against_the_deadline():
+    async def scenario():
+        executor = ActionExecutor()
+
+        async def ready():
+            await asyncio.sleep(0.2)
+
+        async def run():
+            return "done"
+
+        action_id = executor.submit(ActionType.NOTE_CREATION, run, deadline_seconds=0.1, ready=ready)
+        record = await executor.wait(action_id)
+        assert record.status == ActionStatus.SUCCEEDED
+        assert record.result == "done"
+
+    asyncio.run(scenario())
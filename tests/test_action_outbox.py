@@ -0,0 +1,69 @@
+import asyncio
+
+from utils.action_executor import ActionExecutor
+from utils.action_outbox import RUNNING, SUCCEEDED, ActionOutbox, idempotency_key
+from utils.action_type import ActionType
+
+TRANSCRIPT = "User: hey eleven labs email Lisa the deck"
+ARGUMENTS = {"to": ["Lisa"], "subject": "Deck"}
+
+
+class _CrashedExecutor:
+    """Takes actions and never runs them, like a process that died mid-send."""
+
+    def submit(self, *args, **kwargs):
+        return "lost"
+
+
+def test_duplicate_action_is_skipped(tmp_path):
+    calls = []
+
+    async def run(action_type, payload):
+        calls.append(payload["arguments"])
+        return "Sent"
+
+    async def scenario():
+        executor = ActionExecutor()
+        outbox = ActionOutbox(executor, run, db_path=tmp_path / "outbox.sqlite3")
+        first = outbox.submit(ActionType.EMAIL_CREATION, TRANSCRIPT, [], ARGUMENTS)
+        assert outbox.submit(ActionType.EMAIL_CREATION, TRANSCRIPT, [], ARGUMENTS) is None
+        await executor.wait(first)
+        # Still a duplicate once it has succeeded
+        assert outbox.submit(ActionType.EMAIL_CREATION, TRANSCRIPT, [], ARGUMENTS) is None
+        outbox.stop()
+
+    asyncio.run(scenario())
+    assert calls == [ARGUMENTS]
+
+
+def test_running_action_is_replayed_after_restart(tmp_path):
+    db_path = tmp_path / "outbox.sqlite3"
+    key = idempotency_key(ActionType.EMAIL_CREATION, TRANSCRIPT, ARGUMENTS)
+    calls = []
+
+    async def crash():
+        outbox = ActionOutbox(_CrashedExecutor(), None, db_path=db_path)
+        outbox.submit(ActionType.EMAIL_CREATION, TRANSCRIPT, ["lisa@example.com"], ARGUMENTS)
+        assert outbox._status(key) == RUNNING
+        outbox.stop()
+
+    async def restart():
+        replayed = asyncio.Event()
+
+        async def run(action_type, payload):
+            calls.append((action_type, payload["arguments"], payload["participant_emails"]))
+            replayed.set()
+            return "Sent"
+
+        executor = ActionExecutor()
+        outbox = ActionOutbox(executor, run, db_path=db_path)
+        outbox.start()
+        await asyncio.wait_for(replayed.wait(), timeout=5)
+        await executor.wait_all()
+        assert outbox._status(key) == SUCCEEDED
+        assert outbox.pending_count() == 0
+        outbox.stop()
+
+    asyncio.run(crash())
+    asyncio.run(restart())
+    assert calls == [(ActionType.EMAIL_CREATION, ARGUMENTS, ["lisa@example.com"])]
@@ -0,0 +1,24 @@
+from utils.action_type import ActionType
+from utils.agent import combine_responses, plan_dependencies
+
+
+def test_email_waits_for_calendar_event_by_default():
+    action_types = [ActionType.EMAIL_CREATION, ActionType.CALENDAR_EVENT]
+    assert plan_dependencies(action_types, [[], []]) == [[1], []]
+
+
+def test_dependency_cycle_is_broken():
+    action_types = [ActionType.EMAIL_CREATION, ActionType.CALENDAR_EVENT]
+    # The calendar event asks to go after the email, which already waits for the calendar event
+    dependencies = plan_dependencies(action_types, [[], ["email_creation"]])
+    assert dependencies in ([[1], []], [[], [0]])
+
+
+def test_unrelated_actions_run_independently():
+    action_types = [ActionType.NOTE_CREATION, ActionType.LINEAR_TASK]
+    assert plan_dependencies(action_types, [[], []]) == [[], []]
+
+
+def test_combine_responses_drops_blanks_and_repeats():
+    assert combine_responses(["Done.", "", None, "Done.", "Invite sent."]) == "Done. Invite sent."
+    assert combine_responses([None, " "]) is None
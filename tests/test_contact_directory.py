@@ -0,0 +1,37 @@
+from utils.contact_directory import ContactDirectory, soundex, trigrams
+
+
+def _directory():
+    directory = ContactDirectory()
+    directory.add("Lisa Chen", "lisa.chen@example.com")
+    directory.add("Louise Martin", "louise@example.com")
+    directory.add("Wyatt Lansford", "wylansford@example.com", "participant")
+    return directory
+
+
+def test_soundex_and_trigrams():
+    assert soundex("Lisa") == soundex("Leesa") == "L200"
+    assert soundex("Wyatt") == soundex("Wyat")
+    assert soundex("Lisa") != soundex("Mark")
+    assert trigrams("lisa") == {"  l", " li", "lis", "isa", "sa "}
+
+
+def test_exact_and_sound_alike_names_resolve():
+    directory = _directory()
+    assert directory.resolve("Lisa") == "lisa.chen@example.com"
+    assert directory.resolve("Wyat") == "wylansford@example.com"
+    assert directory.resolve("someone@example.com") == "someone@example.com"
+
+
+def test_sound_alike_name_matching_two_contacts_is_ambiguous():
+    directory = _directory()
+    email, options = directory.lookup("Leesa")
+    assert email is None
+    assert {contact.name for contact in options} == {"Lisa Chen", "Louise Martin"}
+    assert directory.clarify(["Leesa"]).startswith("Which Leesa do you mean")
+
+
+def test_unknown_name_asks_for_an_address():
+    directory = _directory()
+    assert directory.lookup("Bartholomew") == (None, [])
+    assert directory.clarify(["Bartholomew"]) == "What's Bartholomew's email address?"
@@ -0,0 +1,22 @@
+from utils.post_meeting_items import chunk_transcript, owns_action_item, split_utterances
+
+
+def test_chunks_keep_utterances_whole():
+    transcript = "\n".join(f"User: point number {i}" for i in range(20))
+    chunks = chunk_transcript(transcript, max_chars=100)
+    assert len(chunks) > 1
+    assert all(len(chunk) <= 100 for chunk in chunks)
+    assert "\n".join(chunks).splitlines() == split_utterances(transcript)
+
+
+def test_long_line_is_split_on_sentences():
+    transcript = "We shipped it. " * 2000
+    assert all(utterance == "We shipped it." for utterance in split_utterances(transcript))
+
+
+def test_owner_matches_at_the_start_or_in_the_owner_field():
+    aliases = {"lisa chen", "lisa", "chen"}
+    assert owns_action_item("Lisa to send the deck by Friday", aliases)
+    assert owns_action_item("Send the deck (Owner: Lisa, Due: Friday)", aliases)
+    assert not owns_action_item("Ask Lisa about pricing (Owner: Mark)", aliases)
+    assert not owns_action_item("Update the team wiki", {"jsmith"})
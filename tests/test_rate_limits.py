@@ -0,0 +1,51 @@
+import asyncio
+
+import pytest
+
+from utils.rate_limits import BACKGROUND, LIVE, TokenBucket, parse_wait_seconds
+
+
+def test_parse_wait_seconds():
+    assert parse_wait_seconds("1m30s") == 90
+    assert parse_wait_seconds("250ms") == 0.25
+    assert parse_wait_seconds("2") == 2
+    assert parse_wait_seconds(None) is None
+    assert parse_wait_seconds("soon") is None
+
+
+def test_live_waiter_is_served_before_background():
+    served = []
+
+    async def take(bucket, priority, label):
+        await bucket.acquire(priority)
+        served.append(label)
+
+    async def scenario():
+        bucket = TokenBucket("test", rate=20.0, capacity=1)
+        await bucket.acquire(LIVE)  # Empties the bucket
+        background = asyncio.create_task(take(bucket, BACKGROUND, "background"))
+        await asyncio.sleep(0)
+        live = asyncio.create_task(take(bucket, LIVE, "live"))
+        await asyncio.gather(background, live)
+
+    asyncio.run(scenario())
+    assert served == ["live", "background"]
+
+
+def test_cancelled_waiter_returns_the_token_it_was_served():
+    async def scenario():
+        bucket = TokenBucket("test", rate=0.01, capacity=1)
+        await bucket.acquire(LIVE)
+        waiter = asyncio.create_task(bucket.acquire(LIVE))
+        await asyncio.sleep(0)
+
+        # Hand the waiter a token, then cancel it before it gets to run
+        bucket.tokens = 1.0
+        bucket._dispatch()
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        assert bucket.tokens >= 1
+        assert await bucket.acquire(LIVE) == 0.0
+
+    asyncio.run(scenario())
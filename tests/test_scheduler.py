@@ -0,0 +1,50 @@
+import asyncio
+
+from utils.action_outbox import current_idempotency_key
+from utils.scheduler import DONE, RUNNING, TimerScheduler
+
+runs = []
+
+
+async def send_reminder(text):
+    """Scheduler target. The first run hangs, so the test can stop the scheduler mid-run."""
+    runs.append((text, current_idempotency_key.get()))
+    if len(runs) == 1:
+        await asyncio.Event().wait()
+
+
+async def _wait_for_status(scheduler, job_id, status):
+    for _ in range(500):
+        if scheduler.status(job_id)["status"] == status:
+            return
+        await asyncio.sleep(0.01)
+    raise AssertionError(f"Job never reached {status}: {scheduler.status(job_id)}")
+
+
+def test_job_cut_off_mid_run_is_replayed(tmp_path):
+    db_path = tmp_path / "scheduler.sqlite3"
+    runs.clear()
+
+    async def crash():
+        scheduler = TimerScheduler(db_path=db_path)
+        scheduler.start()
+        job_id = scheduler.schedule_in(0, f"{__name__}:send_reminder", {"text": "standup"})
+        await _wait_for_status(scheduler, job_id, RUNNING)
+        while not runs:
+            await asyncio.sleep(0.01)
+        scheduler.stop()
+        await asyncio.sleep(0)
+        assert scheduler.status(job_id)["status"] == RUNNING
+        return job_id
+
+    async def restart(job_id):
+        scheduler = TimerScheduler(db_path=db_path)
+        scheduler.start()
+        await _wait_for_status(scheduler, job_id, DONE)
+        assert scheduler.status(job_id)["attempts"] == 2
+        scheduler.stop()
+
+    job_id = asyncio.run(crash())
+    asyncio.run(restart(job_id))
+    # Both runs see the job ID, so a replayed send reuses the first attempt's provider-side IDs
+    assert runs == [("standup", job_id), ("standup", job_id)]
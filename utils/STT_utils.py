@@ -6,6 +6,8 @@ import threading
 import httpx
 from deepgram import DeepgramClient, LiveOptions, LiveTranscriptionEvents
 
+from utils.rate_limits import rate_limiter
+
 logger = logging.getLogger(__name__)
 
 
@@ -14,6 +16,7 @@ class AudioTranscriptionHandler:
         self,
         trigger_phrases={"hey eleven labs", "hey 11 labs", "hey eleven laps", "hey 11 laps"},
         buffer_size=10,
+        on_utterance=None,
     ):
         logger.info("Initialized AudioTranscriptionHandler")
         self.deepgram = DeepgramClient(os.environ.get("DEEPGRAM_API_KEY"))
@@ -26,9 +29,13 @@ class AudioTranscriptionHandler:
         self._full_transcript = []
         self._is_speaking = False
         self._current_utterance = []
+        # Called with each complete utterance, e.g. to keep live minutes
+        self.on_utterance = on_utterance
 
     async def initialize_connection(self):
         try:
+            # Reconnects after every spoken reply, so they count against Deepgram's limits too
+            await rate_limiter.acquire("deepgram")
             self.dg_connection = self.deepgram.listen.asyncwebsocket.v("1")
             parent = self
 
@@ -54,6 +61,8 @@ class AudioTranscriptionHandler:
                     parent._current_utterance = []
                     parent._is_speaking = False
                     logger.info(f"New complete utterance: {complete_utterance}")
+                    if parent.on_utterance is not None:
+                        parent.on_utterance(complete_utterance)
 
             async def on_open(self, open, **kwargs):
                 logger.info("🔌 Deepgram connection opened")
@@ -123,7 +132,8 @@ class AudioTranscriptionHandler:
 
     #
     def get_full_transcript(self) -> str:
-        return " ".join(self._full_transcript)
+        # One utterance per line, so summarization can chunk on utterance boundaries
+        return "\n".join(self._full_transcript)
 
 
 async def process_audio_to_text(audio_bytes: bytes):
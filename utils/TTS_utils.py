@@ -1,13 +1,17 @@
+import asyncio
 import io
 import logging
 import os
-from typing import Optional
+import re
+from typing import AsyncIterator, Optional
 
 import httpx
 import numpy as np
 import sounddevice as sd
 from pydub import AudioSegment
 
+from utils.rate_limits import rate_limiter
+
 logger = logging.getLogger(__name__)
 
 
@@ -33,9 +37,15 @@ async def stream_to_elevenlabs(text: str, voice_id: Optional[str] = None) -> byt
     }
 
     async with httpx.AsyncClient() as client:
-        logger.debug("Sending request to ElevenLabs API")
-        response = await client.post(url, json=data, headers=headers)
-        logger.info(f"ElevenLabs API Response Status: {response.status_code}")
+        for attempt in range(3):
+            # A 429 blocks the bucket until Retry-After, so the next acquire waits it out
+            await rate_limiter.acquire("elevenlabs", api_key)
+            logger.debug("Sending request to ElevenLabs API")
+            response = await client.post(url, json=data, headers=headers)
+            logger.info(f"ElevenLabs API Response Status: {response.status_code}")
+            rate_limiter.record_response("elevenlabs", response.headers, response.status_code, api_key)
+            if response.status_code != 429:
+                break
 
         if response.status_code == 400:
             error_detail = response.json()
@@ -47,6 +57,22 @@ async def stream_to_elevenlabs(text: str, voice_id: Optional[str] = None) -> byt
         return response.content
 
 
+def _play_audio(audio_data: bytes) -> None:
+    logger.debug("Converting audio format")
+    # Convert MP3 bytes to AudioSegment
+    audio_segment = AudioSegment.from_mp3(io.BytesIO(audio_data))
+    # Convert to raw PCM audio data
+    samples = audio_segment.get_array_of_samples()
+    # Convert to numpy array and ensure correct data type
+    audio_array = np.array(samples, dtype=np.float32) / 32768.0  # Normalize to [-1.0, 1.0]
+
+    # Start playing immediately
+    logger.info("Playing audio through speakers")
+    sd.play(audio_array, samplerate=audio_segment.frame_rate, blocking=False)
+    sd.wait()
+    logger.info("Finished playing audio")
+
+
 async def handle_audio_output(
     audio_data: bytes, output_mode: str = "speak", output_file: str = None
 ):
@@ -58,19 +84,8 @@ async def handle_audio_output(
         output_file: Path to save the file (required if output_mode is "save")
     """
     if output_mode == "speak":
-        logger.debug("Converting audio format")
-        # Convert MP3 bytes to AudioSegment
-        audio_segment = AudioSegment.from_mp3(io.BytesIO(audio_data))
-        # Convert to raw PCM audio data
-        samples = audio_segment.get_array_of_samples()
-        # Convert to numpy array and ensure correct data type
-        audio_array = np.array(samples, dtype=np.float32) / 32768.0  # Normalize to [-1.0, 1.0]
-
-        # Start playing immediately
-        logger.info("Playing audio through speakers")
-        sd.play(audio_array, samplerate=audio_segment.frame_rate, blocking=False)
-        sd.wait()
-        logger.info("Finished playing audio")
+        # Decoding and playback block, so run them off the event loop
+        await asyncio.to_thread(_play_audio, audio_data)
     elif output_mode == "save":
         if not output_file:
             raise ValueError("output_file must be specified when output_mode is 'save'")
@@ -82,6 +97,52 @@ async def handle_audio_output(
         raise ValueError("output_mode must be either 'speak' or 'save'")
 
 
+_SENTENCE_END = re.compile(r"[.!?](?:\s+|$)")
+_CITATION = re.compile(r"\s*\[\d+\]")
+
+
+async def iter_sentences(chunks: AsyncIterator[str], min_length: int = 20) -> AsyncIterator[str]:
+    """
+    Regroup streamed text into sentences for speech. Short sentences are merged so each
+    TTS request has enough text to sound natural. Citation markers like [1] are dropped.
+    """
+    buffer = ""
+    async for chunk in chunks:
+        buffer = _CITATION.sub("", buffer + chunk)
+        while True:
+            match = next(
+                (m for m in _SENTENCE_END.finditer(buffer) if m.end() >= min_length and m.end() < len(buffer)),
+                None,
+            )
+            if match is None:
+                break
+            sentence, buffer = buffer[: match.end()], buffer[match.end() :]
+            sentence = sentence.strip()
+            if sentence:
+                yield sentence
+    buffer = _CITATION.sub("", buffer).strip()
+    if buffer:
+        yield buffer
+
+
+async def speak_stream(chunks: AsyncIterator[str], output_mode: str = "speak") -> str:
+    """
+    Speak streamed text sentence by sentence, synthesizing the next sentence while the
+    current one plays. Returns everything that was spoken.
+    """
+    spoken = []
+    pending = None  # Synthesis of the sentence waiting to be played
+    async for sentence in iter_sentences(chunks):
+        spoken.append(sentence)
+        synthesis = asyncio.create_task(stream_to_elevenlabs(sentence))
+        if pending is not None:
+            await handle_audio_output(await pending, output_mode=output_mode)
+        pending = synthesis
+    if pending is not None:
+        await handle_audio_output(await pending, output_mode=output_mode)
+    return " ".join(spoken)
+
+
 async def handle_audio_to_microphone(audio_data: bytes, device_name: str = "MacBook Pro Microphone") -> None:
     """
     Stream audio to a specific microphone device
@@ -0,0 +1,263 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+import uuid
+from dataclasses import dataclass, field
+from enum import Enum
+from typing import Any, Awaitable, Callable, Optional
+
+from utils.action_type import ActionType
+from utils.rate_limits import BACKGROUND, LIVE, request_priority
+
+logger = logging.getLogger(__name__)
+
+# How many actions of each type may run at once. Browser sessions are expensive on a 1 GB VM.
+DEFAULT_CONCURRENCY_LIMITS = {
+    ActionType.AMAZON_ORDER: 1,
+    ActionType.CATCH_ME_UP: 2,
+    ActionType.EMAIL_CREATION: 3,
+    ActionType.CALENDAR_EVENT: 3,
+    ActionType.NOTE_CREATION: 2,
+    ActionType.LINEAR_TASK: 3,
+}
+
+# Higher runs first when actions of the same type are queued. Someone is waiting on catch-up.
+DEFAULT_PRIORITIES = {
+    ActionType.CATCH_ME_UP: 10,
+    ActionType.EMAIL_CREATION: 5,
+    ActionType.CALENDAR_EVENT: 5,
+    ActionType.LINEAR_TASK: 5,
+    ActionType.NOTE_CREATION: 5,
+    ActionType.AMAZON_ORDER: 0,
+}
+
+DEFAULT_DEADLINE_SECONDS = 300
+
+
+class ActionStatus(str, Enum):
+    PENDING = "pending"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+    CANCELLED = "cancelled"
+    EXPIRED = "expired"
+
+
+FINISHED_STATUSES = {
+    ActionStatus.SUCCEEDED,
+    ActionStatus.FAILED,
+    ActionStatus.CANCELLED,
+    ActionStatus.EXPIRED,
+}
+
+
+@dataclass
+class ActionRecord:
+    action_id: str
+    action_type: ActionType
+    priority: int
+    submitted_at: float
+    deadline: Optional[float]
+    status: ActionStatus = ActionStatus.PENDING
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    result: Any = None
+    error: Optional[str] = None
+    exception: Optional[Exception] = field(default=None, repr=False)
+    task: Optional[asyncio.Task] = field(default=None, repr=False)
+
+    def to_dict(self) -> dict:
+        return {
+            "action_id": self.action_id,
+            "action_type": self.action_type.value,
+            "priority": self.priority,
+            "status": self.status.value,
+            "queued_seconds": (self.started_at or self.finished_at or time.monotonic())
+            - self.submitted_at,
+            "run_seconds": (self.finished_at or time.monotonic()) - self.started_at
+            if self.started_at
+            else None,
+            "error": self.error,
+        }
+
+
+class _PrioritySlots:
+    """A semaphore that hands free slots to the highest-priority waiter first."""
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.in_use = 0
+        self._waiters = []  # heap of (-priority, seq, future)
+        self._seq = itertools.count()
+
+    async def acquire(self, priority: int) -> None:
+        if self.in_use < self.limit and not self._waiters:
+            self.in_use += 1
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (-priority, next(self._seq), future))
+        try:
+            await future
+        except asyncio.CancelledError:
+            # If the slot was handed over just as we were cancelled, pass it on
+            if future.done() and not future.cancelled():
+                self.release()
+            raise
+
+    def release(self) -> None:
+        while self._waiters:
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                future.set_result(None)  # Slot is handed over, in_use stays the same
+                return
+        self.in_use -= 1
+
+
+class ActionExecutor:
+    """
+    Runs actions in the background with per-action-type concurrency limits, priorities and
+    deadlines. Every submitted action gets an ID that can be used to inspect or cancel it.
+    """
+
+    def __init__(
+        self,
+        concurrency_limits: Optional[dict] = None,
+        default_limit: int = 2,
+        history_size: int = 100,
+    ):
+        self.concurrency_limits = {**DEFAULT_CONCURRENCY_LIMITS, **(concurrency_limits or {})}
+        self.default_limit = default_limit
+        self.history_size = history_size
+        self._slots = {}
+        self._records = {}  # action_id -> ActionRecord, in submission order
+
+    def _slots_for(self, action_type: ActionType) -> _PrioritySlots:
+        if action_type not in self._slots:
+            limit = self.concurrency_limits.get(action_type, self.default_limit)
+            self._slots[action_type] = _PrioritySlots(limit)
+        return self._slots[action_type]
+
+    def submit(
+        self,
+        action_type: ActionType,
+        run: Callable[[], Awaitable[Any]],
+        priority: Optional[int] = None,
+        deadline_seconds: Optional[float] = DEFAULT_DEADLINE_SECONDS,
+        on_done: Optional[Callable[[ActionRecord], None]] = None,
+        ready: Optional[Callable[[], Awaitable[Any]]] = None,
+    ) -> str:
+        """
+        Queue `run` as a background action and return its ID. `on_done` gets the finished record.
+        If `ready` is given, the action awaits it (e.g. other actions it depends on) before taking
+        a slot, and its deadline only starts counting once it returns.
+        """
+        now = time.monotonic()
+        record = ActionRecord(
+            action_id=uuid.uuid4().hex[:12],
+            action_type=action_type,
+            priority=priority if priority is not None else DEFAULT_PRIORITIES.get(action_type, 0),
+            submitted_at=now,
+            deadline=now + deadline_seconds if deadline_seconds else None,
+        )
+        record.task = asyncio.create_task(self._run(record, run, on_done, ready))
+        self._records[record.action_id] = record
+        self._prune_history()
+        logger.info(f"Queued action {record.action_id} ({action_type.value})")
+        return record.action_id
+
+    async def _run(
+        self,
+        record: ActionRecord,
+        run: Callable[[], Awaitable[Any]],
+        on_done: Optional[Callable[[ActionRecord], None]] = None,
+        ready: Optional[Callable[[], Awaitable[Any]]] = None,
+    ) -> Any:
+        slots = self._slots_for(record.action_type)
+        acquired = False
+        # Actions share API rate limits with live turns. Only ones someone is waiting on (catch-up) go first.
+        request_priority.set(LIVE if record.priority >= LIVE else BACKGROUND)
+        try:
+            if ready is not None:
+                waiting_since = time.monotonic()
+                await ready()
+                if record.deadline is not None:
+                    record.deadline += time.monotonic() - waiting_since
+
+            await asyncio.wait_for(slots.acquire(record.priority), timeout=self._remaining(record))
+            acquired = True
+
+            record.status = ActionStatus.RUNNING
+            record.started_at = time.monotonic()
+            record.result = await asyncio.wait_for(run(), timeout=self._remaining(record))
+            record.status = ActionStatus.SUCCEEDED
+            return record.result
+        except asyncio.TimeoutError:
+            record.status = ActionStatus.EXPIRED
+            record.error = "Deadline exceeded"
+            logger.warning(f"Action {record.action_id} ({record.action_type.value}) expired")
+        except asyncio.CancelledError:
+            record.status = ActionStatus.CANCELLED
+            logger.info(f"Action {record.action_id} ({record.action_type.value}) cancelled")
+        except Exception as e:
+            record.status = ActionStatus.FAILED
+            record.error = str(e)
+            record.exception = e
+            logger.exception(f"Action {record.action_id} ({record.action_type.value}) failed: {e}")
+        finally:
+            record.finished_at = time.monotonic()
+            if acquired:
+                slots.release()
+            if on_done is not None:
+                try:
+                    on_done(record)
+                except Exception as e:
+                    logger.exception(f"on_done callback for action {record.action_id} failed: {e}")
+
+    @staticmethod
+    def _remaining(record: ActionRecord) -> Optional[float]:
+        if record.deadline is None:
+            return None
+        return max(0.0, record.deadline - time.monotonic())
+
+    def _prune_history(self) -> None:
+        finished = [r for r in self._records.values() if r.status in FINISHED_STATUSES]
+        for record in finished[: max(0, len(self._records) - self.history_size)]:
+            del self._records[record.action_id]
+
+    def cancel(self, action_id: str) -> bool:
+        """Cancel a queued or running action. Returns False if it's unknown or already finished."""
+        record = self._records.get(action_id)
+        if record is None or record.status in FINISHED_STATUSES:
+            return False
+        record.task.cancel()
+        return True
+
+    def status(self, action_id: str) -> Optional[dict]:
+        record = self._records.get(action_id)
+        return record.to_dict() if record else None
+
+    def list_status(self, active_only: bool = False) -> list[dict]:
+        return [
+            record.to_dict()
+            for record in self._records.values()
+            if not active_only or record.status not in FINISHED_STATUSES
+        ]
+
+    @property
+    def active_count(self) -> int:
+        return sum(1 for r in self._records.values() if r.status not in FINISHED_STATUSES)
+
+    async def wait(self, action_id: str) -> ActionRecord:
+        """Wait for one action to finish and return its record."""
+        record = self._records[action_id]
+        await record.task
+        return record
+
+    async def wait_all(self) -> None:
+        """Wait for every queued and running action to finish."""
+        tasks = [r.task for r in self._records.values() if r.status not in FINISHED_STATUSES]
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
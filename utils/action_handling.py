@@ -1,46 +1,112 @@
+import asyncio
+import importlib
 import logging
+import time
+from typing import Awaitable, Callable, Optional
 
+from utils.action_outbox import PermanentActionError
+from utils.action_schemas import validate_action_arguments
 from utils.action_type import ActionType
-from utils.tasks.amazon_order_tasks import run_amazon_cart_process
-from utils.tasks.catch_up_tasks import handle_catch_me_up
-from utils.tasks.google_tasks import handle_calendar_event, handle_email_creation
-from utils.tasks.linear_tasks import handle_new_linear_task
-from utils.tasks.notion_tasks import handle_new_notion_note
+from utils.structured_output import StructuredOutputError
 
 logger = logging.getLogger(__name__)
 
+# Action handlers, as "module:function", imported on first use so startup doesn't pay for
+# selenium, the Google clients or notion_client. Every handler is called as
+# handler(transcript, participant_emails, arguments) with validated (or None) arguments.
+HANDLER_REGISTRY = {
+    ActionType.EMAIL_CREATION: "utils.tasks.google_tasks:handle_email_creation",
+    ActionType.CALENDAR_EVENT: "utils.tasks.google_tasks:handle_calendar_event",
+    ActionType.NOTE_CREATION: "utils.tasks.notion_tasks:handle_new_notion_note",
+    ActionType.LINEAR_TASK: "utils.tasks.linear_tasks:handle_new_linear_task",
+    ActionType.CATCH_ME_UP: "utils.tasks.catch_up_tasks:handle_catch_me_up",
+    ActionType.AMAZON_ORDER: "utils.tasks.amazon_order_tasks:handle_amazon_order",
+}
+
+Handler = Callable[..., Awaitable]
+
+# Shared by every ActionHandler, imports are process-wide anyway
+_loaded = {}  # "module:function" -> handler
+_unavailable = {}  # "module:function" -> import error
+
+
+def _import_handler(target: str) -> Handler:
+    if target in _loaded:
+        return _loaded[target]
+    if target in _unavailable:
+        raise _unavailable[target]
+
+    module_name, function_name = target.split(":")
+    start = time.perf_counter()
+    try:
+        handler = getattr(importlib.import_module(module_name), function_name)
+    except Exception as e:
+        # A missing integration only disables its own action
+        error = ImportError(f"Handler {target} is unavailable: {e}")
+        _unavailable[target] = error
+        raise error from e
+    logger.info(f"Loaded {target} in {time.perf_counter() - start:.2f}s")
+    _loaded[target] = handler
+    return handler
+
 
 class ActionHandler:
+    def __init__(self, registry: Optional[dict] = None):
+        self.registry = {**HANDLER_REGISTRY, **(registry or {})}
+
+    def register(self, action_type: ActionType, target) -> None:
+        """Register a handler, either as a "module:function" string or the function itself."""
+        self.registry[action_type] = target
+
+    def get_handler(self, action_type: ActionType) -> Optional[Handler]:
+        target = self.registry.get(action_type)
+        if target is None or callable(target):
+            return target
+        return _import_handler(target)
+
+    async def prewarm(self, action_types: Optional[list[ActionType]] = None) -> None:
+        """Import handlers in a worker thread ahead of time, e.g. right after joining a meeting."""
+        for action_type in action_types or list(self.registry):
+            target = self.registry.get(action_type)
+            if isinstance(target, str):
+                try:
+                    await asyncio.to_thread(_import_handler, target)
+                except ImportError as e:
+                    logger.warning(str(e))
+
     async def process_action(
-        self, action_type: ActionType, transcript: str, participant_emails: list[str]
+        self,
+        action_type: ActionType,
+        transcript: str,
+        participant_emails: list[str],
+        arguments: Optional[dict] = None,
     ) -> dict:
+        """
+        Run the action's handler. Raises PermanentActionError for failures a retry can't fix;
+        anything else comes back as {"success": False}.
+        """
         logger.info(f"Processing action of type: {action_type}")
         try:
-            if action_type == ActionType.EMAIL_CREATION:
-                result = await handle_email_creation(transcript)
-                return {"success": result}
-
-            elif action_type == ActionType.CALENDAR_EVENT:
-                result = await handle_calendar_event(transcript, participant_emails)
-                return {"success": result}
-
-            elif action_type == ActionType.NOTE_CREATION:
-                result = await handle_new_notion_note(transcript)
-                return {"success": result}
-
-            elif action_type == ActionType.LINEAR_TASK:
-                result = await handle_new_linear_task(transcript)
-                return {"success": result}
-            elif action_type == ActionType.CATCH_ME_UP:
-                result = await handle_catch_me_up(transcript)
-                return {"success": result}
-            elif action_type == ActionType.AMAZON_ORDER:
-                result = await run_amazon_cart_process(transcript)
-                return {"success": result}
-            else:
-                logger.warning(f"Received unknown action type: {action_type}")
-                return {"success": False}
+            handler = self.get_handler(action_type)
+            if handler is None:
+                raise PermanentActionError(f"Received unknown action type: {action_type}")
+
+            # Arguments extracted by the agent in the same call that chose the action.
+            # If they're missing or invalid, handlers fall back to extracting them from the transcript.
+            validated_arguments = validate_action_arguments(action_type, arguments)
+            if arguments is not None and validated_arguments is None:
+                logger.info(f"Falling back to transcript extraction for {action_type}")
+
+            result = await handler(transcript, participant_emails, validated_arguments)
+            return {"success": result}
 
+        except PermanentActionError:
+            raise
+        except ImportError as e:
+            raise PermanentActionError(str(e)) from e
+        except StructuredOutputError as e:
+            # The model couldn't produce valid arguments even after a repair attempt
+            raise PermanentActionError(f"Could not extract arguments for {action_type}: {e}") from e
         except Exception as e:
             logger.exception(f"Error processing action: {e}")
             return {"success": False}
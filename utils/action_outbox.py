@@ -0,0 +1,317 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import random
+import sqlite3
+import time
+import uuid
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Optional
+
+from utils.action_executor import ActionExecutor, ActionRecord, ActionStatus
+from utils.action_type import ActionType
+from utils.llm_cache import latest_request, transcript_fingerprint
+from utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+ACTION_OUTBOX_PATH = Path(os.getenv("ACTION_OUTBOX_PATH", "cache/action_outbox.sqlite3"))
+
+PENDING = "pending"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"  # Out of attempts
+CANCELLED = "cancelled"
+
+# Idempotency key of the outbox entry currently running, so API clients can pass it to providers
+current_idempotency_key: ContextVar[Optional[str]] = ContextVar("current_idempotency_key", default=None)
+
+# Only actions with lasting side effects are written down, retried and replayed. The rest (catch-up,
+# Amazon cart runs) belong to the meeting they were asked in, so they run once through the executor
+# and are never deduplicated or replayed into a later meeting.
+DURABLE_ACTIONS = {
+    ActionType.EMAIL_CREATION,
+    ActionType.CALENDAR_EVENT,
+    ActionType.LINEAR_TASK,
+    ActionType.NOTE_CREATION,
+}
+
+
+class PermanentActionError(Exception):
+    """
+    Raised by a handler for failures a retry can't fix, e.g. unresolved recipients or missing
+    fields. The entry fails straight away instead of being retried with backoff.
+    """
+
+
+def idempotency_key(
+    action_type: ActionType, transcript: str, arguments: Optional[dict] = None
+) -> str:
+    """Same request, same arguments, same point in the meeting -> same key."""
+    material = json.dumps(
+        {
+            "action": action_type.value,
+            "arguments": arguments,
+            "request": latest_request(transcript),
+            "context": transcript_fingerprint(transcript),
+        },
+        sort_keys=True,
+    )
+    return hashlib.sha1(material.encode("utf-8")).hexdigest()
+
+
+def calendar_event_id(key: str) -> str:
+    """Calendar event IDs must be base32hex, which hex digests already are."""
+    return f"ma{key}"
+
+
+def gmail_message_id(key: str) -> str:
+    return f"<{key}@meeting-agent>"
+
+
+def linear_issue_id(key: str) -> str:
+    return str(uuid.uuid5(uuid.NAMESPACE_URL, f"meeting-agent:{key}"))
+
+
+class ActionOutbox:
+    """
+    Durable SQLite outbox for side-effecting actions (DURABLE_ACTIONS). Actions are written before
+    they run, keyed by an idempotency key, and run through the ActionExecutor. Failed attempts are
+    retried with exponential backoff unless the handler raised PermanentActionError, and anything
+    still pending when the process died is replayed on start.
+
+    Calendar events, Gmail messages and Linear issues get provider-side IDs derived from the key,
+    so a replay after a crash mid-send finds the earlier result instead of sending twice.
+    """
+
+    def __init__(
+        self,
+        executor: ActionExecutor,
+        run: Callable[[ActionType, dict], Awaitable[Any]],
+        db_path: Path = ACTION_OUTBOX_PATH,
+        max_attempts: int = 5,
+        base_delay: float = 2.0,
+        max_delay: float = 300.0,
+    ):
+        self.executor = executor
+        self.run = run
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._wake: Optional[asyncio.Event] = None
+        self._loop_task: Optional[asyncio.Task] = None
+        self._settled = {}  # key -> Event set when the entry succeeds or gives up, for dependents
+        self._transient = {}  # key -> status of actions run without an outbox row
+
+        db_path = Path(db_path)
+        db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(str(db_path))
+        self._db.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS outbox (
+                key TEXT PRIMARY KEY,
+                action_type TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                status TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                next_attempt_at REAL NOT NULL,
+                last_error TEXT,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_outbox_due ON outbox (status, next_attempt_at);
+            """
+        )
+        self._db.commit()
+
+    def _update(self, key: str, **fields) -> None:
+        fields["updated_at"] = time.time()
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        self._db.execute(f"UPDATE outbox SET {assignments} WHERE key = ?", (*fields.values(), key))
+        self._db.commit()
+        self._settle(key, fields.get("status"))
+
+    def _settle(self, key: str, status: Optional[str]) -> None:
+        if status in (SUCCEEDED, FAILED, CANCELLED) and key in self._settled:
+            self._settled.pop(key).set()
+
+    def start(self) -> None:
+        """Replay interrupted and pending actions and start the retry loop. Safe to call more than once."""
+        if self._loop_task is not None and not self._loop_task.done():
+            return
+        # Rows for meeting-scoped actions, written before they stopped being persisted
+        dropped = self._db.execute(
+            f"""
+            UPDATE outbox SET status = ?, updated_at = ?
+            WHERE status IN (?, ?) AND action_type NOT IN ({", ".join("?" * len(DURABLE_ACTIONS))})
+            """,
+            (CANCELLED, time.time(), PENDING, RUNNING, *(a.value for a in DURABLE_ACTIONS)),
+        ).rowcount
+        # Anything marked running belongs to a process that is gone
+        interrupted = self._db.execute(
+            "UPDATE outbox SET status = ?, next_attempt_at = ? WHERE status = ?",
+            (PENDING, time.time(), RUNNING),
+        ).rowcount
+        self._db.commit()
+        if dropped:
+            logger.warning(f"Dropped {dropped} meeting-scoped actions left over from an earlier run")
+        if interrupted:
+            logger.warning(f"Replaying {interrupted} actions interrupted by a restart")
+        self._wake = asyncio.Event()
+        self._loop_task = asyncio.create_task(self._drain())
+
+    def stop(self) -> None:
+        if self._loop_task is not None:
+            self._loop_task.cancel()
+            self._loop_task = None
+
+    def submit(
+        self,
+        action_type: ActionType,
+        transcript: str,
+        participant_emails: list[str],
+        arguments: Optional[dict] = None,
+        after_keys: Optional[list[str]] = None,
+    ) -> Optional[str]:
+        """
+        Record a durable action and dispatch it right away; other actions are dispatched without
+        a record. Either way it waits for the entries in `after_keys` to settle before it takes
+        an executor slot. Returns the executor's action ID, or None if the same durable action
+        is already queued, running or done.
+        """
+        self.start()
+        key = idempotency_key(action_type, transcript, arguments)
+        payload = {
+            "transcript": transcript,
+            "participant_emails": participant_emails,
+            "arguments": arguments,
+            "after": after_keys or [],
+        }
+        if action_type not in DURABLE_ACTIONS:
+            return self._dispatch_transient(key, action_type, payload)
+
+        row = self._db.execute("SELECT status FROM outbox WHERE key = ?", (key,)).fetchone()
+        if row and row[0] in (PENDING, RUNNING, SUCCEEDED):
+            logger.info(f"Skipping duplicate {action_type.value} action {key[:12]} ({row[0]})")
+            metrics.increment("action_outbox_duplicates_total", action=action_type.value)
+            return None
+
+        now = time.time()
+        self._db.execute(
+            """
+            INSERT OR REPLACE INTO outbox
+                (key, action_type, payload, status, attempts, next_attempt_at, created_at, updated_at)
+            VALUES (?, ?, ?, ?, 0, ?, ?, ?)
+            """,
+            (key, action_type.value, json.dumps(payload), PENDING, now, now, now),
+        )
+        self._db.commit()
+        return self._dispatch(key, action_type, payload)
+
+    def _dispatch(self, key: str, action_type: ActionType, payload: dict) -> str:
+        self._db.execute(
+            "UPDATE outbox SET status = ?, attempts = attempts + 1, updated_at = ? WHERE key = ?",
+            (RUNNING, time.time(), key),
+        )
+        self._db.commit()
+        return self.executor.submit(
+            action_type,
+            lambda: self._attempt(key, action_type, payload),
+            ready=lambda: self._wait_for(payload.get("after") or []),
+            on_done=lambda record: self._finished(key, record),
+        )
+
+    def _dispatch_transient(self, key: str, action_type: ActionType, payload: dict) -> str:
+        self._transient[key] = RUNNING
+
+        def finished(record: ActionRecord) -> None:
+            status = SUCCEEDED if record.status == ActionStatus.SUCCEEDED else FAILED
+            self._transient[key] = status
+            self._settle(key, status)
+
+        return self.executor.submit(
+            action_type,
+            lambda: self._attempt(key, action_type, payload),
+            ready=lambda: self._wait_for(payload.get("after") or []),
+            on_done=finished,
+        )
+
+    def _status(self, key: str) -> Optional[str]:
+        if key in self._transient:
+            return self._transient[key]
+        row = self._db.execute("SELECT status FROM outbox WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    async def _wait_for(self, keys: list[str]) -> None:
+        """Wait until every entry in `keys` has succeeded or given up."""
+        for key in keys:
+            while self._status(key) not in (None, SUCCEEDED, FAILED, CANCELLED):
+                event = self._settled.setdefault(key, asyncio.Event())
+                await event.wait()
+            if self._status(key) != SUCCEEDED:
+                logger.warning(f"Dependency {key[:12]} did not succeed, running the dependent action anyway")
+
+    async def _attempt(self, key: str, action_type: ActionType, payload: dict) -> Any:
+        token = current_idempotency_key.set(key)
+        try:
+            return await self.run(action_type, payload)
+        finally:
+            current_idempotency_key.reset(token)
+
+    def _finished(self, key: str, record: ActionRecord) -> None:
+        if record.status == ActionStatus.SUCCEEDED:
+            self._update(key, status=SUCCEEDED, last_error=None)
+            metrics.increment("action_outbox_succeeded_total", action=record.action_type.value)
+        elif isinstance(record.exception, PermanentActionError):
+            logger.error(f"Not retrying {record.action_type.value} action {key[:12]}: {record.error}")
+            metrics.increment("action_outbox_failed_total", action=record.action_type.value)
+            self._update(key, status=FAILED, last_error=record.error)
+        elif record.status == ActionStatus.FAILED:
+            self._schedule_retry(key, record.action_type, record.error)
+        else:
+            # Cancelled by the user or past its deadline, either way it shouldn't be replayed
+            self._update(key, status=CANCELLED, last_error=record.error)
+
+    def _schedule_retry(self, key: str, action_type: ActionType, error: str) -> None:
+        attempts = self._db.execute("SELECT attempts FROM outbox WHERE key = ?", (key,)).fetchone()[0]
+        if attempts >= self.max_attempts:
+            logger.error(f"Giving up on {action_type.value} action {key[:12]} after {attempts} attempts: {error}")
+            metrics.increment("action_outbox_failed_total", action=action_type.value)
+            self._update(key, status=FAILED, last_error=error)
+            return
+
+        delay = min(self.max_delay, self.base_delay * 2 ** (attempts - 1)) * random.uniform(0.8, 1.2)
+        logger.warning(f"Retrying {action_type.value} action {key[:12]} in {delay:.1f}s: {error}")
+        metrics.increment("action_outbox_retries_total", action=action_type.value)
+        self._update(key, status=PENDING, next_attempt_at=time.time() + delay, last_error=error)
+        if self._wake is not None:
+            self._wake.set()
+
+    async def _drain(self) -> None:
+        """Dispatch due entries, then sleep until the next one is due or a retry is scheduled."""
+        while True:
+            now = time.time()
+            due = self._db.execute(
+                "SELECT key, action_type, payload FROM outbox WHERE status = ? AND next_attempt_at <= ?",
+                (PENDING, now),
+            ).fetchall()
+            for key, action_type, payload in due:
+                self._dispatch(key, ActionType(action_type), json.loads(payload))
+
+            upcoming = self._db.execute(
+                "SELECT MIN(next_attempt_at) FROM outbox WHERE status = ?", (PENDING,)
+            ).fetchone()[0]
+            timeout = max(0.0, upcoming - time.time()) if upcoming is not None else None
+            self._wake.clear()
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    def pending_count(self) -> int:
+        return self._db.execute(
+            "SELECT COUNT(*) FROM outbox WHERE status IN (?, ?)", (PENDING, RUNNING)
+        ).fetchone()[0]
@@ -0,0 +1,181 @@
+import logging
+from datetime import date, datetime
+from typing import List, Optional
+
+from pydantic import BaseModel, Field, ValidationError, field_validator
+
+from utils.action_type import ActionType
+
+logger = logging.getLogger(__name__)
+
+
+class NoActionArgs(BaseModel):
+    pass
+
+
+class RequestInfoArgs(BaseModel):
+    pass
+
+
+class WebSearchArgs(BaseModel):
+    query: str = Field(min_length=1, description="The query to search the web for")
+
+
+class EmailArgs(BaseModel):
+    to: List[str] = Field(min_length=1, description="Email addresses or names of the recipients")
+    subject: str = Field(min_length=1, description="The subject of the email")
+    body: str = Field(min_length=1, description="The body of the email")
+    send_at: Optional[str] = Field(
+        default=None,
+        description='When to send it, in ISO format, if the user asked for later, e.g. "2024-03-25T15:00:00+00:00"',
+    )
+
+    @field_validator("send_at")
+    @classmethod
+    def check_send_at(cls, value: Optional[str]) -> Optional[str]:
+        if value:
+            datetime.fromisoformat(value.replace("Z", "+00:00"))
+        return value or None
+
+
+class CalendarEventArgs(BaseModel):
+    title: str = Field(min_length=1, description="The title of the event")
+    location: str = Field(default="", description="The location of the event")
+    description: str = Field(min_length=1, description="The description of the event")
+    start_time: str = Field(description='Start time in ISO format, e.g. "2024-03-25T14:00:00+00:00"')
+    end_time: str = Field(description='End time in ISO format, e.g. "2024-03-25T15:00:00+00:00"')
+    attendee_emails: List[str] = Field(min_length=1, description="Email addresses or names of the attendees")
+
+    @field_validator("start_time", "end_time")
+    @classmethod
+    def check_iso_datetime(cls, value: str) -> str:
+        datetime.fromisoformat(value.replace("Z", "+00:00"))
+        return value
+
+
+class NoteArgs(BaseModel):
+    title: str = Field(min_length=1, description="The title of the note")
+    content: str = Field(min_length=1, description="The detailed content of the note")
+
+
+class LinearTaskArgs(BaseModel):
+    title: str = Field(min_length=1, description="The title of the task")
+    description: str = Field(min_length=1, description="The description of the task")
+    priority: int = Field(
+        ge=0, le=4, description="Priority: 0 none, 1 urgent, 2 high, 3 medium, 4 low"
+    )
+    due_date: str = Field(description='Due date in ISO 8601 format, e.g. "2024-03-25"')
+
+    @field_validator("due_date")
+    @classmethod
+    def check_iso_date(cls, value: str) -> str:
+        date.fromisoformat(value[:10])
+        return value[:10]
+
+
+class CatchMeUpArgs(BaseModel):
+    minutes: Optional[int] = Field(
+        default=None,
+        ge=1,
+        description='How many recent minutes to cover if the user said, e.g. 10 for "the last 10 minutes". Leave empty for the whole meeting',
+    )
+
+
+class AmazonOrderArgs(BaseModel):
+    query: str = Field(min_length=1, description="Description of the product to add to the cart")
+
+
+ACTION_ARGUMENT_MODELS = {
+    ActionType.NO_ACTION: NoActionArgs,
+    ActionType.REQUEST_INFO: RequestInfoArgs,
+    ActionType.WEB_SEARCH: WebSearchArgs,
+    ActionType.EMAIL_CREATION: EmailArgs,
+    ActionType.CALENDAR_EVENT: CalendarEventArgs,
+    ActionType.NOTE_CREATION: NoteArgs,
+    ActionType.LINEAR_TASK: LinearTaskArgs,
+    ActionType.CATCH_ME_UP: CatchMeUpArgs,
+    ActionType.AMAZON_ORDER: AmazonOrderArgs,
+}
+
+ACTION_DESCRIPTIONS = {
+    ActionType.NO_ACTION: "Do nothing. Use this if the user hasn't explicitly asked ElevenLabs to do anything.",
+    ActionType.REQUEST_INFO: "Request more information from the user.",
+    ActionType.WEB_SEARCH: "Search the web for information on a specific topic.",
+    ActionType.EMAIL_CREATION: "Create and send a new email.",
+    ActionType.CALENDAR_EVENT: "Create a calendar event.",
+    ActionType.NOTE_CREATION: "Create a new note or document.",
+    ActionType.LINEAR_TASK: "Create a new task in Linear.",
+    ActionType.CATCH_ME_UP: "Give a summary of what has happened so far in the meeting.",
+    ActionType.AMAZON_ORDER: "Add an item to the Amazon cart.",
+}
+
+RESPONSE_DESCRIPTION = (
+    "What to say back to the meeting. For REQUEST_INFO, let them know what you need. "
+    "Otherwise, let them know what you will do next with as little detail as possible, "
+    "ie. I created the task, I sent the email, I added the event to the calendar, etc..."
+)
+
+
+# Actions that run in the background and can be combined in one turn
+BACKGROUND_ACTIONS = [
+    ActionType.EMAIL_CREATION,
+    ActionType.CALENDAR_EVENT,
+    ActionType.NOTE_CREATION,
+    ActionType.LINEAR_TASK,
+    ActionType.CATCH_ME_UP,
+    ActionType.AMAZON_ORDER,
+]
+
+AFTER_DESCRIPTION = (
+    "Other actions requested in this same turn that must finish before this one starts, "
+    "e.g. calendar_event for an email that mentions the invite. Leave empty if the order doesn't matter."
+)
+
+
+def build_action_tools() -> list[dict]:
+    """
+    Build one function-calling tool per action, each taking a spoken `response` plus the action's
+    arguments. Background actions also take an optional `after` dependency hint.
+    """
+    tools = []
+    for action_type, model in ACTION_ARGUMENT_MODELS.items():
+        schema = model.model_json_schema()
+        properties = {"response": {"type": "string", "description": RESPONSE_DESCRIPTION}}
+        properties.update(schema.get("properties", {}))
+        if action_type in BACKGROUND_ACTIONS:
+            properties["after"] = {
+                "type": "array",
+                "items": {"type": "string", "enum": [a.value for a in BACKGROUND_ACTIONS]},
+                "description": AFTER_DESCRIPTION,
+            }
+        required = ["response"] + schema.get("required", [])
+        tools.append(
+            {
+                "type": "function",
+                "function": {
+                    "name": action_type.value,
+                    "description": ACTION_DESCRIPTIONS[action_type],
+                    "parameters": {
+                        "type": "object",
+                        "properties": properties,
+                        "required": required,
+                    },
+                },
+            }
+        )
+    return tools
+
+
+def validate_action_arguments(
+    action_type: ActionType, arguments: Optional[dict]
+) -> Optional[BaseModel]:
+    """Validate tool-call arguments for an action. Returns None if they're missing or invalid."""
+    model = ACTION_ARGUMENT_MODELS.get(action_type)
+    if model is None or arguments is None:
+        return None
+
+    try:
+        return model.model_validate(arguments)
+    except ValidationError as e:
+        logger.warning(f"Invalid arguments for {action_type}: {e}")
+        return None
@@ -1,162 +1,342 @@
 import asyncio
-import json
 import logging
-import os
-from pathlib import Path
-from typing import Any, Dict
-
-import dotenv
-import litellm
+import time
+from datetime import datetime, timezone
+from typing import Any, AsyncIterator, Dict, Optional
 
+from utils.action_executor import ActionExecutor, ActionStatus
 from utils.action_handling import ActionHandler
+from utils.action_outbox import ActionOutbox, idempotency_key
+from utils.action_schemas import (
+    BACKGROUND_ACTIONS,
+    build_action_tools,
+    validate_action_arguments,
+)
 from utils.action_type import ActionType
-from utils.api.perplexity import perplexity_search
-from utils.logging_config import setup_logging
-from utils.post_meeting_items import send_post_meeting_email
-from utils.TTS_utils import handle_audio_output, stream_to_elevenlabs
+from utils.api.perplexity import stream_perplexity_search
+from utils.contact_directory import contact_directory
+from utils.llm_cache import latest_request, llm_cache, transcript_fingerprint
+from utils.llm_router import llm_router
+from utils.scheduler import get_scheduler
+from utils.structured_output import StructuredOutputError, parse_structured
 
-setup_logging(log_file=Path("logs/app.log"), log_level="INFO")
 logger = logging.getLogger(__name__)
 
-dotenv.load_dotenv()
+# Decisions without side effects can be replayed from the cache when the same request comes up again.
+# Catch-up isn't one of them: asking again later in the meeting has to produce a fresh summary.
+CACHEABLE_ACTIONS = {
+    ActionType.NO_ACTION.value,
+    ActionType.REQUEST_INFO.value,
+    ActionType.WEB_SEARCH.value,
+}
 
 agent_system_prompt = """
 ## TASK
 You are an executive assistant to busy executives. Your job is to interpret the needs of the team within a meeting, ask for more information if needed, and then perform the necessary actions.
 
-Your name is "ElevenLabs" -- you will know the user is speaking to you if they say "Hey ElevenLabs" or something similar, followed by a query. If they have not said "Hey ElevenLabs", you must take the DO_NOTHING action, even if you have all the information you need. The user must explicitly ask you to do something.
+Your name is "ElevenLabs" -- you will know the user is speaking to you if they say "Hey ElevenLabs" or something similar, followed by a query. If they have not said "Hey ElevenLabs", you must take the no_action action, even if you have all the information you need. The user must explicitly ask you to do something.
 
 You will be provided with the full meeting transcript for context. The user may have asked multiple questions thoughtout the meeting, so ensure you're responding to the most recent query (at the end of the transcript).
 
 Decide if you have all the information you need to perform the action. If you do, perform the action. If you don't, ask for more information. You can make assumptions for the relevant information based on the meeting transcript. Only ask for more information if you don't have enough information to make an assumption.
 
-If the user asks you to search the web, or if you need to search the web to answer the user's question, simply proceed with the web search. Don't ask for confirmation or for additional information. Use the response field to write the search query.
+If the user asks you to search the web, or if you need to search the web to answer the user's question, simply proceed with the web search. Don't ask for confirmation or for additional information. Use the query argument to write the search query.
 
 Be proactive in inferring information from context. Only ask for more information if it's absolutely necessary and cannot be reasonably inferred from the conversation. For example:
 
 
 ## RESPONSE
-You must respond with a JSON object in the below format. Do not include any other text before or after the JSON object.
-{
-    "more_info_required": bool,
-    "response": string,
-    "action": "ACTION"
-}
+You must respond by calling the provided tools. Each tool is an action, and its arguments are the information required to perform that action. Every tool takes a `response` argument, which is what you'll say back to the meeting.
 
-## ACTIONS
-You can perform the following actions:
-- NO_ACTION: Do nothing
-- REQUEST_INFO: Request more information from the user
-- WEB_SEARCH: Search the web for information on a specific topic
-- EMAIL_CREATION: Create and compose a new email
-- CALENDAR_EVENT: Create or modify a calendar event
-- NOTE_CREATION: Create a new note or document
-- LINEAR_TASK: Create a new task in Linear
-- CATCH_ME_UP: Give me a summary of what has happened so far in the meeting
-- AMAZON_ORDER: Add an item to the Amazon cart
+- If the user hasn't just said "Hey ElevenLabs", call only `no_action`.
+- If more info is required, call only `request_info` and use `response` to let them know what you need.
+- If you have all the information you need, call the relevant action with all of its arguments filled in, and use `response` to let them know what you will do next with as little detail as possible, ie. I created the task, I sent the email, I added the event to the calendar, etc...
+- If the user asks for several things at once, call one tool per action in the same turn. Keep each `response` to its own action, they're combined into one reply. If one action must finish before another (e.g. the calendar invite before an email that mentions it), list it in the later action's `after`.
 
 ## REQUIRED INFORMATION
 
-### WEB_SEARCH
+### web_search
 - query: The query to search the web for (you can assume this based on the context) -- you do not need more information from the user if this is the relevant action
 
-### EMAIL_CREATION
+### email_creation
 - subject: The subject of the email (you can assume this based on the context)
 - body: The body of the email (ask for this if it's not clear)
-- recipients: A list of recipients for the email (ask for this if it's not clear)
+- to: A list of recipient email addresses or names; names are looked up in the user's contacts (ask for this if it's not clear)
 
-### CALENDAR_EVENT
+### calendar_event
 - title: The title of the event (you can assume this based on the context)
 - description: The description of the event (you can assume this based on the context)
-- start_time: The start time of the event (ask for this if it's not clear)
-- duration: The duration of the event (ask for this if it's not clear)
-- attendees: A list of attendees for the event (ask for this if it's not clear)
+- start_time: The start time of the event in ISO format (ask for this if it's not clear)
+- end_time: The end time of the event in ISO format, calculated from the duration (ask for the duration if it's not clear)
+- attendee_emails: A list of attendee email addresses or names; names are looked up in the user's contacts (ask for this if it's not clear)
 
-### NOTE_CREATION
+### note_creation
 - title: The title of the note (you can assume this based on the context)
-- body: The body of the note (ask for this if it's not clear)
+- content: The content of the note, be detailed per the user's request (ask for this if it's not clear)
 
-### LINEAR_TASK
+### linear_task
 - title: The title of the task (you can assume this based on the context)
 - description: The description of the task (you can assume this based on the context)
-- priority: The priority of the task (ask for this if it's not clear)
-- due_date: The due date of the task (ask for this if it's not clear)
+- priority: The priority of the task, 0 none, 1 urgent, 2 high, 3 medium, 4 low (ask for this if it's not clear)
+- due_date: The due date of the task in ISO 8601 format (ask for this if it's not clear)
 
-### CATCH_ME_UP
+### catch_me_up
+- minutes: How many recent minutes to cover, only if the user said (e.g. "catch me up on the last 10 minutes")
 
-### AMAZON_ORDER
-- query: The query to search the web for (you can assume this based on the context)
+### amazon_order
+- query: A description of the product to add to the cart (you can assume this based on the context)
+"""
 
-### NO_ACTION
-- If no action is requested or the user hasn't asked ElevenLabs to do anything, return {"no_action": "true"}
 
-## RESPONSE EXAMPLES
-If the user hasn't just said "Hey ElevenLabs":
-{
-    "more_info_required": false,
-    "response": null,
-    "action": "DO_NOTHING"
-}
+def _prefetch(chunks: AsyncIterator[str]) -> AsyncIterator[str]:
+    """Start consuming a stream in the background right away and replay it when iterated."""
+    queue = asyncio.Queue()
+
+    async def pump():
+        try:
+            async for chunk in chunks:
+                await queue.put(chunk)
+        finally:
+            await queue.put(None)
+
+    task = asyncio.create_task(pump())
+
+    async def replay():
+        try:
+            while (chunk := await queue.get()) is not None:
+                yield chunk
+            await task  # Surface any error from the stream
+        finally:
+            task.cancel()
+
+    return replay()
 
-If more info is required:
-{
-    "more_info_required": true,
-    "response": string, # let them know what you need
-    "action": "REQUEST_INFO"
-}
 
-If you have all the information you need:
-{
-    "more_info_required": false,
-    "response": string, # let them know what you will do next with as little detail as possible, ie. I created the task, I sent the email, I added the event to the calendar, etc...
-    "action": "ACTION"
+# Actions that should run after others from the same turn even without an explicit hint
+DEFAULT_DEPENDENCIES = {
+    ActionType.EMAIL_CREATION: {ActionType.CALENDAR_EVENT, ActionType.LINEAR_TASK},
 }
 
-If you need to search the web:
-{
-    "more_info_required": false,
-    "response": string, # the search query
-    "action": "WEB_SEARCH"
+# Catch-up is answered within the turn, like a web search, rather than queued with the rest
+BACKGROUND_ACTION_NAMES = {a.value for a in BACKGROUND_ACTIONS} - {ActionType.CATCH_ME_UP.value}
+
+# Arguments holding names that are looked up in the contact directory
+RECIPIENT_ARGUMENTS = {
+    ActionType.EMAIL_CREATION.value: "to",
+    ActionType.CALENDAR_EVENT.value: "attendee_emails",
 }
-"""
+
+
+def recipient_question(actions: list[dict]) -> Optional[str]:
+    """
+    What to ask the meeting if a recipient can't be resolved to a single address, checked before
+    the actions are queued so an unknown or ambiguous name is never guessed at.
+    """
+    for action in actions:
+        argument = RECIPIENT_ARGUMENTS.get(action["action"].lower())
+        recipients = (action["arguments"] or {}).get(argument) if argument else None
+        if isinstance(recipients, list):
+            question = contact_directory.clarify([r for r in recipients if isinstance(r, str)])
+            if question:
+                return question
+    return None
+
+
+def plan_dependencies(action_types: list[ActionType], hints: list[list[str]]) -> list[list[int]]:
+    """
+    For each action, the indices of the actions from the same turn it has to wait for, taken from
+    the model's `after` hints plus DEFAULT_DEPENDENCIES. Edges that would form a cycle are dropped.
+    """
+    wanted = []
+    for i, action_type in enumerate(action_types):
+        names = {h.lower() for h in hints[i]} | {
+            a.value for a in DEFAULT_DEPENDENCIES.get(action_type, ())
+        }
+        wanted.append([j for j, other in enumerate(action_types) if j != i and other.value in names])
+
+    order, state = [], {}
+
+    def visit(i):
+        if i in state:
+            return  # Done, or on the current path (a cycle, so the edge is ignored)
+        state[i] = "visiting"
+        for j in wanted[i]:
+            visit(j)
+        state[i] = "done"
+        order.append(i)
+
+    for i in range(len(action_types)):
+        visit(i)
+
+    position = {i: p for p, i in enumerate(order)}
+    return [[j for j in wanted[i] if position[j] < position[i]] for i in range(len(action_types))]
+
+
+def combine_responses(responses) -> Optional[str]:
+    """Join the per-action responses into one reply, dropping blanks and repeats."""
+    combined = []
+    for response in responses:
+        response = (response or "").strip()
+        if response and response not in combined:
+            combined.append(response)
+    return " ".join(combined) or None
 
 
 class Agent:
     def __init__(self):
-        self.model = "groq/llama-3.3-70b-versatile"
-        self.background_tasks = set()  # Keep track of background tasks
+        self.router = llm_router  # Hedges and falls back across models
+        self.tools = build_action_tools()  # One function-calling tool per action
+        self.executor = ActionExecutor()  # Runs actions in the background
         self.action_handler = ActionHandler()  # Initialize the action handler
-        logger.info(f"Initialized Agent with model: {self.model}")
-        self.is_active = False
+        # Persists actions before they run, retries failures and replays them after a restart
+        self.outbox = ActionOutbox(self.executor, self._run_outbox_action)
+        logger.info(f"Initialized Agent with models: {self.router.models}")
         self.more_info_required = False
 
+    @property
+    def is_active(self) -> bool:
+        """Whether any action is still queued or running."""
+        return self.executor.active_count > 0
+
     async def perform_action(
-        self, transcript: str, action: str, participant_emails: list[str]
-    ) -> None:
+        self,
+        transcript: str,
+        action: str,
+        participant_emails: list[str],
+        arguments: Optional[dict] = None,
+    ) -> dict:
+        # Convert string action to ActionType enum
+        action_type = ActionType[action.upper()]
+        print(f"Performing action: {action_type}")
+        # Process the action using the action handler
+        result = await self.action_handler.process_action(
+            action_type=action_type,
+            transcript=transcript,
+            participant_emails=participant_emails,
+            arguments=arguments,
+        )
+        if not result.get("success"):
+            raise RuntimeError(f"Action {action} was not successful")
+        return result
+
+    async def _run_outbox_action(self, action_type: ActionType, payload: dict) -> dict:
+        return await self.perform_action(
+            payload["transcript"],
+            action_type.value,
+            payload["participant_emails"],
+            payload["arguments"],
+        )
+
+    async def catch_up(
+        self, transcript: str, participant_emails: list[str], arguments: Optional[dict] = None
+    ) -> Optional[str]:
+        """Summarize the meeting so far and return the summary, or None if it couldn't be made."""
+        # Through the executor, so catch-ups get their concurrency limit, priority and deadline
+        action_id = self.executor.submit(
+            ActionType.CATCH_ME_UP,
+            lambda: self.perform_action(
+                transcript, ActionType.CATCH_ME_UP.value, participant_emails, arguments
+            ),
+        )
+        record = await self.executor.wait(action_id)
+        if record.status != ActionStatus.SUCCEEDED:
+            return None
+        return record.result["success"]
+
+    def start(self):
+        """Replay leftover actions and start the timers for deferred ones. Needs a running event loop."""
+        self.outbox.start()
+        get_scheduler().start()
+
+    def parse_llm_message(self, message) -> Dict[str, Any]:
+        """
+        Pull the chosen action, spoken response and action arguments out of the LLM message.
+        Falls back to the legacy JSON format if the model answered in plain content.
+        """
+        tool_calls = getattr(message, "tool_calls", None)
+        if tool_calls:
+            actions = []
+            for tool_call in tool_calls:
+                function = tool_call.function
+                try:
+                    arguments = parse_structured(function.arguments or "{}", "agent")
+                except StructuredOutputError:
+                    # The action is still known, so let the handler extract its own arguments
+                    arguments = {}
+                actions.append(
+                    {
+                        "action": function.name,
+                        "response": arguments.pop("response", None),
+                        "after": arguments.pop("after", None) or [],
+                        "arguments": arguments,
+                    }
+                )
+            first = actions[0]
+            return {
+                "action": first["action"],
+                "response": first["response"],
+                "arguments": first["arguments"],
+                "more_info_required": any(
+                    a["action"].lower() == ActionType.REQUEST_INFO.value for a in actions
+                ),
+                "actions": actions,
+            }
+
         try:
-            # Convert string action to ActionType enum
-            action_type = ActionType[action.upper()]
-            print(f"Performing action: {action_type}")
-            # Process the action using the action handler
-            await self.action_handler.process_action(
-                action_type=action_type,
-                transcript=transcript,
-                participant_emails=participant_emails,
-            )
-        except Exception as e:
-            print(f"Error performing action {action}: {e}")
-        finally:
-            self.is_active = False
-            # Remove the task from our set when done
-            self.background_tasks.remove(asyncio.current_task())
+            response_json = parse_structured(message.content, "agent")
+        except StructuredOutputError:
+            print(f"Error decoding JSON: {message.content}")
+            raise
 
-    async def call_llm(self, transcript: str, participant_emails: list[str]) -> Dict[str, bool]:
-        if self.is_active and not self.more_info_required:
-            return {"response": None, "taking_action": True}
+        return {
+            "action": response_json.get("action"),
+            "response": response_json.get("response"),
+            "arguments": None,
+            "more_info_required": response_json.get("more_info_required"),
+            "actions": [
+                {
+                    "action": response_json.get("action"),
+                    "response": response_json.get("response"),
+                    "after": [],
+                    "arguments": None,
+                }
+            ],
+        }
+
+    def submit_actions(
+        self, actions: list[dict], transcript: str, participant_emails: list[str]
+    ) -> list[Optional[str]]:
+        """
+        Queue every background action from one turn. They run concurrently, except that an
+        action waits for the actions it depends on (see `plan_dependencies`).
+        """
+        action_types = [ActionType(a["action"].lower()) for a in actions]
+        keys = [
+            idempotency_key(action_type, transcript, a["arguments"])
+            for action_type, a in zip(action_types, actions)
+        ]
+        dependencies = plan_dependencies(action_types, [a.get("after") or [] for a in actions])
+        return [
+            self.outbox.submit(
+                action_type,
+                transcript,
+                participant_emails,
+                a["arguments"],
+                after_keys=[keys[j] for j in dependencies[i]],
+            )
+            for i, (action_type, a) in enumerate(zip(action_types, actions))
+        ]
 
-        self.is_active = True
+    async def call_llm(self, transcript: str, participant_emails: list[str]) -> Dict[str, Any]:
+        """
+        Decide what to do about the latest request and start doing it. `response` is what to say
+        back. For web searches, `answer` is an async iterator over the answer as it streams in;
+        speaking or sending it is up to the caller, so this works the same with or without audio.
+        """
+        # Earlier actions keep running in the executor, so new requests are always accepted
         self.more_info_required = False
         print("Calling LLM...")
+        current_time = datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
         messages = [
             {
                 "role": "system",
@@ -164,83 +344,142 @@ class Agent:
             },
             {
                 "role": "user",
-                "content": f"Participant Emails: {participant_emails}\n\nTranscript: {transcript}",
+                "content": f"The current UTC time is: {current_time}\n\nParticipant Emails: {participant_emails}\n\nTranscript: {transcript}",
             },
         ]
 
-        response = litellm.completion(
-            model=self.model, messages=messages, api_key=os.getenv("GROQ_API_KEY")
-        )
-
-        response_content = response.choices[0].message.content
+        query = latest_request(transcript)
+        context = transcript_fingerprint(transcript)
+        parsed = llm_cache.get("agent", query, context)
 
-        try:
-            response_json = json.loads(response_content)
-        except json.JSONDecodeError:
-            print(f"Error decoding JSON: {response_content}")
-            raise
+        if parsed is None:
+            start = time.perf_counter()
+            response = await self.router.acompletion(
+                messages=messages,
+                tools=self.tools,
+                tool_choice="required",
+            )
 
-        print(f"LLM Response: {response_json}")
+            parsed = self.parse_llm_message(response.choices[0].message)
+            if all((a["action"] or "").lower() in CACHEABLE_ACTIONS for a in parsed["actions"]):
+                llm_cache.set("agent", query, parsed, context, time.perf_counter() - start)
+        print(f"LLM Response: {parsed}")
 
-        more_info_required = response_json.get("more_info_required")
-        response = response_json.get("response")
-        action = response_json.get("action")
+        actions = [
+            a
+            for a in parsed.get("actions") or [parsed]
+            if (a["action"] or "").lower() not in (ActionType.NO_ACTION.value, "do_nothing")
+        ]
 
-        if action.lower() == ActionType.NO_ACTION.value:
+        if not actions:
             logger.info("No action required...")
-            self.is_active = False
             self.more_info_required = False
             return {
                 "response": None,
-                "taking_action": self.is_active,
+                "taking_action": False,
                 "more_info_required": self.more_info_required,
             }
 
-        elif more_info_required == True:
+        elif parsed["more_info_required"] == True:
             logger.info("More info required...")
-            self.is_active = False
             self.more_info_required = True
+            info = next(
+                (a for a in actions if a["action"].lower() == ActionType.REQUEST_INFO.value),
+                actions[0],
+            )
             return {
-                "response": response,
-                "taking_action": self.is_active,
+                "response": info["response"],
+                "taking_action": False,
                 "more_info_required": self.more_info_required,
             }
 
-        # If the action is to search the web, respond directly with perplexity results
-        if action.lower() == ActionType.WEB_SEARCH.value:
-            logger.info("Doing a web search...")
-            audio_data = await stream_to_elevenlabs("searching the web...")
-            await handle_audio_output(audio_data, output_mode="speak")
-            perplexity_results = perplexity_search(response)
-            self.is_active = False
-            self.more_info_required = False
+        searches = [a for a in actions if a["action"].lower() == ActionType.WEB_SEARCH.value]
+        catch_ups = [a for a in actions if a["action"].lower() == ActionType.CATCH_ME_UP.value]
+        background = [a for a in actions if a["action"].lower() in BACKGROUND_ACTION_NAMES]
+
+        question = recipient_question(background)
+        if question:
+            logger.info(f"Asking about recipients: {question}")
+            self.more_info_required = True
             return {
-                "response": perplexity_results,
-                "taking_action": self.is_active,
+                "response": question,
+                "taking_action": False,
                 "more_info_required": self.more_info_required,
             }
+        self.more_info_required = False
 
-        else:
-            logger.info("Performing action...")
-            # Create a task and add it to our set
-            task = asyncio.create_task(self.perform_action(transcript, action, participant_emails))
-            self.background_tasks.add(task)
-            self.is_active = True
-            self.more_info_required = False
+        action_ids = []
+        if background:
+            logger.info(f"Performing {len(background)} action(s)...")
+            action_ids = self.submit_actions(background, transcript, participant_emails)
+        # One reply for the whole turn rather than one per action
+        response = combine_responses(a["response"] for a in background)
+
+        if catch_ups:
+            logger.info("Catching up...")
+            summary = await self.catch_up(transcript, participant_emails, catch_ups[0]["arguments"])
+            response = combine_responses(
+                [response, summary or "Sorry, I couldn't put together a summary right now."]
+            )
+
+        # If the user asked for a web search, respond directly with perplexity results
+        if searches:
+            logger.info("Doing a web search...")
+            search_args = validate_action_arguments(ActionType.WEB_SEARCH, searches[0]["arguments"])
+            query = search_args.query if search_args else searches[0]["response"]
+            # Searching starts now, while the caller is still saying the acknowledgement
+            answer = _prefetch(stream_perplexity_search(query))
+            acknowledgement = f"{response} Searching the web..." if response else "searching the web..."
             return {
-                "response": response,
-                "taking_action": self.is_active,
+                "response": acknowledgement,
+                "answer": answer,
+                "taking_action": bool(background),
+                "action_ids": action_ids,
                 "more_info_required": self.more_info_required,
             }
 
+        return {
+            "response": response,
+            "taking_action": bool(background),
+            "action_id": action_ids[0] if action_ids else None,
+            "action_ids": action_ids,
+            "more_info_required": self.more_info_required,
+        }
+
+    def cancel_action(self, action_id: str) -> bool:
+        """Cancel a queued or running action by ID."""
+        return self.executor.cancel(action_id)
+
+    def action_status(self, action_id: Optional[str] = None):
+        """Status of one action, or of all recent actions if no ID is given."""
+        if action_id:
+            return self.executor.status(action_id)
+        return self.executor.list_status()
+
     async def cleanup(self):
-        """Wait for all background tasks to complete."""
-        if self.background_tasks:
-            print(f"Waiting for {len(self.background_tasks)} background tasks to complete...")
-            await asyncio.gather(*self.background_tasks)
+        """Wait for all background actions to complete."""
+        if self.is_active:
+            print(f"Waiting for {self.executor.active_count} background actions to complete...")
+            await self.executor.wait_all()
+        scheduler = get_scheduler()
+        self.outbox.stop()
+        scheduler.stop()
+        if self.outbox.pending_count():
+            print(f"{self.outbox.pending_count()} actions will be retried on the next start")
+        if scheduler.pending_count():
+            print(f"{scheduler.pending_count()} scheduled jobs will run after the next start")
 
 
 if __name__ == "__main__":
+    from pathlib import Path
+
+    import dotenv
+
+    from utils.logging_config import setup_logging
+    from utils.TTS_utils import handle_audio_output, stream_to_elevenlabs
+
+    dotenv.load_dotenv()
+    setup_logging(log_file=Path("logs/app.log"), log_level="INFO")
 
     async def test_agent():
         agent = Agent()
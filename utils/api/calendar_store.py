@@ -0,0 +1,202 @@
+import asyncio
+import logging
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Optional
+
+from googleapiclient.errors import HttpError
+
+logger = logging.getLogger(__name__)
+
+CALENDAR_STORE_PATH = Path(os.getenv("CALENDAR_STORE_PATH", "cache/calendar.sqlite3"))
+
+EVENT_FIELDS = "items(id,status,summary,start,end,updated,attendees/email),nextPageToken,nextSyncToken"
+
+
+def _event_timestamp(when: dict) -> Optional[float]:
+    """Epoch seconds for an event start/end, handling both timed and all-day events."""
+    if not when:
+        return None
+    if "dateTime" in when:
+        return datetime.fromisoformat(when["dateTime"].replace("Z", "+00:00")).timestamp()
+    if "date" in when:
+        return datetime.fromisoformat(when["date"]).replace(tzinfo=timezone.utc).timestamp()
+    return None
+
+
+class CalendarEventStore:
+    """
+    Local SQLite copy of the primary calendar, kept current with Calendar syncToken incremental sync.
+    Indexed by attendee email and time range so contact lookups never hit the API.
+    """
+
+    def __init__(self, db_path: Path = CALENDAR_STORE_PATH, calendar_id: str = "primary"):
+        self.calendar_id = calendar_id
+        self._lock = threading.Lock()  # Guards the connection
+        self._sync_lock = threading.Lock()  # One sync at a time, without blocking readers
+        db_path = Path(db_path)
+        db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(str(db_path), check_same_thread=False)
+        self._db.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS events (
+                id TEXT PRIMARY KEY,
+                summary TEXT,
+                start_ts REAL,
+                end_ts REAL,
+                updated TEXT
+            );
+            CREATE TABLE IF NOT EXISTS attendees (
+                event_id TEXT NOT NULL,
+                email TEXT NOT NULL COLLATE NOCASE,
+                PRIMARY KEY (event_id, email)
+            );
+            CREATE TABLE IF NOT EXISTS sync_state (
+                calendar_id TEXT PRIMARY KEY,
+                sync_token TEXT,
+                synced_at REAL
+            );
+            CREATE INDEX IF NOT EXISTS idx_events_time ON events (start_ts, end_ts);
+            CREATE INDEX IF NOT EXISTS idx_attendees_email ON attendees (email, event_id);
+            """
+        )
+        self._db.commit()
+
+    def _sync_token(self) -> Optional[str]:
+        row = self._db.execute(
+            "SELECT sync_token FROM sync_state WHERE calendar_id = ?", (self.calendar_id,)
+        ).fetchone()
+        return row[0] if row else None
+
+    def is_synced(self) -> bool:
+        with self._lock:
+            return self._sync_token() is not None
+
+    def _apply(self, event: dict) -> None:
+        self._db.execute("DELETE FROM attendees WHERE event_id = ?", (event["id"],))
+        if event.get("status") == "cancelled":
+            self._db.execute("DELETE FROM events WHERE id = ?", (event["id"],))
+            return
+
+        self._db.execute(
+            "INSERT OR REPLACE INTO events VALUES (?, ?, ?, ?, ?)",
+            (
+                event["id"],
+                event.get("summary"),
+                _event_timestamp(event.get("start")),
+                _event_timestamp(event.get("end")),
+                event.get("updated"),
+            ),
+        )
+        self._db.executemany(
+            "INSERT OR IGNORE INTO attendees VALUES (?, ?)",
+            [(event["id"], a["email"]) for a in event.get("attendees", []) if a.get("email")],
+        )
+
+    def sync(self, google_api) -> int:
+        """
+        Pull changes since the last sync (or everything, the first time). Returns the number of
+        changed events. If Google has expired the sync token, the store is rebuilt from scratch.
+        """
+        with self._sync_lock:
+            with self._lock:
+                sync_token = self._sync_token()
+            page_token = None
+            changed = 0
+
+            while True:
+                try:
+                    result = google_api._execute(
+                        google_api.service_calendar.events().list(
+                            calendarId=self.calendar_id,
+                            singleEvents=True,
+                            maxResults=2500,
+                            syncToken=sync_token,
+                            pageToken=page_token,
+                            fields=EVENT_FIELDS,
+                        )
+                    )
+                except HttpError as e:
+                    if e.resp.status == 410 and sync_token:
+                        logger.info("Calendar sync token expired, running a full sync")
+                        with self._lock:
+                            self._db.execute("DELETE FROM events")
+                            self._db.execute("DELETE FROM attendees")
+                        sync_token, page_token = None, None
+                        continue
+                    raise
+
+                with self._lock:
+                    for event in result.get("items", []):
+                        self._apply(event)
+                        changed += 1
+
+                    page_token = result.get("nextPageToken")
+                    if page_token:
+                        continue
+
+                    self._db.execute(
+                        "INSERT OR REPLACE INTO sync_state VALUES (?, ?, ?)",
+                        (self.calendar_id, result.get("nextSyncToken"), time.time()),
+                    )
+                    self._db.commit()
+                    logger.info(f"Calendar sync applied {changed} changes")
+                    return changed
+
+    async def async_sync(self, google_api) -> int:
+        return await asyncio.to_thread(self.sync, google_api)
+
+    def events_between(self, start: datetime, end: datetime) -> list[dict]:
+        with self._lock:
+            rows = self._db.execute(
+                """
+                SELECT id, summary, start_ts, end_ts FROM events
+                WHERE start_ts < ? AND end_ts > ? ORDER BY start_ts
+                """,
+                (end.timestamp(), start.timestamp()),
+            ).fetchall()
+        return [
+            {"id": row[0], "summary": row[1], "start": row[2], "end": row[3]} for row in rows
+        ]
+
+    def count_meetings_with(self, email: str, start: datetime, end: datetime) -> int:
+        with self._lock:
+            return self._db.execute(
+                """
+                SELECT COUNT(*) FROM attendees a JOIN events e ON e.id = a.event_id
+                WHERE a.email = ? AND e.start_ts >= ? AND e.start_ts < ?
+                """,
+                (email, start.timestamp(), end.timestamp()),
+            ).fetchone()[0]
+
+    def last_meeting_with(self, email: str, before: Optional[datetime] = None) -> Optional[datetime]:
+        """End time of the most recent meeting with this attendee that finished before `before`."""
+        before = before or datetime.now(timezone.utc)
+        with self._lock:
+            row = self._db.execute(
+                """
+                SELECT MAX(e.end_ts) FROM attendees a JOIN events e ON e.id = a.event_id
+                WHERE a.email = ? AND e.end_ts <= ?
+                """,
+                (email, before.timestamp()),
+            ).fetchone()
+        if not row or row[0] is None:
+            return None
+        return datetime.fromtimestamp(row[0], tz=timezone.utc)
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_calendar_store() -> CalendarEventStore:
+    """Process-wide store, opened on first use."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = CalendarEventStore()
+        return _store
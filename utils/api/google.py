@@ -1,54 +1,149 @@
-import os.path
-import pickle
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
 
-from google.auth.transport.requests import Request
-from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import InstalledAppFlow
+import httplib2
+from google_auth_httplib2 import AuthorizedHttp
 from googleapiclient.discovery import build
+from googleapiclient.errors import HttpError
+
+from utils.api.calendar_store import get_calendar_store
+from utils.api.google_auth import SCOPES, credential_store
+from utils.rate_limits import rate_limiter
+
+# Blocking .execute() calls run here so they never stall the event loop
+_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="google-api")
+# Separate pool for fan-out inside a call, so nested work can't starve the pool it runs on
+_query_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="google-api-query")
+
+# A rate-limited call is retried once, after waiting out Retry-After
+GOOGLE_MAX_ATTEMPTS = 2
+
+_instance = None
+_instance_lock = threading.Lock()
+
+
+def get_google_api() -> "GoogleAPI":
+    """Process-wide GoogleAPI with credentials held in memory and services built once."""
+    global _instance
+    with _instance_lock:
+        if _instance is None:
+            google_api = GoogleAPI()
+            if not google_api.authenticate():
+                raise RuntimeError("Google credentials are not available")
+            _instance = google_api
+        return _instance
+
+
+async def aget_google_api() -> "GoogleAPI":
+    """get_google_api() without blocking the event loop on the first call."""
+    # Loads the token off the event loop and starts the background refresher if a refresh is due
+    await credential_store.get_credentials()
+    if _instance is not None:
+        return _instance
+    return await asyncio.get_running_loop().run_in_executor(_executor, get_google_api)
 
 
 class GoogleAPI:
     def __init__(self):
-        self.SCOPES = [
-            "https://mail.google.com/",  # Full access to Gmail
-            "https://www.googleapis.com/auth/calendar",  # Full access to Calendar
-            "https://www.googleapis.com/auth/contacts",  # Full access to Contacts
-            "https://www.googleapis.com/auth/contacts.other.readonly",  # Access to Other Contacts
-        ]
+        self.SCOPES = SCOPES
         self.creds = None
         self.service_gmail = None
         self.service_calendar = None
         self.service_contacts = None
+        self._local = threading.local()
 
-    def authenticate(self):
-        """Handles the OAuth 2.0 authentication flow."""
-        # Check if token.pickle exists with stored credentials
-        if os.path.exists("token.pickle"):
-            with open("token.pickle", "rb") as token:
-                self.creds = pickle.load(token)
-
-        # If credentials are invalid or don't exist, let's get new ones
-        if not self.creds or not self.creds.valid:
-            if self.creds and self.creds.expired and self.creds.refresh_token:
-                self.creds.refresh(Request())
-            else:
-                flow = InstalledAppFlow.from_client_secrets_file("credentials.json", self.SCOPES)
-                self.creds = flow.run_local_server(port=0)
-
-            # Save credentials for future use
-            with open("token.pickle", "wb") as token:
-                pickle.dump(self.creds, token)
-
-        # Build both services
-        self.service_gmail = build("gmail", "v1", credentials=self.creds)
-        self.service_calendar = build("calendar", "v3", credentials=self.creds)
-        self.service_contacts = build("people", "v1", credentials=self.creds)
+    def authenticate(self, interactive: bool = False):
+        """
+        Loads the shared in-memory credentials. The browser login only runs when `interactive`
+        is set, so it can never be triggered in the middle of a meeting. Token refresh is handled
+        by the background refresher in google_auth, or by AuthorizedHttp inside the thread pool.
+        """
+        if self.creds and self.service_gmail:
+            return True
+
+        self.creds = credential_store.load()
+        if self.creds is None:
+            if not interactive:
+                print("No Google token found, run `python -m utils.api.google` to log in")
+                return False
+            self.creds = credential_store.login()
+
+        # Build the services once, from the discovery documents bundled with googleapiclient
+        if not self.service_gmail:
+            self.service_gmail = build(
+                "gmail", "v1", credentials=self.creds, static_discovery=True, cache_discovery=False
+            )
+            self.service_calendar = build(
+                "calendar", "v3", credentials=self.creds, static_discovery=True, cache_discovery=False
+            )
+            self.service_contacts = build(
+                "people", "v1", credentials=self.creds, static_discovery=True, cache_discovery=False
+            )
 
         print("Authentication successful!")
         return True
 
-    def create_event(self, title, location, description, start_time, end_time, attendees=None):
+    def _execute(self, request):
+        """Execute a request on a per-thread HTTP connection, since httplib2 isn't thread-safe."""
+        http = getattr(self._local, "http", None)
+        if http is None:
+            http = AuthorizedHttp(self.creds, http=httplib2.Http())
+            self._local.http = http
+        try:
+            return request.execute(http=http)
+        except HttpError as e:
+            if e.resp.status == 429:
+                # Kept for _run_in_thread, since most methods turn errors into None or []
+                self._local.rate_limit_headers = dict(e.resp)
+            raise
+
+    def _call_tracked(self, func, *args, **kwargs):
+        """Run func in a worker thread. Returns (result, error, headers of any 429 it ran into)."""
+        self._local.rate_limit_headers = None
+        try:
+            result, error = func(*args, **kwargs), None
+        except Exception as e:
+            result, error = None, e
+        return result, error, self._local.rate_limit_headers
+
+    async def _run_in_thread(self, func, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        for attempt in range(GOOGLE_MAX_ATTEMPTS):
+            # A 429 blocks the bucket until Retry-After, so the next acquire waits it out
+            await rate_limiter.acquire("google")
+            result, error, rate_limit_headers = await loop.run_in_executor(
+                _executor, functools.partial(self._call_tracked, func, *args, **kwargs)
+            )
+            if rate_limit_headers is None:
+                break
+            rate_limiter.record_response("google", rate_limit_headers, 429)
+            if attempt + 1 < GOOGLE_MAX_ATTEMPTS:
+                print(f"Google rate limited {func.__name__}, retrying")
+        if error is not None:
+            raise error
+        return result
+
+    async def acreate_event(self, *args, **kwargs):
+        return await self._run_in_thread(self.create_event, *args, **kwargs)
+
+    async def asend_email(self, *args, **kwargs):
+        return await self._run_in_thread(self.send_email, *args, **kwargs)
+
+    async def alist_contacts(self, *args, **kwargs):
+        return await self._run_in_thread(self.list_contacts, *args, **kwargs)
+
+    async def alist_frequent_contacts(self, *args, **kwargs):
+        return await self._run_in_thread(self.list_frequent_contacts, *args, **kwargs)
+
+    async def aget_contact_metrics(self, *args, **kwargs):
+        return await self._run_in_thread(self.get_contact_metrics, *args, **kwargs)
+
+    def create_event(
+        self, title, location, description, start_time, end_time, attendees=None, event_id=None
+    ):
         """Creates a calendar event.
 
         Args:
@@ -58,6 +153,8 @@ class GoogleAPI:
             start_time (datetime): Start time of the event
             end_time (datetime): End time of the event
             attendees (list): Optional list of attendee email addresses
+            event_id (str): Optional client-chosen event ID. If an event with this ID
+                already exists it is returned instead of creating a duplicate.
         """
         try:
             print(
@@ -79,16 +176,25 @@ class GoogleAPI:
 
             if attendees:
                 event["attendees"] = [{"email": email} for email in attendees]
+            if event_id:
+                event["id"] = event_id
 
-            event = (
-                self.service_calendar.events()
-                .insert(
-                    calendarId="primary",
-                    body=event,
-                    sendUpdates="all",  # Sends email notifications to attendees
+            try:
+                event = self._execute(
+                    self.service_calendar.events()
+                    .insert(
+                        calendarId="primary",
+                        body=event,
+                        sendUpdates="all",  # Sends email notifications to attendees
+                    )
+                )
+            except HttpError as e:
+                if not (event_id and e.resp.status == 409):
+                    raise
+                print(f"Event {event_id} already exists, not creating it again")
+                event = self._execute(
+                    self.service_calendar.events().get(calendarId="primary", eventId=event_id)
                 )
-                .execute()
-            )
 
             print(f"Event created: {event.get('htmlLink')}")
             return event
@@ -99,11 +205,10 @@ class GoogleAPI:
     def list_messages(self, max_results=10):
         """Lists the user's Gmail messages."""
         try:
-            results = (
+            results = self._execute(
                 self.service_gmail.users()
                 .messages()
                 .list(userId="me", maxResults=max_results)
-                .execute()
             )
             messages = results.get("messages", [])
             return messages
@@ -114,13 +219,23 @@ class GoogleAPI:
     def get_message(self, msg_id):
         """Gets a specific message by ID."""
         try:
-            message = self.service_gmail.users().messages().get(userId="me", id=msg_id).execute()
+            message = self._execute(self.service_gmail.users().messages().get(userId="me", id=msg_id))
             return message
         except Exception as e:
             print(f"An error occurred: {e}")
             return None
 
-    def send_email(self, to, subject, body, is_html=False):
+    def find_sent_message(self, message_id):
+        """Returns the sent message with this Message-ID header, or None."""
+        result = self._execute(
+            self.service_gmail.users()
+            .messages()
+            .list(userId="me", q=f"in:sent rfc822msgid:{message_id}", maxResults=1)
+        )
+        messages = result.get("messages", [])
+        return messages[0] if messages else None
+
+    def send_email(self, to, subject, body, is_html=False, message_id=None):
         """Sends an email using Gmail API.
 
         Args:
@@ -128,25 +243,36 @@ class GoogleAPI:
             subject (str): Email subject
             body (str): Email body content
             is_html (bool): Whether the body contains HTML content
+            message_id (str): Optional Message-ID header. If a sent message already
+                has it, that message is returned instead of sending again.
         """
         try:
             import base64
             from email.mime.text import MIMEText
 
+            if message_id:
+                existing = self.find_sent_message(message_id)
+                if existing:
+                    print(f"Message {message_id} was already sent, not sending it again")
+                    return existing
+
             # Create message with appropriate content type
             message = MIMEText(body, "html" if is_html else "plain")
+            if isinstance(to, (list, tuple)):
+                to = ", ".join(to)
             message["to"] = to if to else "haz@pally.com"
             message["subject"] = subject if subject else "No subject"
+            if message_id:
+                message["Message-ID"] = message_id
 
             # Encode the message
             raw_message = base64.urlsafe_b64encode(message.as_bytes()).decode("utf-8")
 
             # Send the message
-            sent_message = (
+            sent_message = self._execute(
                 self.service_gmail.users()
                 .messages()
                 .send(userId="me", body={"raw": raw_message})
-                .execute()
             )
 
             print(f"Message Id: {sent_message['id']}")
@@ -162,7 +288,7 @@ class GoogleAPI:
             page_size (int): Number of contacts to return per page
         """
         try:
-            results = (
+            results = self._execute(
                 self.service_contacts.people()
                 .connections()
                 .list(
@@ -170,7 +296,6 @@ class GoogleAPI:
                     pageSize=page_size,
                     personFields="names,emailAddresses,phoneNumbers",
                 )
-                .execute()
             )
             connections = results.get("connections", [])
 
@@ -207,10 +332,9 @@ class GoogleAPI:
         """
         try:
             print("Fetching frequent contacts...")
-            results = (
+            results = self._execute(
                 self.service_contacts.otherContacts()
                 .list(pageSize=page_size, readMask="names,emailAddresses,phoneNumbers")
-                .execute()
             )
 
             print(f"Found {len(results.get('otherContacts', []))} frequent contacts")
@@ -260,7 +384,7 @@ class GoogleAPI:
             if phone:
                 body["phoneNumbers"] = [{"value": phone}]
 
-            result = self.service_contacts.people().createContact(body=body).execute()
+            result = self._execute(self.service_contacts.people().createContact(body=body))
 
             print(f"Contact created: {result.get('names', [{}])[0].get('displayName', '')}")
             return result
@@ -268,137 +392,190 @@ class GoogleAPI:
             print(f"An error occurred: {e}")
             return None
 
-    def get_contact_metrics(self, email, days_back=720):
-        """Get interaction metrics for a specific contact."""
-        try:
-            metrics = {
-                "email": email,
-                "emails_received": 0,
-                "emails_sent": 0,
-                "meetings": 0,
-                "last_interaction": None,
-            }
-
-            # Calculate date range
-            now = datetime.now(timezone.utc)
-            start_date = now - timedelta(days=days_back)
-            formatted_date = start_date.strftime("%Y/%m/%d")  # Gmail query format
-
-            print(f"\nAnalyzing interactions with: {email}")
-            print(f"Looking back to: {formatted_date}")
-
-            # Get received emails with pagination
-            received_query = f"from:({email}) after:{formatted_date}"
-            print(f"Executing received query: {received_query}")
-
-            received_messages = []
-            next_page_token = None
-            while True:
-                received_results = (
+    def _batch_execute(self, service, requests, batch_size=50):
+        """Run many requests through Google's batch HTTP endpoint. Failed requests map to None."""
+        responses = {}
+
+        def callback(request_id, response, exception):
+            if exception is not None:
+                print(f"Batch request {request_id} failed: {exception}")
+            responses[request_id] = response if exception is None else None
+
+        items = list(requests.items())
+        for i in range(0, len(items), batch_size):
+            batch = service.new_batch_http_request(callback=callback)
+            for request_id, request in items[i : i + batch_size]:
+                batch.add(request, request_id=request_id)
+            self._execute(batch)
+        return responses
+
+    def _count_remaining_messages(self, query, page):
+        """Count message IDs on this page and every following one. A missing page is fetched again."""
+        count = 0
+        next_page_token = None
+        while True:
+            if page is None:
+                page = self._execute(
                     self.service_gmail.users()
                     .messages()
-                    .list(userId="me", q=received_query, pageToken=next_page_token)
-                    .execute()
+                    .list(
+                        userId="me",
+                        q=query,
+                        maxResults=500,
+                        pageToken=next_page_token,
+                        fields="messages/id,nextPageToken",
+                    )
                 )
+            count += len(page.get("messages", []))
+            next_page_token = page.get("nextPageToken")
+            if not next_page_token:
+                return count
+            page = None
+
+    def list_calendar_events(self, time_min, time_max):
+        """Fetch every event in a time window once, with only the fields metrics need."""
+        events = []
+        page_token = None
+        while True:
+            result = self._execute(
+                self.service_calendar.events().list(
+                    calendarId="primary",
+                    timeMin=time_min.strftime("%Y-%m-%dT%H:%M:%SZ"),
+                    timeMax=time_max.strftime("%Y-%m-%dT%H:%M:%SZ"),
+                    singleEvents=True,
+                    maxResults=2500,
+                    pageToken=page_token,
+                    fields="items(attendees/email,end),nextPageToken",
+                )
+            )
+            events.extend(result.get("items", []))
+            page_token = result.get("nextPageToken")
+            if not page_token:
+                return events
 
-                if "messages" in received_results:
-                    received_messages.extend(received_results["messages"])
-                    print(f"Found {len(received_messages)} received emails so far...")
-
-                next_page_token = received_results.get("nextPageToken")
-                if not next_page_token:
-                    break
-
-            metrics["emails_received"] = len(received_messages)
-            print(f"Total received emails: {metrics['emails_received']}")
+    def get_contacts_metrics(self, emails, days_back=720, events=None):
+        """Get interaction metrics for many contacts at once.
 
-            # Get sent emails with pagination
-            sent_query = f"to:({email}) after:{formatted_date}"
-            print(f"Executing sent query: {sent_query}")
+        Gmail queries for every contact go out in batch requests, remaining pages are counted
+        concurrently, and the calendar window is fetched once and shared by all contacts.
 
-            sent_messages = []
-            next_page_token = None
-            while True:
-                sent_results = (
-                    self.service_gmail.users()
-                    .messages()
-                    .list(userId="me", q=sent_query, pageToken=next_page_token)
-                    .execute()
+        Args:
+            emails (list): Contact email addresses
+            days_back (int): Number of days to look back
+            events (list): Optional pre-fetched calendar events for the window
+        """
+        now = datetime.now(timezone.utc)
+        start_date = now - timedelta(days=days_back)
+        formatted_date = start_date.strftime("%Y/%m/%d")  # Gmail query format
+        print(f"\nAnalyzing interactions with {len(emails)} contacts since {formatted_date}")
+
+        messages = self.service_gmail.users().messages()
+        queries = {}
+        for i, email in enumerate(emails):
+            queries[f"received-{i}"] = f"from:({email}) after:{formatted_date}"
+            queries[f"sent-{i}"] = f"to:({email}) after:{formatted_date}"
+            queries[f"latest-{i}"] = f"{{from:({email}) to:({email})}} after:{formatted_date}"
+
+        # Bring the local calendar store up to date (or fetch the window once, if there's no store
+        # yet) while the Gmail batches run
+        store = get_calendar_store()
+        use_store = events is None and store.is_synced()
+        calendar_future = None
+        if use_store:
+            calendar_future = _query_executor.submit(store.sync, self)
+        elif events is None:
+            calendar_future = _query_executor.submit(self.list_calendar_events, start_date, now)
+
+        # First page of every count, plus the single most recent message, in one batch round-trip
+        first_pages = self._batch_execute(
+            self.service_gmail,
+            {
+                request_id: messages.list(
+                    userId="me",
+                    q=query,
+                    maxResults=1 if request_id.startswith("latest") else 500,
+                    fields="messages/id,nextPageToken",
                 )
+                for request_id, query in queries.items()
+            },
+        )
+
+        # Paginate the remaining pages of all counts concurrently
+        count_futures = {
+            request_id: _query_executor.submit(
+                self._count_remaining_messages, queries[request_id], first_pages.get(request_id)
+            )
+            for request_id in queries
+            if not request_id.startswith("latest")
+        }
+
+        latest_ids = {}
+        for i in range(len(emails)):
+            page = first_pages.get(f"latest-{i}") or {}
+            if page.get("messages"):
+                latest_ids[i] = page["messages"][0]["id"]
+        latest_messages = self._batch_execute(
+            self.service_gmail,
+            {
+                f"message-{i}": messages.get(
+                    userId="me", id=message_id, format="minimal", fields="internalDate"
+                )
+                for i, message_id in latest_ids.items()
+            },
+        )
 
-                if "messages" in sent_results:
-                    sent_messages.extend(sent_results["messages"])
-                    print(f"Found {len(sent_messages)} sent emails so far...")
-
-                next_page_token = sent_results.get("nextPageToken")
-                if not next_page_token:
-                    break
+        if calendar_future is not None:
+            try:
+                result = calendar_future.result()
+                if not use_store:
+                    events = result
+            except Exception as calendar_error:
+                print(f"Calendar error: {calendar_error}")
+        events = events or []
 
-            metrics["emails_sent"] = len(sent_messages)
-            print(f"Total sent emails: {metrics['emails_sent']}")
+        results = []
+        for i, email in enumerate(emails):
+            metrics = {
+                "email": email,
+                "emails_received": count_futures[f"received-{i}"].result(),
+                "emails_sent": count_futures[f"sent-{i}"].result(),
+                "meetings": 0,
+                "last_interaction": None,
+            }
 
-            # Track latest interaction timestamp
             latest_timestamp = None
-
-            # Get last email interaction
-            all_messages = received_messages + sent_messages
-            if all_messages:
-                # Sort by ID (Gmail IDs are chronological)
-                all_messages.sort(key=lambda x: x["id"], reverse=True)
-                latest_message = (
-                    self.service_gmail.users()
-                    .messages()
-                    .get(userId="me", id=all_messages[0]["id"])
-                    .execute()
-                )
+            latest_message = latest_messages.get(f"message-{i}")
+            if latest_message:
                 latest_timestamp = datetime.fromtimestamp(
                     int(latest_message["internalDate"]) / 1000, tz=timezone.utc
                 )
 
-            try:
-                # Get calendar metrics
-                events_result = (
-                    self.service_calendar.events()
-                    .list(
-                        calendarId="primary",
-                        timeMin=start_date.strftime("%Y-%m-%dT%H:%M:%SZ"),
-                        timeMax=now.strftime("%Y-%m-%dT%H:%M:%SZ"),
-                        singleEvents=True,
-                        orderBy="startTime",
-                    )
-                    .execute()
-                )
-
-                # Track meetings and find latest calendar interaction
-                latest_event_time = None
-                for event in events_result.get("items", []):
-                    attendees = event.get("attendees", [])
-                    if any(attendee.get("email") == email for attendee in attendees):
-                        metrics["meetings"] += 1
-                        # Check end time of event
-                        event_end = event.get("end", {}).get("dateTime")
-                        if event_end:
-                            event_time = datetime.fromisoformat(event_end.replace("Z", "+00:00"))
-                            if latest_event_time is None or event_time > latest_event_time:
-                                latest_event_time = event_time
-
-                print(f"Found {metrics['meetings']} calendar events")
-
-                # Compare email and calendar timestamps
-                if latest_event_time:
-                    if latest_timestamp is None or latest_event_time > latest_timestamp:
-                        latest_timestamp = latest_event_time
-
-            except Exception as calendar_error:
-                print(f"Calendar error: {calendar_error}")
-                metrics["meetings"] = 0
+            if use_store:
+                metrics["meetings"] = store.count_meetings_with(email, start_date, now)
+                last_meeting = store.last_meeting_with(email, before=now)
+                if last_meeting and (latest_timestamp is None or last_meeting > latest_timestamp):
+                    latest_timestamp = last_meeting
+
+            for event in events:
+                attendees = event.get("attendees", [])
+                if any(attendee.get("email") == email for attendee in attendees):
+                    metrics["meetings"] += 1
+                    event_end = event.get("end", {}).get("dateTime")
+                    if event_end:
+                        event_time = datetime.fromisoformat(event_end.replace("Z", "+00:00"))
+                        if latest_timestamp is None or event_time > latest_timestamp:
+                            latest_timestamp = event_time
 
-            # Set the final last interaction time
             if latest_timestamp:
                 metrics["last_interaction"] = latest_timestamp.strftime("%Y-%m-%d %H:%M:%S")
+            results.append(metrics)
 
-            return metrics
+        return results
 
+    def get_contact_metrics(self, email, days_back=720, events=None):
+        """Get interaction metrics for a specific contact."""
+        try:
+            return self.get_contacts_metrics([email], days_back, events)[0]
         except Exception as e:
             print(f"An error occurred getting metrics: {e}")
             print(f"Error details: {str(e)}")
@@ -413,21 +590,19 @@ class GoogleAPI:
         """
         try:
             print(f"\nAnalyzing top {top_n} frequent contacts over past {days_back} days...")
-            contacts = self.list_frequent_contacts(page_size=top_n)
+            contacts = [c for c in self.list_frequent_contacts(page_size=top_n) if "email" in c]
+            all_metrics = self.get_contacts_metrics([c["email"] for c in contacts], days_back)
 
             detailed_contacts = []
-            for contact in contacts:
-                if "email" in contact:
-                    metrics = self.get_contact_metrics(contact["email"], days_back)
-                    if metrics:
-                        detailed_contacts.append({"name": contact.get("name", "N/A"), **metrics})
-
-                        print(f"\nContact: {contact.get('name', 'N/A')}")
-                        print(f"Email: {metrics['email']}")
-                        print(f"Emails received: {metrics['emails_received']}")
-                        print(f"Emails sent: {metrics['emails_sent']}")
-                        print(f"Meetings: {metrics['meetings']}")
-                        print(f"Last interaction: {metrics['last_interaction']}")
+            for contact, metrics in zip(contacts, all_metrics):
+                detailed_contacts.append({"name": contact.get("name", "N/A"), **metrics})
+
+                print(f"\nContact: {contact.get('name', 'N/A')}")
+                print(f"Email: {metrics['email']}")
+                print(f"Emails received: {metrics['emails_received']}")
+                print(f"Emails sent: {metrics['emails_sent']}")
+                print(f"Meetings: {metrics['meetings']}")
+                print(f"Last interaction: {metrics['last_interaction']}")
 
             return detailed_contacts
 
@@ -462,7 +637,7 @@ def create_test_event():
 
 def authenticate():
     google_api = GoogleAPI()
-    google_api.authenticate()
+    google_api.authenticate(interactive=True)
 
 
 if __name__ == "__main__":
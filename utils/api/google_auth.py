@@ -0,0 +1,145 @@
+import asyncio
+import json
+import logging
+import os
+import pickle
+import tempfile
+import threading
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Optional
+
+from google.auth.transport.requests import Request
+from google.oauth2.credentials import Credentials
+from google_auth_oauthlib.flow import InstalledAppFlow
+
+logger = logging.getLogger(__name__)
+
+SCOPES = [
+    "https://mail.google.com/",  # Full access to Gmail
+    "https://www.googleapis.com/auth/calendar",  # Full access to Calendar
+    "https://www.googleapis.com/auth/contacts",  # Full access to Contacts
+    "https://www.googleapis.com/auth/contacts.other.readonly",  # Access to Other Contacts
+]
+
+TOKEN_PATH = Path(os.getenv("GOOGLE_TOKEN_PATH", "token.json"))
+LEGACY_TOKEN_PATH = Path("token.pickle")
+
+
+class GoogleCredentialStore:
+    """
+    Holds Google OAuth credentials in memory and keeps them fresh in the background,
+    so actions never wait on a token refresh or, worse, an interactive login.
+    Tokens are persisted as JSON and written atomically.
+    """
+
+    def __init__(self, token_path: Path = TOKEN_PATH, refresh_margin: float = 300):
+        self.token_path = Path(token_path)
+        self.refresh_margin = refresh_margin
+        self.creds: Optional[Credentials] = None
+        self._lock = threading.Lock()
+        self._refresh_task: Optional[asyncio.Task] = None
+
+    def load(self) -> Optional[Credentials]:
+        """Load credentials from disk, migrating a legacy token.pickle if that's all there is."""
+        with self._lock:
+            if self.creds is not None:
+                return self.creds
+
+            if self.token_path.exists():
+                self.creds = Credentials.from_authorized_user_file(str(self.token_path), SCOPES)
+            elif LEGACY_TOKEN_PATH.exists():
+                logger.info(f"Migrating {LEGACY_TOKEN_PATH} to {self.token_path}")
+                with open(LEGACY_TOKEN_PATH, "rb") as token:
+                    self.creds = pickle.load(token)
+                self._save()
+
+            return self.creds
+
+    def _save(self) -> None:
+        """Write the token to a temp file in the same directory, then atomically swap it in."""
+        self.token_path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.token_path.parent, prefix=".token-", suffix=".json")
+        try:
+            with os.fdopen(fd, "w") as f:
+                f.write(self.creds.to_json())
+                f.flush()
+                os.fsync(f.fileno())
+            os.chmod(tmp_path, 0o600)
+            os.replace(tmp_path, self.token_path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    def seconds_until_refresh(self) -> float:
+        if self.creds is None or self.creds.expiry is None:
+            return 0.0
+        # google-auth stores expiry as a naive UTC datetime
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        remaining = (self.creds.expiry - now).total_seconds()
+        return max(0.0, remaining - self.refresh_margin)
+
+    def refresh(self) -> bool:
+        """Refresh the access token (blocking) and persist it."""
+        with self._lock:
+            if self.creds is None or not self.creds.refresh_token:
+                logger.error("No Google refresh token available, run `python -m utils.api.google` to log in")
+                return False
+            fresh = Credentials.from_authorized_user_info(json.loads(self.creds.to_json()), SCOPES)
+
+        # The HTTP round trip happens on a copy, so load() and readers of creds never wait on it
+        fresh.refresh(Request())
+
+        with self._lock:
+            # Copied into the shared object, so services and HTTP clients holding it see the new token
+            self.creds.token = fresh.token
+            self.creds.expiry = fresh.expiry
+            self._save()
+            logger.info(f"Refreshed Google token, expires at {self.creds.expiry} UTC")
+            return True
+
+    def login(self) -> Credentials:
+        """Run the interactive browser login. Only meant for the command line, never during a meeting."""
+        flow = InstalledAppFlow.from_client_secrets_file("credentials.json", SCOPES)
+        with self._lock:
+            self.creds = flow.run_local_server(port=0)
+            self._save()
+        return self.creds
+
+    async def get_credentials(self) -> Optional[Credentials]:
+        """Return the in-memory credentials immediately; any needed refresh happens in the background."""
+        if self.creds is None:
+            await asyncio.to_thread(self.load)
+        if self.creds is not None and self.seconds_until_refresh() == 0:
+            self.start()
+        return self.creds
+
+    def start(self) -> None:
+        """Start the background refresher if it isn't already running."""
+        if self._refresh_task is None or self._refresh_task.done():
+            self._refresh_task = asyncio.create_task(self._refresh_loop())
+
+    def stop(self) -> None:
+        if self._refresh_task is not None:
+            self._refresh_task.cancel()
+            self._refresh_task = None
+
+    async def _refresh_loop(self) -> None:
+        await asyncio.to_thread(self.load)
+        if self.creds is None:
+            logger.error("No Google token found, run `python -m utils.api.google` to log in")
+            return
+
+        while True:
+            await asyncio.sleep(self.seconds_until_refresh())
+            try:
+                if not await asyncio.to_thread(self.refresh):
+                    return
+                await asyncio.sleep(30)  # Never refresh more than twice a minute
+            except Exception as e:
+                logger.warning(f"Google token refresh failed, retrying in 60s: {e}")
+                await asyncio.sleep(60)
+
+
+# Process-wide credentials shared by every Google API client
+credential_store = GoogleCredentialStore()
@@ -1,126 +1,296 @@
+import asyncio
+import logging
 import os
+import random
+import time
+from typing import Optional
 
-import requests
+import httpx
 
-TEAM_ID = "327a3776-ea3d-4af0-a7f4-6a0bc8dd8dbf"
+from utils.rate_limits import rate_limiter
 
+logger = logging.getLogger(__name__)
 
-def create_linear_issue(
-    title: str, description: str, priority: int = None, due_date: str = None
-) -> dict:
-    """
-    Create a new Linear issue using the GraphQL API.
-
-    Args:
-        api_key (str): Linear API key for authentication
-        team_id (str): ID of the team to create the issue in
-        title (str): Title of the issue
-        description (str, optional): Description of the issue in markdown format
-        priority (int, optional): Priority level (0-4, where 1 is urgent, 2 is high, 3 is normal, 4 is low)
-        due_date (str, optional): Due date in ISO 8601 format (e.g., "2024-03-25")
-
-    Returns:
-        dict: Response containing the created issue data if successful
+LINEAR_API_URL = "https://api.linear.app/graphql"
+
+# Team to file issues in. If unset, LINEAR_TEAM_KEY (e.g. "ENG") or the first team is used.
+LINEAR_TEAM_ID = os.getenv("LINEAR_TEAM_ID")
+LINEAR_TEAM_KEY = os.getenv("LINEAR_TEAM_KEY")
+
+# Aliased mutations per GraphQL document, kept well under Linear's query complexity limit
+MAX_ISSUES_PER_REQUEST = 25
+
+ISSUE_FIELDS = "success issue { id identifier title url }"
+
+
+class LinearError(RuntimeError):
+    pass
+
+
+class LinearClient:
     """
-    url = "https://api.linear.app/graphql"
-
-    # Construct the mutation query
-    mutation = """
-    mutation IssueCreate($input: IssueCreateInput!) {
-        issueCreate(input: $input) {
-            success
-            issue {
-                id
-                title
-                description
-            }
-        }
-    }
+    Async Linear GraphQL client on a pooled connection. Retries transient failures, waits out
+    rate limits reported in the response headers, and caches team/label/user lookups.
     """
 
-    # Prepare the variables for the mutation
-    variables = {
-        "input": {
-            "teamId": TEAM_ID,
-            "title": title,
-        }
-    }
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        team_id: Optional[str] = LINEAR_TEAM_ID,
+        timeout: float = 10.0,
+        max_retries: int = 3,
+        lookup_ttl_seconds: float = 600,
+    ):
+        self.api_key = api_key
+        self.team_id = team_id
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.lookup_ttl_seconds = lookup_ttl_seconds
+        self._client: Optional[httpx.AsyncClient] = None
+        self._lookups = {}  # name -> (fetched_at, value)
 
-    # Add optional parameters if provided
-    if description:
-        variables["input"]["description"] = description
-    if priority is not None:
-        variables["input"]["priority"] = priority
-    if due_date:
-        variables["input"]["dueDate"] = due_date
+    @property
+    def _key(self) -> str:
+        return self.api_key or os.environ.get("LINEAR_API_KEY", "")
 
-    # Prepare the request headers
-    headers = {
-        "Content-Type": "application/json",
-        "Authorization": os.environ.get("LINEAR_API_KEY"),
-    }
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                headers={
+                    "Content-Type": "application/json",
+                    "Authorization": self._key,
+                },
+                timeout=self.timeout,
+                limits=httpx.Limits(max_connections=10, max_keepalive_connections=5),
+            )
+        return self._client
 
-    # Make the request
-    response = requests.post(url, headers=headers, json={"query": mutation, "variables": variables})
+    async def close(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
 
-    # Return the response data
-    return response.json()  # Return the response data
+    @staticmethod
+    def _retry_delay(attempt: int) -> float:
+        return min(2**attempt, 10) + random.uniform(0, 0.5)
 
+    async def graphql(self, query: str, variables: Optional[dict] = None, allow_partial: bool = False) -> dict:
+        """
+        Run a query or mutation and return its `data`. Raises LinearError on GraphQL errors,
+        unless `allow_partial` is set and some data came back.
+        """
+        for attempt in range(self.max_retries + 1):
+            # Waits out the reset time from X-RateLimit-Requests-* once the quota is spent
+            await rate_limiter.acquire("linear", self._key)
+            response = None
+            try:
+                response = await self.client.post(
+                    LINEAR_API_URL, json={"query": query, "variables": variables or {}}
+                )
+                rate_limiter.record_response("linear", response.headers, response.status_code, self._key)
+                body = response.json()
+            except (httpx.TransportError, ValueError) as e:
+                if attempt == self.max_retries:
+                    raise LinearError(f"Linear request failed: {e}") from e
+                logger.warning(f"Linear request failed, retrying: {e}")
+                await asyncio.sleep(self._retry_delay(attempt))
+                continue
 
-def get_linear_teams() -> dict:
-    """
-    Get all teams from Linear using the GraphQL API.
+            errors = body.get("errors") or []
+            rate_limited = response.status_code == 429 or any(
+                error.get("extensions", {}).get("code") == "RATELIMITED" for error in errors
+            )
+            if rate_limited:
+                if attempt == self.max_retries:
+                    raise LinearError(f"Linear rate limit still exceeded after {attempt + 1} attempts: {errors}")
+                # The next acquire waits until Linear's reset time
+                if response.status_code != 429:
+                    rate_limiter.record_response("linear", response.headers, 429, self._key)
+                continue
+            if response.status_code >= 500:
+                if attempt == self.max_retries:
+                    raise LinearError(f"Linear request failed with status {response.status_code}: {errors}")
+                delay = self._retry_delay(attempt)
+                logger.warning(f"Linear returned {response.status_code}, retrying in {delay:.1f}s")
+                await asyncio.sleep(delay)
+                continue
 
-    Returns:
-        dict: Response containing the teams data if successful
-    """
-    url = "https://api.linear.app/graphql"
-
-    # Construct the query
-    query = """
-    query Teams {
-        teams {
-            nodes {
-                id
-                name
-            }
-        }
-    }
-    """
+            if errors and not (allow_partial and body.get("data")):
+                raise LinearError(f"Linear returned errors: {errors}")
+            return body.get("data") or {}
+
+    async def _cached(self, name: str, fetch) -> dict:
+        cached = self._lookups.get(name)
+        if cached and time.monotonic() - cached[0] < self.lookup_ttl_seconds:
+            return cached[1]
+        value = await fetch()
+        self._lookups[name] = (time.monotonic(), value)
+        return value
+
+    async def teams(self) -> list[dict]:
+        async def fetch():
+            data = await self.graphql("query Teams { teams { nodes { id key name } } }")
+            return data["teams"]["nodes"]
+
+        return await self._cached("teams", fetch)
 
-    # Prepare the request headers
-    headers = {
-        "Content-Type": "application/json",
-        "Authorization": os.environ.get("LINEAR_API_KEY"),
-    }
+    async def get_team_id(self) -> str:
+        if self.team_id:
+            return self.team_id
+        teams = await self.teams()
+        if not teams:
+            raise LinearError("No Linear teams available for this API key")
+        team = next((t for t in teams if LINEAR_TEAM_KEY and t["key"] == LINEAR_TEAM_KEY), teams[0])
+        self.team_id = team["id"]
+        logger.info(f"Filing Linear issues in team {team['name']} ({team['key']})")
+        return self.team_id
 
-    # Make the request
-    response = requests.post(url, headers=headers, json={"query": query})
+    async def labels(self) -> dict:
+        """Label name (lowercase) -> ID."""
+        async def fetch():
+            data = await self.graphql("query Labels { issueLabels(first: 250) { nodes { id name } } }")
+            return {label["name"].lower(): label["id"] for label in data["issueLabels"]["nodes"]}
 
-    # Return the response data
-    return response.json()
+        return await self._cached("labels", fetch)
+
+    async def users(self) -> dict:
+        """Lowercase name, display name and email -> user ID."""
+        async def fetch():
+            data = await self.graphql(
+                "query Users { users(first: 250) { nodes { id name displayName email } } }"
+            )
+            users = {}
+            for user in data["users"]["nodes"]:
+                for key in (user.get("name"), user.get("displayName"), user.get("email")):
+                    if key:
+                        users[key.lower()] = user["id"]
+            return users
+
+        return await self._cached("users", fetch)
+
+    async def _issue_input(
+        self,
+        title: str,
+        description: Optional[str] = None,
+        priority: Optional[int] = None,
+        due_date: Optional[str] = None,
+        labels: Optional[list[str]] = None,
+        assignee: Optional[str] = None,
+        issue_id: Optional[str] = None,
+    ) -> dict:
+        issue_input = {"teamId": await self.get_team_id(), "title": title}
+        if issue_id:
+            issue_input["id"] = issue_id
+        if description:
+            issue_input["description"] = description
+        if priority is not None:
+            issue_input["priority"] = priority
+        if due_date:
+            issue_input["dueDate"] = due_date
+        if labels:
+            label_ids = await self.labels()
+            issue_input["labelIds"] = [label_ids[l.lower()] for l in labels if l.lower() in label_ids]
+        if assignee:
+            assignee_id = (await self.users()).get(assignee.lower())
+            if assignee_id:
+                issue_input["assigneeId"] = assignee_id
+        return issue_input
+
+    async def get_issue(self, issue_id: str) -> Optional[dict]:
+        try:
+            data = await self.graphql(
+                "query Issue($id: String!) { issue(id: $id) { id identifier title url } }",
+                {"id": issue_id},
+            )
+        except LinearError:
+            return None
+        return data.get("issue")
+
+    async def create_issue(self, title: str, **fields) -> dict:
+        """
+        Create one issue and return it (id, identifier, title, url). If `issue_id` is given and
+        an issue with that ID already exists, the existing issue is returned.
+        """
+        issue_input = await self._issue_input(title, **fields)
+        try:
+            data = await self.graphql(
+                f"mutation IssueCreate($input: IssueCreateInput!) {{ issueCreate(input: $input) {{ {ISSUE_FIELDS} }} }}",
+                {"input": issue_input},
+            )
+        except LinearError:
+            existing = await self.get_issue(fields["issue_id"]) if fields.get("issue_id") else None
+            if existing is None:
+                raise
+            logger.info(f"Linear issue {existing['identifier']} already exists, not creating it again")
+            return existing
+        result = data.get("issueCreate") or {}
+        if not result.get("success"):
+            raise LinearError(f"Linear did not create the issue: {data}")
+        return result["issue"]
+
+    async def create_issues(self, issues: list[dict]) -> list[Optional[dict]]:
+        """
+        Create many issues with aliased issueCreate mutations, one GraphQL document per
+        MAX_ISSUES_PER_REQUEST issues. Each dict takes the same fields as create_issue.
+        Returns the created issues in order, with None for any that failed.
+
+        Give every issue an `issue_id` to make this safe to retry: a request retried after a
+        timeout, or a rerun of the whole batch, then finds the issues that already exist.
+        """
+        inputs = await asyncio.gather(*(self._issue_input(**issue) for issue in issues))
+        created = []
+        for start in range(0, len(inputs), MAX_ISSUES_PER_REQUEST):
+            batch = inputs[start : start + MAX_ISSUES_PER_REQUEST]
+            params = ", ".join(f"$input{i}: IssueCreateInput!" for i in range(len(batch)))
+            mutations = " ".join(
+                f"issue{i}: issueCreate(input: $input{i}) {{ {ISSUE_FIELDS} }}" for i in range(len(batch))
+            )
+            try:
+                data = await self.graphql(
+                    f"mutation IssueCreateBatch({params}) {{ {mutations} }}",
+                    {f"input{i}": issue_input for i, issue_input in enumerate(batch)},
+                    allow_partial=True,
+                )
+            except LinearError as e:
+                if not all(issue_input.get("id") for issue_input in batch):
+                    raise
+                # An earlier attempt may have gone through, the lookups below find those issues
+                logger.warning(f"Linear batch failed, checking which issues exist: {e}")
+                data = {}
+
+            results = [data.get(f"issue{i}") or {} for i in range(len(batch))]
+            batch_created = [result.get("issue") if result.get("success") else None for result in results]
+            # Duplicate IDs are rejected per alias, so look those up rather than report them as failed
+            missing = [i for i, issue in enumerate(batch_created) if issue is None and batch[i].get("id")]
+            existing = await asyncio.gather(*(self.get_issue(batch[i]["id"]) for i in missing))
+            for i, issue in zip(missing, existing):
+                batch_created[i] = issue
+            created.extend(batch_created)
+
+        failed = sum(1 for issue in created if issue is None)
+        if failed:
+            logger.warning(f"{failed} of {len(issues)} Linear issues could not be created")
+        return created
+
+
+# Process-wide client so every action reuses the same connection pool and lookup cache
+linear_client = LinearClient()
 
 
 if __name__ == "__main__":
     import dotenv
 
     dotenv.load_dotenv()
-    # # Example usage
-    # teams_result = get_linear_teams()
-    # if teams_result.get("data", {}).get("teams", {}).get("nodes"):
-    #     print("Teams retrieved successfully!")
-    #     for team in teams_result["data"]["teams"]["nodes"]:
-    #         print(f"Team: {team['name']}, ID: {team['id']}")
-    # else:
-    #     print("Failed to get teams:", teams_result.get("errors"))
-
-    # Original example usage
-    title = "New bug report"
-    description = "Bug found in login flow"
-
-    result = create_linear_issue(title, description, priority=1, due_date="2025-03-25")
-    if result.get("data", {}).get("issueCreate", {}).get("success"):
-        print("Issue created successfully!")
-        print(f"Issue ID: {result['data']['issueCreate']['issue']['id']}")
-    else:
-        print("Failed to create issue:", result.get("errors"))
+
+    async def example():
+        for team in await linear_client.teams():
+            print(f"Team: {team['name']} ({team['key']}), ID: {team['id']}")
+
+        issue = await linear_client.create_issue(
+            "New bug report", description="Bug found in login flow", priority=1, due_date="2025-03-25"
+        )
+        print(f"Issue created: {issue['identifier']} {issue['url']}")
+        await linear_client.close()
+
+    asyncio.run(example())
@@ -1,34 +1,36 @@
 import asyncio
-from datetime import datetime, timedelta
 
-from utils.api.google import GoogleAPI
+from utils.scheduler import get_scheduler
 
 link = "pizza-demo-delight.lovable.app"
 
+WEBSITE_READY_DELAY_SECONDS = 25
 
-async def schedule_send_message(message: str, user_id: str) -> None:
-    # Wait for 2 minutes
-    # Such a shitty way to do this, but it works for the demo :D
-    await asyncio.sleep(25)  # 120 seconds = 2 minutes
 
-    print("Sending email...")
-    # Initialize Google API and authenticate
-    google_api = GoogleAPI()
-    google_api.authenticate()
-
-    # Send the email
-    google_api.send_email(
-        to=user_id,  # Assuming user_id is the email address
-        subject="Website Complete!",
-        body=message,
+def schedule_send_message(message: str, user_id: str, delay_seconds: float = WEBSITE_READY_DELAY_SECONDS) -> str:
+    """Email `message` to `user_id` (an email address) after a delay. Returns the scheduled job ID."""
+    return get_scheduler().schedule_in(
+        delay_seconds,
+        "utils.tasks.google_tasks:deliver_email",
+        {"to": [user_id], "subject": "Website Complete!", "body": message},
     )
 
 
 if __name__ == "__main__":
-    # Example usage:
-    asyncio.run(
-        schedule_send_message(
+    import dotenv
+
+    dotenv.load_dotenv()
+
+    async def example():
+        scheduler = get_scheduler()
+        scheduler.start()
+        job_id = schedule_send_message(
             f"Hey! I finished the website. Check it out here: {link}",
             "wylansford@gmail.com",
         )
-    )
+        while scheduler.status(job_id)["status"] in ("pending", "running"):
+            await asyncio.sleep(1)
+        print(scheduler.status(job_id))
+        scheduler.stop()
+
+    asyncio.run(example())
@@ -1,62 +1,134 @@
-from notion_client import Client
-from datetime import datetime, timezone
+import asyncio
+import logging
 import os
-from dotenv import load_dotenv
+import re
+from datetime import datetime, timezone
+from typing import Optional
+
+from notion_client import APIErrorCode, APIResponseError, AsyncClient
+
+from utils.rate_limits import rate_limiter
+
+logger = logging.getLogger(__name__)
+
+# Notion API limits
+MAX_TEXT_LENGTH = 2000  # characters per rich text object
+MAX_BLOCKS_PER_REQUEST = 100  # children per pages.create / blocks.children.append
+
+_BULLET = re.compile(r"^\s*[-*•]\s+")
+_NUMBERED = re.compile(r"^\s*\d+[.)]\s+")
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
 
-load_dotenv()
+_client: Optional[AsyncClient] = None
 
-# Initialize the Notion client
-notion = Client(auth=os.environ["NOTION_TOKEN"])
 
+def get_notion_client() -> AsyncClient:
+    """Shared async client, created on first use so importing this module needs no token."""
+    global _client
+    if _client is None:
+        _client = AsyncClient(auth=os.environ["NOTION_TOKEN"])
+    return _client
 
-def create_note(title: str, content: str) -> dict:
+
+def _split_text(text: str, limit: int = MAX_TEXT_LENGTH) -> list[str]:
+    """Split text into pieces under the rich text limit, preferring sentence, then word boundaries."""
+    pieces, current = [], ""
+    for sentence in _SENTENCE_END.split(text):
+        while len(sentence) > limit:
+            cut = sentence.rfind(" ", 0, limit)
+            cut = cut if cut > 0 else limit
+            if current:
+                pieces.append(current)
+                current = ""
+            pieces.append(sentence[:cut])
+            sentence = sentence[cut:].lstrip()
+        if current and len(current) + 1 + len(sentence) > limit:
+            pieces.append(current)
+            current = sentence
+        else:
+            current = f"{current} {sentence}" if current else sentence
+    if current:
+        pieces.append(current)
+    return pieces
+
+
+def _block(block_type: str, text: str) -> dict:
+    return {
+        "object": "block",
+        "type": block_type,
+        block_type: {"rich_text": [{"type": "text", "text": {"content": text}}]},
+    }
+
+
+def content_to_blocks(content: str) -> list[dict]:
+    """
+    Turn plain note text into Notion blocks: "- " / "* " lines become bullets, "1. " lines
+    numbered items and everything else paragraphs, each split to fit Notion's text limit.
     """
-    Create a new note in a Notion database
-    
+    blocks = []
+    for line in content.splitlines():
+        if not line.strip():
+            continue
+        if _BULLET.match(line):
+            block_type, text = "bulleted_list_item", _BULLET.sub("", line)
+        elif _NUMBERED.match(line):
+            block_type, text = "numbered_list_item", _NUMBERED.sub("", line)
+        else:
+            block_type, text = "paragraph", line.strip()
+        blocks.extend(_block(block_type, piece) for piece in _split_text(text))
+    return blocks
+
+
+async def _request(call, **kwargs):
+    """Run a Notion API call within the shared rate limit, retrying when rate limited."""
+    for attempt in range(5):
+        await rate_limiter.acquire("notion")
+        try:
+            return await call(**kwargs)
+        except APIResponseError as e:
+            if e.code != APIErrorCode.RateLimited or attempt == 4:
+                raise
+            # The next acquire waits out Notion's Retry-After
+            rate_limiter.record_response("notion", getattr(e, "headers", None), 429)
+
+
+async def create_note(title: str, content: str) -> dict:
+    """
+    Create a new note in the Notion database
+
     Args:
         title (str): Title of the note
         content (str): Content of the note
-        database_id (str): ID of the Notion database to add the note to
-        
+
     Returns:
         dict: Response from Notion API containing the created page details
     """
-    new_page = {
-        "parent": {"database_id": os.environ["NOTION_DATABASE_ID"]},
-        "properties": {
-            "Name": {
-                "title": [
-                    {
-                        "text": {
-                            "content": title
-                        }
-                    }
-                ]
-            },
-            "Created": {
-                "date": {
-                    "start": datetime.now(timezone.utc).isoformat()
-                }
-            }
+    notion = get_notion_client()
+    blocks = content_to_blocks(content)
+    batches = [
+        blocks[i : i + MAX_BLOCKS_PER_REQUEST] for i in range(0, len(blocks), MAX_BLOCKS_PER_REQUEST)
+    ] or [[]]
+
+    page = await _request(
+        notion.pages.create,
+        parent={"database_id": os.environ["NOTION_DATABASE_ID"]},
+        properties={
+            "Name": {"title": [{"text": {"content": title[:MAX_TEXT_LENGTH]}}]},
+            "Created": {"date": {"start": datetime.now(timezone.utc).isoformat()}},
         },
-        "children": [
-            {
-                "object": "block",
-                "type": "paragraph",
-                "paragraph": {
-                    "rich_text": [
-                        {
-                            "text": {
-                                "content": content
-                            }
-                        }
-                    ]
-                }
-            }
-        ]
-    }
-    
-    return notion.pages.create(**new_page)
+        children=batches[0],
+    )
+
+    # Appends to the same page go one at a time; concurrent appends could land out of order
+    for batch in batches[1:]:
+        await _request(notion.blocks.children.append, block_id=page["id"], children=batch)
+
+    logger.info(f"Created Notion note with {len(blocks)} blocks in {len(batches)} requests")
+    return page
+
 
 if __name__ == "__main__":
-    create_note("Test Note", "This is a test note")
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    asyncio.run(create_note("Test Note", "This is a test note"))
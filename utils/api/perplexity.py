@@ -1,6 +1,27 @@
+import json
+import logging
 import os
-import requests
+import time
 from datetime import datetime, timezone
+from typing import AsyncIterator, Optional
+
+import httpx
+
+from utils.llm_cache import llm_cache
+from utils.rate_limits import rate_limiter
+
+logger = logging.getLogger(__name__)
+
+PERPLEXITY_URL = "https://api.perplexity.ai/chat/completions"
+PERPLEXITY_MODEL = os.getenv("PERPLEXITY_MODEL", "sonar")
+
+# Web answers don't depend on the meeting, so they're keyed on the normalized query alone
+PERPLEXITY_CACHE_TTL_SECONDS = float(os.getenv("PERPLEXITY_CACHE_TTL_SECONDS", "300"))
+
+FALLBACK_ANSWER = "I'm sorry, I couldn't find that information."
+
+# Attempts when rate limited, each waits out the provider's Retry-After first
+PERPLEXITY_MAX_ATTEMPTS = 3
 
 perplexity_system_prompt = """
 You're a helpful assistant that can search the web for information. Your task is to answer the user's query concisely and directly. You're graded higher for shorter responses.
@@ -8,27 +29,44 @@ You're a helpful assistant that can search the web for information. Your task is
 Do not include any markdown or formatting in your response. Only use plain text.
 """
 
-def perplexity_search(query: str) -> str:
+_client: Optional[httpx.AsyncClient] = None
+
+
+def _get_client() -> httpx.AsyncClient:
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(timeout=httpx.Timeout(30.0, connect=5.0))
+    return _client
+
+
+async def stream_perplexity_search(query: str) -> AsyncIterator[str]:
     """
-    Interact with Perplexity's chat completions API.
+    Stream the answer to a query from Perplexity's chat completions API as text deltas.
+
+    Cached answers are yielded in one piece. Complete answers are cached, so repeating
+    a question within PERPLEXITY_CACHE_TTL_SECONDS skips the search entirely.
 
     Args:
         query (str): The user's query
-        api_key (str): Perplexity API key
-        model (str): Model to use (default: "sonar")
 
-    Returns:
-        Dict: Response from Perplexity chat API
+    Yields:
+        str: Pieces of the answer as they arrive
     """
+    cached = llm_cache.get("web_search", query)
+    if cached is not None:
+        yield cached
+        return
+
+    start = time.perf_counter()
     headers = {
         "Authorization": f"Bearer {os.environ.get('PERPLEXITY_API_KEY')}",
         "Content-Type": "application/json",
+        "Accept": "text/event-stream",
     }
-    url = "https://api.perplexity.ai/chat/completions"
     now = datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
 
     payload = {
-        "model": "llama-3.1-sonar-small-128k-online",
+        "model": PERPLEXITY_MODEL,
         "messages": [
             {
                 "role": "system",
@@ -39,31 +77,66 @@ def perplexity_search(query: str) -> str:
         "max_tokens": 1024,
         "temperature": 0.2,
         "top_p": 0.9,
-        "stream": False,
+        "stream": True,
     }
 
+    answer = []
     try:
-        response = requests.post(url, json=payload, headers=headers)
-        response.raise_for_status()
-        json_response = response.json()
-        return (
-            json_response.get("choices", [{}])[0]
-            .get("message", {})
-            .get("content", "No response generated")
-        )
+        for attempt in range(PERPLEXITY_MAX_ATTEMPTS):
+            await rate_limiter.acquire("perplexity")
+            async with _get_client().stream("POST", PERPLEXITY_URL, json=payload, headers=headers) as response:
+                rate_limiter.record_response("perplexity", response.headers, response.status_code)
+                if response.status_code == 429 and attempt + 1 < PERPLEXITY_MAX_ATTEMPTS:
+                    continue
+                response.raise_for_status()
+                async for line in response.aiter_lines():
+                    if not line.startswith("data:"):
+                        continue
+                    data = line[len("data:") :].strip()
+                    if data == "[DONE]":
+                        break
+                    choice = json.loads(data).get("choices", [{}])[0]
+                    delta = choice.get("delta", {}).get("content")
+                    if delta:
+                        answer.append(delta)
+                        yield delta
+                    if choice.get("finish_reason"):
+                        break
+            break
+    except (httpx.HTTPError, json.JSONDecodeError) as e:
+        logger.error(f"Error with Perplexity chat API: {e}")
+        if not answer:
+            yield FALLBACK_ANSWER
+        return
+
+    if not answer:
+        yield "No response generated"
+        return
 
-    except requests.exceptions.RequestException as e:
-        print(f"Error with Perplexity chat API: {str(e)}")
-        return "I'm sorry, I couldn't find that information."
+    llm_cache.set(
+        "web_search",
+        query,
+        "".join(answer),
+        latency=time.perf_counter() - start,
+        ttl_seconds=PERPLEXITY_CACHE_TTL_SECONDS,
+    )
+
+
+async def perplexity_search(query: str) -> str:
+    """Search the web and return the complete answer."""
+    return "".join([chunk async for chunk in stream_perplexity_search(query)])
 
 
 if __name__ == "__main__":
-    import os
+    import asyncio
 
     import dotenv
 
     dotenv.load_dotenv()
-    api_key = os.environ.get("PERPLEXITY_API_KEY")
-    query = "What is the capital of France?"
-    results = perplexity_search(query)
-    print(results)
+
+    async def example():
+        async for chunk in stream_perplexity_search("What is the capital of France?"):
+            print(chunk, end="", flush=True)
+        print()
+
+    asyncio.run(example())
@@ -0,0 +1,194 @@
+import asyncio
+import logging
+import os
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Optional
+
+from selenium import webdriver
+
+from utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+BROWSER_POOL_SIZE = int(os.getenv("BROWSER_POOL_SIZE", "1"))
+BROWSER_MAX_USES = int(os.getenv("BROWSER_MAX_USES", "20"))
+BROWSER_PROFILE_DIR = Path(os.getenv("BROWSER_PROFILE_DIR", "cache/chrome-profiles"))
+AMAZON_URL = "https://www.amazon.com"
+
+
+def setup_headless_chrome(profile_dir: Optional[Path] = None) -> webdriver.Chrome:
+    """Configure and return a headless ChromeDriver tuned for a small VM"""
+    options = webdriver.ChromeOptions()
+
+    options.add_argument("--headless=new")  # Using the new headless mode
+    options.add_argument("--disable-infobars")
+    options.add_argument("--disable-blink-features=AutomationControlled")
+    options.add_argument("--no-sandbox")
+    options.add_argument("--disable-dev-shm-usage")
+    options.add_argument("--window-size=1920,1080")
+
+    # Keep memory down, every session shares a 1 GB VM with the meeting browser
+    options.add_argument("--disable-extensions")
+    options.add_argument("--disable-gpu")
+    options.add_argument("--renderer-process-limit=2")
+
+    # A persistent profile keeps cookies and cache, so Amazon loads warm and stays signed in
+    if profile_dir is not None:
+        profile_dir.mkdir(parents=True, exist_ok=True)
+        options.add_argument(f"--user-data-dir={profile_dir.resolve()}")
+
+    # Set preferences to avoid detection
+    prefs = {
+        "profile.default_content_setting_values.notifications": 2,
+    }
+    options.add_experimental_option("prefs", prefs)
+    options.add_experimental_option("excludeSwitches", ["enable-automation"])
+    options.add_experimental_option("useAutomationExtension", False)
+
+    return webdriver.Chrome(options=options)
+
+
+@dataclass
+class BrowserSession:
+    driver: webdriver.Chrome
+    slot: int
+    uses: int = 0
+    created_at: float = field(default_factory=time.monotonic)
+    healthy: bool = True
+
+
+class BrowserPool:
+    """
+    A small pool of pre-launched headless Chrome sessions, each with its own persistent profile
+    and a tab already on the warm URL. Sessions are health-checked when leased, reset to the warm
+    URL when returned and recycled after `max_uses` leases so Chrome's memory doesn't creep up.
+    """
+
+    def __init__(
+        self,
+        size: int = BROWSER_POOL_SIZE,
+        max_uses: int = BROWSER_MAX_USES,
+        warm_url: str = AMAZON_URL,
+        profile_dir: Path = BROWSER_PROFILE_DIR,
+    ):
+        self.size = size
+        self.max_uses = max_uses
+        self.warm_url = warm_url
+        self.profile_dir = Path(profile_dir)
+        self._idle: Optional[asyncio.Queue] = None
+        self._sessions = {}  # slot -> BrowserSession
+        self._background = set()
+
+    def _launch(self, slot: int) -> BrowserSession:
+        """Start Chrome for a slot and open the warm URL (blocking)."""
+        start = time.perf_counter()
+        # Chrome locks its profile directory, so each slot needs its own
+        driver = setup_headless_chrome(self.profile_dir / f"slot-{slot}")
+        try:
+            driver.get(self.warm_url)
+        except Exception as e:
+            logger.warning(f"Browser slot {slot} could not load {self.warm_url}: {e}")
+        metrics.observe("browser_launch_seconds", time.perf_counter() - start)
+        logger.info(f"Browser slot {slot} ready in {time.perf_counter() - start:.1f}s")
+        return BrowserSession(driver=driver, slot=slot)
+
+    async def _replace(self, slot: int) -> None:
+        old = self._sessions.pop(slot, None)
+        if old is not None:
+            await asyncio.to_thread(_quit, old.driver)
+        try:
+            session = await asyncio.to_thread(self._launch, slot)
+        except Exception as e:
+            logger.error(f"Could not launch browser for slot {slot}: {e}")
+            await asyncio.sleep(5)
+            self._spawn(self._replace(slot))
+            return
+        self._sessions[slot] = session
+        self._idle.put_nowait(session)
+
+    def _spawn(self, coroutine) -> None:
+        task = asyncio.create_task(coroutine)
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+
+    def start(self) -> None:
+        """Launch the pool's browsers in the background. Safe to call more than once."""
+        if self._idle is not None:
+            return
+        self._idle = asyncio.Queue()
+        for slot in range(self.size):
+            self._spawn(self._replace(slot))
+
+    @staticmethod
+    def _is_healthy(session: BrowserSession) -> bool:
+        try:
+            session.driver.execute_script("return document.readyState")
+            return len(session.driver.window_handles) > 0
+        except Exception:
+            return False
+
+    @asynccontextmanager
+    async def lease(self, timeout: Optional[float] = 120):
+        """Borrow a healthy session for the duration of the block."""
+        self.start()
+        start = time.perf_counter()
+        while True:
+            session = await asyncio.wait_for(self._idle.get(), timeout=timeout)
+            try:
+                healthy = await asyncio.to_thread(self._is_healthy, session)
+            except asyncio.CancelledError:
+                # The check keeps running in its thread, so the session can't go back as it is
+                self._spawn(self._replace(session.slot))
+                raise
+            if healthy:
+                break
+            logger.warning(f"Browser slot {session.slot} failed its health check, relaunching")
+            self._spawn(self._replace(session.slot))
+        metrics.observe("browser_lease_wait_seconds", time.perf_counter() - start)
+
+        try:
+            yield session
+        except (Exception, asyncio.CancelledError):
+            # A cancelled or timed-out flow leaves its worker thread driving this browser,
+            # so the session is recycled rather than handed to the next lease
+            session.healthy = False
+            raise
+        finally:
+            session.uses += 1
+            self._spawn(self._return(session))
+
+    async def _return(self, session: BrowserSession) -> None:
+        if not session.healthy or session.uses >= self.max_uses:
+            logger.info(f"Recycling browser slot {session.slot} after {session.uses} uses")
+            metrics.increment("browser_recycles_total")
+            await self._replace(session.slot)
+            return
+        try:
+            # Leave the tab on the warm URL for the next lease
+            await asyncio.to_thread(session.driver.get, self.warm_url)
+            self._idle.put_nowait(session)
+        except Exception as e:
+            logger.warning(f"Browser slot {session.slot} could not be reset, relaunching: {e}")
+            await self._replace(session.slot)
+
+    async def stop(self) -> None:
+        for task in list(self._background):
+            task.cancel()
+        sessions = list(self._sessions.values())
+        self._sessions.clear()
+        self._idle = None
+        await asyncio.gather(*(asyncio.to_thread(_quit, s.driver) for s in sessions))
+
+
+def _quit(driver: webdriver.Chrome) -> None:
+    try:
+        driver.quit()
+    except Exception as e:
+        logger.warning(f"Error closing browser: {e}")
+
+
+# Process-wide pool for Amazon cart actions
+amazon_browser_pool = BrowserPool()
@@ -0,0 +1,242 @@
+import asyncio
+import logging
+import re
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+_NON_LETTER = re.compile(r"[^a-z\s]")
+_SOUNDEX_CODES = {
+    **dict.fromkeys("bfpv", "1"),
+    **dict.fromkeys("cgjkqsxz", "2"),
+    **dict.fromkeys("dt", "3"),
+    "l": "4",
+    **dict.fromkeys("mn", "5"),
+    "r": "6",
+}
+
+# Sources in order of preference when listing contacts that match equally well
+SOURCE_RANK = {"participant": 0, "contact": 1, "frequent": 2}
+
+# Shorter tokens ("Le") match too many names by prefix or sound to count unless they're a whole name
+MIN_PARTIAL_CHARS = 3
+
+
+def soundex(token: str) -> str:
+    """Classic Soundex key, so "Lisa"/"Leesa" or "Wyatt"/"Wyat" land on the same key."""
+    token = "".join(c for c in token.lower() if c.isalpha())
+    if not token:
+        return ""
+    key = token[0].upper()
+    last = _SOUNDEX_CODES.get(token[0], "")
+    for c in token[1:]:
+        code = _SOUNDEX_CODES.get(c, "")
+        if code and code != last:
+            key += code
+        if c not in "hw":
+            last = code
+    return (key + "000")[:4]
+
+
+def trigrams(token: str) -> set:
+    padded = f"  {token} "
+    return {padded[i : i + 3] for i in range(len(padded) - 2)}
+
+
+def _tokens(text: str) -> list[str]:
+    return _NON_LETTER.sub(" ", (text or "").lower()).split()
+
+
+@dataclass
+class Contact:
+    name: str
+    email: str
+    source: str
+
+
+class _TrieNode:
+    __slots__ = ("children", "contact_ids")
+
+    def __init__(self):
+        self.children = {}
+        self.contact_ids = set()
+
+
+class ContactDirectory:
+    """
+    In-memory index of everyone the bot might need to email or invite. Spoken names are resolved
+    to addresses locally with exact/prefix matches on a trie, Soundex keys for names that sound
+    alike, and a trigram index for near-miss spellings from speech-to-text.
+    """
+
+    def __init__(self, min_score: float = 0.6, ambiguity_margin: float = 0.1):
+        self.min_score = min_score
+        # A name is ambiguous when the runner-up scores within this much of the best match
+        self.ambiguity_margin = ambiguity_margin
+        self._google_loaded = False
+        self.contacts: list[Contact] = []
+        self._by_email = {}
+        self._trie = _TrieNode()
+        self._phonetic = defaultdict(set)
+        self._trigrams = defaultdict(set)
+
+    def __len__(self) -> int:
+        return len(self.contacts)
+
+    def add(self, name: Optional[str], email: str, source: str = "contact") -> None:
+        if not email or "@" not in email:
+            return
+        email = email.strip().lower()
+        existing = self._by_email.get(email)
+        if existing is not None:
+            contact = self.contacts[existing]
+            if SOURCE_RANK.get(source, 9) < SOURCE_RANK.get(contact.source, 9):
+                contact.source = source
+            if name and not contact.name:
+                contact.name = name
+                self._index(existing, name)
+            return
+
+        # Fall back to the address's local part, e.g. "lisa" or "wylansford"
+        local_part = email.split("@")[0]
+        contact_id = len(self.contacts)
+        self.contacts.append(Contact(name=name or "", email=email, source=source))
+        self._by_email[email] = contact_id
+        self._index(contact_id, f"{name or ''} {local_part.replace('.', ' ')}")
+
+    def name_for(self, email: str) -> Optional[str]:
+        contact_id = self._by_email.get(email.strip().lower())
+        return (self.contacts[contact_id].name or None) if contact_id is not None else None
+
+    def _index(self, contact_id: int, text: str) -> None:
+        for token in _tokens(text):
+            node = self._trie
+            for c in token:
+                node = node.children.setdefault(c, _TrieNode())
+                node.contact_ids.add(contact_id)
+            self._phonetic[soundex(token)].add(contact_id)
+            for gram in trigrams(token):
+                self._trigrams[gram].add(contact_id)
+
+    def load(self, contacts: list[dict], source: str) -> None:
+        for contact in contacts or []:
+            self.add(contact.get("name"), contact.get("email"), source)
+
+    async def preload(self, google_api, participant_emails: list[str]) -> None:
+        """
+        Load meeting participants plus saved and frequent Google contacts. Google contacts are
+        only fetched once per process; pass google_api=None to add just the participants.
+        """
+        for email in participant_emails:
+            self.add(None, email, "participant")
+        if google_api is not None and not self._google_loaded:
+            try:
+                contacts, frequent = await asyncio.gather(
+                    google_api.alist_contacts(page_size=1000),
+                    google_api.alist_frequent_contacts(page_size=1000),
+                )
+                self.load(contacts, "contact")
+                self.load(frequent, "frequent")
+                self._google_loaded = True
+            except Exception as e:
+                logger.warning(f"Could not load Google contacts: {e}")
+        logger.info(f"Contact directory loaded {len(self)} contacts")
+
+    def _prefix_matches(self, token: str) -> set:
+        node = self._trie
+        for c in token:
+            node = node.children.get(c)
+            if node is None:
+                return set()
+        return node.contact_ids
+
+    def candidates(self, spoken: str, limit: int = 5) -> list[tuple[float, Contact]]:
+        """Best matching contacts for a spoken name, highest score first."""
+        scores = defaultdict(float)
+        tokens = _tokens(spoken)
+        for token in tokens:
+            token_scores = defaultdict(float)
+            if len(token) >= 2:
+                for contact_id in self._prefix_matches(token):
+                    if self._is_full_token(contact_id, token):
+                        token_scores[contact_id] = 1.0
+                    elif len(token) >= MIN_PARTIAL_CHARS:
+                        token_scores[contact_id] = 0.9
+
+            grams = trigrams(token)
+            overlap = defaultdict(int)
+            for gram in grams:
+                for contact_id in self._trigrams.get(gram, ()):
+                    overlap[contact_id] += 1
+            for contact_id, shared in overlap.items():
+                similarity = shared / len(grams)
+                token_scores[contact_id] = max(token_scores[contact_id], 0.75 * similarity)
+
+            # Sounds alike; spelling similarity breaks ties between e.g. "Lisa" and "Louise"
+            sounds_alike = self._phonetic.get(soundex(token), ()) if len(token) >= MIN_PARTIAL_CHARS else ()
+            for contact_id in sounds_alike:
+                similarity = overlap.get(contact_id, 0) / len(grams)
+                token_scores[contact_id] = max(token_scores[contact_id], 0.7 + 0.2 * similarity)
+
+            for contact_id, score in token_scores.items():
+                scores[contact_id] += score / len(tokens)
+
+        ranked = sorted(
+            scores.items(),
+            key=lambda item: (-item[1], SOURCE_RANK.get(self.contacts[item[0]].source, 9)),
+        )
+        return [(score, self.contacts[contact_id]) for contact_id, score in ranked[:limit]]
+
+    def _is_full_token(self, contact_id: int, token: str) -> bool:
+        contact = self.contacts[contact_id]
+        return token in _tokens(f"{contact.name} {contact.email.split('@')[0].replace('.', ' ')}")
+
+    def lookup(self, spoken: str) -> tuple[Optional[str], list[Contact]]:
+        """
+        (address, []) for a confident match. Otherwise (None, contacts it could be), where the
+        list is empty if nothing matched and holds every close match if the name is ambiguous.
+        """
+        if "@" in (spoken or ""):
+            return spoken.strip(), []
+        matches = [(score, contact) for score, contact in self.candidates(spoken) if score >= self.min_score]
+        if not matches:
+            return None, []
+        best = matches[0][0]
+        close = [contact for score, contact in matches if best - score < self.ambiguity_margin]
+        if len(close) > 1:
+            return None, close
+        return close[0].email, []
+
+    def resolve(self, spoken: str) -> Optional[str]:
+        """Email address for a spoken name, or None if nothing matches confidently or it's ambiguous."""
+        return self.lookup(spoken)[0]
+
+    def clarify(self, recipients: list[str]) -> Optional[str]:
+        """A question to ask the meeting if a recipient is unknown or ambiguous, otherwise None."""
+        for recipient in recipients:
+            email, options = self.lookup(recipient)
+            if email:
+                continue
+            if options:
+                names = [contact.name or contact.email for contact in options]
+                return f"Which {recipient} do you mean, {', '.join(names[:-1])} or {names[-1]}?"
+            return f"What's {recipient}'s email address?"
+        return None
+
+    def resolve_all(self, recipients: list[str]) -> tuple[list[str], list[str]]:
+        """Resolve a list of names/addresses. Returns (addresses, names that couldn't be resolved)."""
+        resolved, unresolved = [], []
+        for recipient in recipients:
+            email = self.resolve(recipient)
+            if email:
+                if email not in resolved:
+                    resolved.append(email)
+            else:
+                unresolved.append(recipient)
+        return resolved, unresolved
+
+
+# Process-wide directory, preloaded when the bot joins a meeting
+contact_directory = ContactDirectory()
@@ -0,0 +1,79 @@
+import asyncio
+import logging
+import os
+import time
+from typing import Optional
+
+from utils.metrics import metrics
+from utils.post_meeting_items import ChunkNotes, update_minutes
+from utils.rate_limits import BACKGROUND, request_priority
+
+logger = logging.getLogger(__name__)
+
+# Fold utterances into the minutes every time about this many characters (a few minutes of talk) pile up
+MINUTES_BLOCK_CHARS = int(os.getenv("MINUTES_BLOCK_CHARS", "3000"))
+
+
+class LiveMinutes:
+    """
+    Running summary and action item list, built while the meeting is still going. Each new block
+    of utterances is folded into the minutes in the background, one fold at a time, so when the
+    meeting ends only the last few minutes are left to fold.
+    """
+
+    def __init__(self, block_chars: int = MINUTES_BLOCK_CHARS):
+        self.block_chars = block_chars
+        self.minutes = ChunkNotes(summary="", action_items=[])
+        self.folded_utterances = 0
+        self._pending = []  # Utterances not folded yet
+        self._pending_chars = 0
+        self._fold_task: Optional[asyncio.Task] = None
+
+    def add_utterance(self, utterance: str) -> None:
+        """Record a complete utterance. Call from the event loop thread."""
+        utterance = utterance.strip()
+        if not utterance:
+            return
+        self._pending.append(utterance)
+        self._pending_chars += len(utterance) + 1
+        if self._pending_chars >= self.block_chars and (self._fold_task is None or self._fold_task.done()):
+            self._fold_task = asyncio.create_task(self._fold_pending())
+
+    async def _fold(self) -> None:
+        """Fold everything pending into the minutes. On failure the utterances stay pending."""
+        block = self._pending[:]
+        start = time.perf_counter()
+        self.minutes = await update_minutes(self.minutes, "\n".join(block))
+        # Utterances that arrived during the call are kept for the next block
+        del self._pending[: len(block)]
+        self._pending_chars = sum(len(u) + 1 for u in self._pending)
+        self.folded_utterances += len(block)
+        metrics.observe("minutes_fold_seconds", time.perf_counter() - start)
+        logger.info(f"Minutes now cover {self.folded_utterances} utterances")
+
+    async def _fold_pending(self) -> None:
+        # Started from the transcription callback, which may be running in a live turn's context
+        request_priority.set(BACKGROUND)
+        while self._pending_chars >= self.block_chars:
+            try:
+                await self._fold()
+            except Exception as e:
+                # Try again with a bigger block once more utterances come in
+                logger.warning(f"Could not update the live minutes: {e}")
+                metrics.increment("minutes_fold_errors_total")
+                return
+
+    async def finalize(self) -> Optional[tuple[str, list[str]]]:
+        """
+        Fold whatever is left and return (summary, action_items), or None if nothing was said.
+        Raises if the last fold fails, so the caller can fall back to the full transcript.
+        """
+        start = time.perf_counter()
+        if self._fold_task is not None:
+            await self._fold_task
+        if self._pending:
+            await self._fold()
+        metrics.observe("minutes_finalize_seconds", time.perf_counter() - start)
+        if not self.folded_utterances:
+            return None
+        return self.minutes.summary, self.minutes.action_items
@@ -0,0 +1,221 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Optional
+
+from utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+_WAKE_WORDS = re.compile(r"\bhey\s+(eleven|11)\s*(labs|laps)\b")
+_NON_WORD = re.compile(r"[^\w\s]")
+_WHITESPACE = re.compile(r"\s+")
+_AGENT_TURNS = re.compile(r"ElevenLabs:.*?(?=User:|$)", re.DOTALL)
+_SPEAKER_LABELS = re.compile(r"\bUser:")
+_REQUESTS = re.compile(r"\bhey\s+(eleven|11)\s*(labs|laps)\b.*?(?=User:|$)", re.DOTALL | re.IGNORECASE)
+
+
+def normalize_query(query: str) -> str:
+    """Lowercase, drop the wake word and punctuation, and collapse whitespace."""
+    query = (query or "").lower()
+    query = _WAKE_WORDS.sub(" ", query)
+    query = _NON_WORD.sub(" ", query)
+    return _WHITESPACE.sub(" ", query).strip()
+
+
+def relevant_transcript(transcript: str) -> str:
+    """
+    The part of the transcript a request actually depends on: the agent's own replies and the
+    "Hey ElevenLabs" requests are dropped, so asking the same thing twice with nothing new
+    said in between produces the same fingerprint.
+    """
+    text = _AGENT_TURNS.sub(" ", transcript or "")
+    text = _REQUESTS.sub(" ", text)
+    return _SPEAKER_LABELS.sub(" ", text)
+
+
+def latest_request(transcript: str, tail_chars: int = 500) -> str:
+    """The most recent "Hey ElevenLabs" request, or the tail of the transcript if there isn't one."""
+    requests = list(_REQUESTS.finditer(transcript or ""))
+    if requests:
+        return requests[-1].group(0)
+    return (transcript or "")[-tail_chars:]
+
+
+def transcript_fingerprint(transcript: str, window_chars: int = 2000) -> str:
+    """Fingerprint the most recent relevant window of the transcript, ignoring formatting differences."""
+    window = normalize_query(relevant_transcript(transcript)[-window_chars:])
+    return hashlib.sha1(window.encode("utf-8")).hexdigest()[:16]
+
+
+class LLMCache:
+    """
+    TTL + LRU cache for LLM results, keyed by namespace, normalized query and a context fingerprint.
+    If a disk path is given, entries are also written to SQLite so hits survive restarts.
+    Values must be JSON serializable.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 256,
+        ttl_seconds: float = 600,
+        disk_path: Optional[Path] = None,
+    ):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()  # key -> (value, expires_at, latency)
+        self._lock = threading.Lock()
+        self._db = None
+
+        if disk_path:
+            disk_path = Path(disk_path)
+            disk_path.parent.mkdir(parents=True, exist_ok=True)
+            self._db = sqlite3.connect(str(disk_path), check_same_thread=False)
+            self._db.execute(
+                """
+                CREATE TABLE IF NOT EXISTS llm_cache (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL,
+                    latency REAL NOT NULL,
+                    expires_at REAL NOT NULL,
+                    last_access REAL NOT NULL
+                )
+                """
+            )
+            self._db.execute("DELETE FROM llm_cache WHERE expires_at < ?", (time.time(),))
+            self._db.commit()
+
+    @classmethod
+    def from_env(cls) -> "LLMCache":
+        disk_path = os.getenv("LLM_CACHE_PATH")
+        return cls(
+            max_entries=int(os.getenv("LLM_CACHE_MAX_ENTRIES", "256")),
+            ttl_seconds=float(os.getenv("LLM_CACHE_TTL_SECONDS", "600")),
+            disk_path=Path(disk_path) if disk_path else None,
+        )
+
+    @staticmethod
+    def make_key(namespace: str, query: str, context: str = "") -> str:
+        raw = f"{namespace}\x00{normalize_query(query)}\x00{context}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, namespace: str, query: str, context: str = "") -> Optional[Any]:
+        key = self.make_key(namespace, query, context)
+        entry = self._lookup(key)
+
+        if entry is None:
+            metrics.increment("llm_cache_misses_total", namespace=namespace)
+            return None
+
+        value, latency = entry
+        metrics.increment("llm_cache_hits_total", namespace=namespace)
+        metrics.increment("llm_cache_saved_seconds_total", latency, namespace=namespace)
+        logger.info(f"LLM cache hit for {namespace} (saved {latency:.2f}s)")
+        return value
+
+    def set(
+        self,
+        namespace: str,
+        query: str,
+        value: Any,
+        context: str = "",
+        latency: float = 0.0,
+        ttl_seconds: Optional[float] = None,
+    ) -> None:
+        key = self.make_key(namespace, query, context)
+        now = time.time()
+        expires_at = now + (ttl_seconds if ttl_seconds is not None else self.ttl_seconds)
+
+        with self._lock:
+            self._entries[key] = (value, expires_at, latency)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO llm_cache VALUES (?, ?, ?, ?, ?)",
+                    (key, json.dumps(value), latency, expires_at, now),
+                )
+                # Keep the disk backend bounded with the same LRU policy
+                self._db.execute(
+                    """
+                    DELETE FROM llm_cache WHERE key NOT IN (
+                        SELECT key FROM llm_cache ORDER BY last_access DESC LIMIT ?
+                    )
+                    """,
+                    (self.max_entries,),
+                )
+                self._db.commit()
+
+    async def get_or_compute(
+        self,
+        namespace: str,
+        query: str,
+        compute: Callable[[], Awaitable[Any]],
+        context: str = "",
+        ttl_seconds: Optional[float] = None,
+    ) -> Any:
+        """Return the cached value, or await compute() and cache its result along with how long it took."""
+        cached = self.get(namespace, query, context)
+        if cached is not None:
+            return cached
+
+        start = time.perf_counter()
+        value = await compute()
+        latency = time.perf_counter() - start
+        metrics.observe("llm_cache_compute_seconds", latency, namespace=namespace)
+
+        if value is not None:
+            self.set(namespace, query, value, context, latency, ttl_seconds)
+        return value
+
+    def _lookup(self, key: str):
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, expires_at, latency = entry
+                if expires_at > now:
+                    self._entries.move_to_end(key)
+                    self._touch(key, now)
+                    return value, latency
+                del self._entries[key]
+
+            if self._db is None:
+                return None
+
+            row = self._db.execute(
+                "SELECT value, latency, expires_at FROM llm_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+
+            value, latency, expires_at = json.loads(row[0]), row[1], row[2]
+            if expires_at <= now:
+                self._db.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                self._db.commit()
+                return None
+
+            self._touch(key, now)
+            self._entries[key] = (value, expires_at, latency)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            return value, latency
+
+    def _touch(self, key: str, now: float) -> None:
+        if self._db is not None:
+            self._db.execute("UPDATE llm_cache SET last_access = ? WHERE key = ?", (now, key))
+            self._db.commit()
+
+
+# Process-wide cache shared by the agent and web search
+llm_cache = LLMCache.from_env()
@@ -0,0 +1,172 @@
+import asyncio
+import logging
+import os
+import time
+from typing import Optional
+
+import litellm
+
+from utils.metrics import metrics
+from utils.rate_limits import rate_limiter
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MODELS = ["groq/llama-3.3-70b-versatile", "groq/llama-3.1-8b-instant"]
+
+
+def _is_rate_limit(error: Exception) -> bool:
+    return isinstance(error, litellm.RateLimitError) or getattr(error, "status_code", None) == 429
+
+
+def _retry_after(error: Exception) -> Optional[float]:
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+class ModelRouter:
+    """
+    Routes completions across an ordered list of models.
+
+    The first healthy model is called; if it hasn't answered after its recent p95 latency, a hedge
+    request goes to the next model and whichever finishes first wins. Timeouts, rate limits and
+    errors fail over to the next model immediately, and rate-limited models sit out a cooldown.
+    """
+
+    def __init__(
+        self,
+        models: list[str],
+        hedge_quantile: float = 0.95,
+        default_hedge_delay: float = 1.5,
+        min_hedge_delay: float = 0.25,
+        timeout: float = 20.0,
+        rate_limit_cooldown: float = 30.0,
+        min_samples: int = 5,
+    ):
+        self.models = models
+        self.hedge_quantile = hedge_quantile
+        self.default_hedge_delay = default_hedge_delay
+        self.min_hedge_delay = min_hedge_delay
+        self.timeout = timeout
+        self.rate_limit_cooldown = rate_limit_cooldown
+        self.min_samples = min_samples
+        self._cooldown_until = {}  # model -> monotonic time it can be used again
+
+    @classmethod
+    def from_env(cls) -> "ModelRouter":
+        models = [m.strip() for m in os.getenv("LLM_MODELS", "").split(",") if m.strip()]
+        if not models:
+            models = list(DEFAULT_MODELS)
+            if os.getenv("OPENAI_API_KEY"):
+                models.append("openai/gpt-4o-mini")  # Different provider as a last resort
+        return cls(
+            models,
+            hedge_quantile=float(os.getenv("LLM_HEDGE_QUANTILE", "0.95")),
+            default_hedge_delay=float(os.getenv("LLM_HEDGE_DELAY_SECONDS", "1.5")),
+            timeout=float(os.getenv("LLM_TIMEOUT_SECONDS", "20")),
+        )
+
+    def hedge_delay(self, model: str) -> float:
+        """How long to wait on a model before hedging, based on its recent latency."""
+        if metrics.get_counter("llm_requests_total", model=model) < self.min_samples:
+            return self.default_hedge_delay
+        delay = metrics.quantile("llm_latency_seconds", self.hedge_quantile, model=model)
+        if delay is None:
+            return self.default_hedge_delay
+        return min(max(delay, self.min_hedge_delay), self.timeout)
+
+    def ranked_models(self) -> list[str]:
+        """Configured order, with cooling-down and mostly-failing models pushed to the back."""
+        now = time.monotonic()
+
+        def penalty(model: str) -> int:
+            if self._cooldown_until.get(model, 0) > now:
+                return 2
+            requests = metrics.get_counter("llm_requests_total", model=model)
+            failures = metrics.get_counter("llm_failures_total", model=model)
+            if requests >= self.min_samples and failures / requests > 0.5:
+                return 1
+            return 0
+
+        return sorted(self.models, key=penalty)
+
+    async def _call(self, model: str, kwargs: dict):
+        provider = model.split("/")[0]
+        if callable(kwargs.get("response_format")):
+            # Hedges and fallbacks can land on a model that supports different formats
+            kwargs = {**kwargs, "response_format": kwargs["response_format"](model)}
+        await rate_limiter.acquire(provider)
+        start = time.perf_counter()
+        metrics.increment("llm_requests_total", model=model)
+        try:
+            response = await asyncio.wait_for(
+                litellm.acompletion(model=model, **kwargs), timeout=self.timeout
+            )
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            metrics.increment("llm_failures_total", model=model)
+            if _is_rate_limit(e):
+                # Hold back every model on this provider, not just this one
+                response = getattr(e, "response", None)
+                rate_limiter.record_response(provider, getattr(response, "headers", None), 429)
+                cooldown = _retry_after(e) or self.rate_limit_cooldown
+                self._cooldown_until[model] = time.monotonic() + cooldown
+                logger.warning(f"{model} rate limited, cooling down for {cooldown:.0f}s")
+            else:
+                logger.warning(f"{model} failed: {e!r}")
+            raise
+
+        metrics.observe("llm_latency_seconds", time.perf_counter() - start, model=model)
+        return response
+
+    async def acompletion(self, **kwargs):
+        """
+        Drop-in for litellm.acompletion without the `model` argument. `response_format` may also
+        be a function of the model name, called for whichever model each attempt goes to.
+        """
+        candidates = self.ranked_models()
+        pending = {}  # task -> model
+        last_error = None
+
+        def launch_next():
+            model = candidates.pop(0)
+            pending[asyncio.create_task(self._call(model, kwargs))] = model
+            return model
+
+        active_model = launch_next()
+        try:
+            while pending:
+                wait_for = self.hedge_delay(active_model) if candidates else None
+                done, _ = await asyncio.wait(
+                    pending.keys(), timeout=wait_for, return_when=asyncio.FIRST_COMPLETED
+                )
+
+                if not done:
+                    active_model = launch_next()
+                    metrics.increment("llm_hedges_total", model=active_model)
+                    logger.info(f"Hedging slow request with {active_model}")
+                    continue
+
+                for task in done:
+                    model = pending.pop(task)
+                    if task.exception() is None:
+                        metrics.increment("llm_wins_total", model=model)
+                        return task.result()
+                    last_error = task.exception()
+
+                if not pending and candidates:
+                    active_model = launch_next()
+                    metrics.increment("llm_fallbacks_total", model=active_model)
+        finally:
+            for task in pending:
+                task.cancel()
+
+        raise last_error
+
+
+# Process-wide router shared by the agent and task handlers
+llm_router = ModelRouter.from_env()
@@ -0,0 +1,127 @@
+import asyncio
+import logging
+import os
+import time
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Optional
+
+from utils.llm_router import llm_router
+from utils.metrics import metrics
+from utils.rate_limits import BACKGROUND, request_priority
+
+logger = logging.getLogger(__name__)
+
+# A segment closes after this much talk, whichever limit comes first, and is summarized in the background
+SEGMENT_SECONDS = float(os.getenv("CATCH_UP_SEGMENT_SECONDS", "180"))
+SEGMENT_MAX_CHARS = int(os.getenv("CATCH_UP_SEGMENT_CHARS", "3000"))
+
+segment_summary_prompt = """Summarize this part of a meeting in at most two short sentences. Keep decisions, numbers, owners and deadlines. Plain text only."""
+
+
+@dataclass
+class Utterance:
+    text: str
+    at: float  # Epoch seconds
+
+
+@dataclass
+class Segment:
+    utterances: list[Utterance] = field(default_factory=list)
+    summary: Optional[str] = None
+
+    @property
+    def start(self) -> float:
+        return self.utterances[0].at
+
+    @property
+    def end(self) -> float:
+        return self.utterances[-1].at
+
+    @property
+    def text(self) -> str:
+        return "\n".join(u.text for u in self.utterances)
+
+
+class SegmentStore:
+    """
+    Timestamped utterances grouped into segments of a few minutes each. Closed segments are
+    summarized once in the background and the summaries kept, so a catch-up only needs the
+    cached summaries plus the newest, still unsummarized tail.
+    """
+
+    def __init__(self, segment_seconds: float = SEGMENT_SECONDS, max_chars: int = SEGMENT_MAX_CHARS):
+        self.segment_seconds = segment_seconds
+        self.max_chars = max_chars
+        self.started_at: Optional[float] = None
+        self.segments: list[Segment] = []  # Closed, oldest first
+        self._open = Segment()
+        self._open_chars = 0
+        self._background = set()
+
+    def __bool__(self) -> bool:
+        return self.started_at is not None
+
+    def add_utterance(self, text: str, at: Optional[float] = None) -> None:
+        """Record a complete utterance. Call from the event loop thread."""
+        text = text.strip()
+        if not text:
+            return
+        at = at if at is not None else time.time()
+        if self.started_at is None:
+            self.started_at = at
+        self._open.utterances.append(Utterance(text=text, at=at))
+        self._open_chars += len(text) + 1
+        if self._open_chars >= self.max_chars or at - self._open.start >= self.segment_seconds:
+            self._close_segment()
+
+    def _close_segment(self) -> None:
+        segment = self._open
+        self.segments.append(segment)
+        self._open = Segment()
+        self._open_chars = 0
+        task = asyncio.create_task(self._summarize(segment))
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+
+    async def _summarize(self, segment: Segment) -> None:
+        # Started from the transcription callback, which may be running in a live turn's context
+        request_priority.set(BACKGROUND)
+        start = time.perf_counter()
+        try:
+            response = await llm_router.acompletion(
+                messages=[
+                    {"role": "system", "content": segment_summary_prompt},
+                    {"role": "user", "content": segment.text},
+                ],
+                temperature=0.2,
+            )
+            segment.summary = response.choices[0].message.content.strip()
+            metrics.observe("segment_summary_seconds", time.perf_counter() - start)
+        except Exception as e:
+            # The segment's raw text stands in for its summary until then
+            logger.warning(f"Could not summarize meeting segment: {e}")
+
+    def minute_of(self, at: float) -> int:
+        return int((at - self.started_at) // 60)
+
+    def window(self, since: Optional[float] = None) -> tuple[list[Segment], list[Utterance]]:
+        """
+        Summarized segments overlapping the window, and the utterances in it that have no summary
+        yet: the open segment plus any closed ones still being summarized.
+        """
+        summarized, tail = [], []
+        for segment in self.segments:
+            if since is not None and segment.end < since:
+                continue
+            if segment.summary:
+                summarized.append(segment)
+            else:
+                tail.extend(u for u in segment.utterances if since is None or u.at >= since)
+        tail.extend(u for u in self._open.utterances if since is None or u.at >= since)
+        return summarized, tail
+
+
+# Store of the meeting being handled. Each meeting or websocket session sets its own, so catch-ups
+# never mix in an earlier or concurrent meeting; tasks started from the session inherit it.
+current_segments: ContextVar[Optional[SegmentStore]] = ContextVar("current_segments", default=None)
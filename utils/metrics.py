@@ -0,0 +1,81 @@
+import threading
+from collections import defaultdict, deque
+
+
+def _key(name: str, labels: dict) -> tuple:
+    return (name, tuple(sorted(labels.items())))
+
+
+class Metrics:
+    """
+    Minimal in-process metrics registry: counters plus a bounded window of observations
+    per series. Exported as a dict snapshot or in Prometheus text format.
+    """
+
+    def __init__(self, window_size: int = 1000):
+        self.window_size = window_size
+        self._lock = threading.Lock()
+        self._counters = defaultdict(float)
+        self._observations = {}
+
+    def increment(self, name: str, value: float = 1.0, **labels) -> None:
+        with self._lock:
+            self._counters[_key(name, labels)] += value
+
+    def observe(self, name: str, value: float, **labels) -> None:
+        with self._lock:
+            key = _key(name, labels)
+            if key not in self._observations:
+                self._observations[key] = deque(maxlen=self.window_size)
+            self._observations[key].append(value)
+
+    def get_counter(self, name: str, **labels) -> float:
+        with self._lock:
+            return self._counters.get(_key(name, labels), 0.0)
+
+    def quantile(self, name: str, q: float, **labels):
+        """Return the q-quantile of the recent observations, or None if there are none."""
+        with self._lock:
+            values = sorted(self._observations.get(_key(name, labels), ()))
+        if not values:
+            return None
+        index = min(len(values) - 1, int(q * len(values)))
+        return values[index]
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            counters = {_format_series(k): v for k, v in self._counters.items()}
+            observations = {}
+            for k, values in self._observations.items():
+                ordered = sorted(values)
+                observations[_format_series(k)] = {
+                    "count": len(ordered),
+                    "p50": ordered[len(ordered) // 2] if ordered else None,
+                    "p95": ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))] if ordered else None,
+                }
+        return {"counters": counters, "observations": observations}
+
+    def render_prometheus(self) -> str:
+        lines = []
+        snapshot = self.snapshot()
+        for series, value in sorted(snapshot["counters"].items()):
+            lines.append(f"{series} {value}")
+        for series, summary in sorted(snapshot["observations"].items()):
+            name, _, labels = series.partition("{")
+            labels = "{" + labels if labels else ""
+            lines.append(f"{name}_count{labels} {summary['count']}")
+            for quantile in ("p50", "p95"):
+                if summary[quantile] is not None:
+                    lines.append(f"{name}_{quantile}{labels} {summary[quantile]}")
+        return "\n".join(lines) + "\n"
+
+
+def _format_series(key: tuple) -> str:
+    name, labels = key
+    if not labels:
+        return name
+    return name + "{" + ",".join(f'{k}="{v}"' for k, v in labels) + "}"
+
+
+# Process-wide registry
+metrics = Metrics()
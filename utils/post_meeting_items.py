@@ -1,10 +1,31 @@
 import asyncio
-from typing import List
+import hashlib
+import html
+import logging
+import os
+import re
+import time
+from dataclasses import dataclass
+from datetime import date
+from string import Template
+from typing import List, Optional
 
-import litellm
 from pydantic import BaseModel
 
-from utils.api.google import GoogleAPI
+from utils.action_outbox import current_idempotency_key, linear_issue_id
+from utils.api.google import aget_google_api
+from utils.api.linear import linear_client
+from utils.contact_directory import contact_directory
+from utils.llm_router import llm_router
+from utils.metrics import metrics
+from utils.structured_output import structured_completion
+
+logger = logging.getLogger(__name__)
+
+# Long transcripts are split into chunks of about this many characters, summarized in parallel and
+# merged, so post-meeting latency stays roughly flat however long the meeting ran
+SUMMARY_CHUNK_CHARS = int(os.getenv("SUMMARY_CHUNK_CHARS", "12000"))
+SUMMARY_MAX_PARALLEL = int(os.getenv("SUMMARY_MAX_PARALLEL", "4"))
 
 
 async def generate_summary(transcript: str) -> str:
@@ -25,8 +46,7 @@ Meeting Transcript:
 
 Summary:"""
 
-    response = await litellm.acompletion(
-        model="groq/llama-3.3-70b-versatile",
+    response = await llm_router.acompletion(
         messages=[{"role": "user", "content": prompt.format(transcript=transcript)}],
         temperature=0.2,
     )
@@ -35,7 +55,7 @@ Summary:"""
 
 
 class ActionItems(BaseModel):
-    items: List[str]
+    action_items: List[str]
 
 
 async def generate_action_items(transcript: str) -> list[str]:
@@ -48,7 +68,7 @@ async def generate_action_items(transcript: str) -> list[str]:
 - Who is responsible (if mentioned)
 - Deadline or timeframe (if mentioned)
 
-Format each item as: "Task description (owner if mentioned, deadline if mentioned)"
+Format each item as: "Task description (Owner: name, Due: deadline)", leaving out whichever is not mentioned
 
 The key should be 'action_items'
 
@@ -57,67 +77,415 @@ Return ONLY a JSON array of strings, with no additional explanation.
 Meeting Transcript:
 {transcript}"""
 
-    response = await litellm.acompletion(
-        model="groq/llama-3.3-70b-versatile",
-        messages=[
+    result = await structured_completion(
+        [
             {"role": "system", "content": "You are a helpful assistant designed to output JSON."},
             {"role": "user", "content": prompt.format(transcript=transcript)},
         ],
-        response_format={"type": "json_object"},
+        "action_items",
+        ActionItems,
         temperature=0.2,
     )
 
-    import json
+    return result.action_items
+
+
+class ChunkNotes(BaseModel):
+    summary: str
+    action_items: List[str]
+
+
+def split_utterances(transcript: str) -> list[str]:
+    """Utterances are one per line. Older space-joined transcripts fall back to sentence boundaries."""
+    utterances = []
+    for line in transcript.splitlines():
+        line = line.strip()
+        if len(line) > SUMMARY_CHUNK_CHARS:
+            utterances.extend(re.split(r"(?<=[.!?])\s+", line))
+        elif line:
+            utterances.append(line)
+    return utterances
+
 
-    result = json.loads(response.choices[0].message.content)
-    return result.get("action_items", [])
+def chunk_transcript(transcript: str, max_chars: int = SUMMARY_CHUNK_CHARS) -> list[str]:
+    """Pack whole utterances into chunks of at most `max_chars` (a longer utterance gets its own chunk)."""
+    chunks, current, size = [], [], 0
+    for utterance in split_utterances(transcript):
+        if current and size + len(utterance) + 1 > max_chars:
+            chunks.append("\n".join(current))
+            current, size = [], 0
+        current.append(utterance)
+        size += len(utterance) + 1
+    if current:
+        chunks.append("\n".join(current))
+    return chunks
 
 
-async def send_post_meeting_email(full_transcript):
-    from utils.post_meeting_items import generate_action_items, generate_summary
+async def extract_chunk_notes(chunk: str, part: int = 1, parts: int = 1) -> ChunkNotes:
+    """Summary and action items for one part of a meeting, in a single LLM call."""
+    prompt = """You are a professional meeting summarizer. Below is part {part} of {parts} of a meeting transcript.
 
-    summary, action_items = await asyncio.gather(
-        generate_summary(full_transcript), generate_action_items(full_transcript)
+Write:
+- "summary": a concise summary of this part, with specific decisions, numbers, updates and issues raised. Plain text, no markdown.
+- "action_items": every action item in this part, formatted as "Task description (Owner: name, Due: deadline)", leaving out whichever is not mentioned.
+
+Respond with JSON only, using the keys "summary" and "action_items".
+
+Transcript part:
+{chunk}"""
+
+    return await structured_completion(
+        [
+            {"role": "system", "content": "You are a helpful assistant designed to output JSON."},
+            {"role": "user", "content": prompt.format(part=part, parts=parts, chunk=chunk)},
+        ],
+        "chunk_notes",
+        ChunkNotes,
+        temperature=0.2,
     )
 
-    # Format action items with proper HTML
-    formatted_action_items = "\n".join(
-        f"<div style='margin-bottom: 12px;'>• {item}</div>" for item in action_items
+
+async def update_minutes(minutes: ChunkNotes, block: str) -> ChunkNotes:
+    """Fold the next block of a meeting into the minutes so far, in a single LLM call."""
+    prompt = """You are keeping the minutes of a meeting that is still going on. Below are the minutes so far and the next part of the transcript.
+
+Return the updated minutes:
+- "summary": a concise summary of the whole meeting so far, with specific decisions, numbers, updates and issues raised. Where the new part revises something earlier, keep the new version. Plain text, no markdown.
+- "action_items": every action item so far, formatted as "Task description (Owner: name, Due: deadline)", leaving out whichever is not mentioned. Merge items that describe the same task instead of repeating them.
+
+Respond with JSON only, using the keys "summary" and "action_items".
+
+Minutes so far:
+{minutes}
+
+Next part of the transcript:
+{block}"""
+
+    current = minutes.summary + "".join(f"\n- {item}" for item in minutes.action_items)
+    return await structured_completion(
+        [
+            {"role": "system", "content": "You are a helpful assistant designed to output JSON."},
+            {"role": "user", "content": prompt.format(minutes=current or "(none yet)", block=block)},
+        ],
+        "update_minutes",
+        ChunkNotes,
+        temperature=0.2,
+    )
+
+
+async def merge_summaries(summaries: list[str]) -> str:
+    prompt = """These are summaries of consecutive parts of one meeting, in order. Merge them into a single concise summary of the whole meeting that focuses on:
+- Specific decisions made
+- Concrete action items and deadlines
+- Key numerical data or metrics discussed
+- Important updates or changes
+- Critical issues raised
+
+Where a later part revises an earlier one, keep the later version. Be direct and specific. Ensure you don't use markdown, just use normal text.
+
+{summaries}
+
+Summary:"""
+
+    numbered = "\n\n".join(f"Part {i}:\n{summary}" for i, summary in enumerate(summaries, 1))
+    response = await llm_router.acompletion(
+        messages=[{"role": "user", "content": prompt.format(summaries=numbered)}],
+        temperature=0.2,
     )
+    return response.choices[0].message.content
+
+
+async def merge_action_items(action_items: list[str]) -> list[str]:
+    """Drop duplicates: exact repeats locally, reworded repeats with one small LLM call."""
+    unique = list({" ".join(item.lower().split()): item for item in action_items}.values())
+    if len(unique) < 2:
+        return unique
+
+    prompt = """These action items were extracted from different parts of the same meeting. Merge items that describe the same task, keeping the most specific owner and deadline, and keep every distinct task. Format each item as "Task description (Owner: name, Due: deadline)", leaving out whichever is not mentioned.
+
+The key should be 'action_items'
+
+Action items:
+{items}"""
+
+    try:
+        result = await structured_completion(
+            [
+                {"role": "system", "content": "You are a helpful assistant designed to output JSON."},
+                {"role": "user", "content": prompt.format(items="\n".join(f"- {item}" for item in unique))},
+            ],
+            "merge_action_items",
+            ActionItems,
+            temperature=0.2,
+        )
+    except Exception as e:
+        logger.warning(f"Could not merge action items, keeping them all: {e}")
+        return unique
+    return result.action_items
+
+
+async def reduce_notes(notes: list[ChunkNotes]) -> tuple[str, list[str]]:
+    """
+    Merge per-chunk notes into one summary and action item list. Summaries that together are
+    still too long for one prompt are merged in parallel groups first.
+    """
+    summaries = [note.summary for note in notes if note.summary]
+    action_items = [item for note in notes for item in note.action_items]
+
+    limit = asyncio.Semaphore(SUMMARY_MAX_PARALLEL)
+
+    async def merge_group(group: str) -> str:
+        parts = group.splitlines()
+        if len(parts) == 1:
+            return parts[0]
+        async with limit:
+            return await merge_summaries(parts)
+
+    async def reduce_summaries(summaries: list[str]) -> str:
+        while len(summaries) > 1 and sum(len(s) for s in summaries) > SUMMARY_CHUNK_CHARS:
+            # One summary per line, so the groups fit in a prompt the same way transcript chunks do
+            groups = chunk_transcript("\n".join(s.replace("\n", " ") for s in summaries))
+            if len(groups) >= len(summaries):
+                break
+            summaries = await asyncio.gather(*(merge_group(group) for group in groups))
+        if len(summaries) <= 1:
+            return summaries[0] if summaries else ""
+        return await merge_summaries(summaries)
+
+    return await asyncio.gather(reduce_summaries(summaries), merge_action_items(action_items))
+
 
-    email_body = f"""
+async def summarize_transcript(transcript: str) -> tuple[str, list[str]]:
+    """
+    Summary and action items for a whole meeting. Short meetings take one call each; longer
+    ones are chunked on utterance boundaries, mapped in parallel and reduced.
+    """
+    chunks = chunk_transcript(transcript)
+    if len(chunks) <= 1:
+        return await asyncio.gather(generate_summary(transcript), generate_action_items(transcript))
+
+    logger.info(f"Summarizing a {len(transcript)} character transcript in {len(chunks)} chunks")
+    limit = asyncio.Semaphore(SUMMARY_MAX_PARALLEL)
+
+    async def map_chunk(part: int, chunk: str) -> ChunkNotes:
+        async with limit:
+            try:
+                return await extract_chunk_notes(chunk, part, len(chunks))
+            except Exception as e:
+                # One bad chunk shouldn't sink the whole email
+                logger.error(f"Could not summarize transcript part {part}: {e}")
+                return ChunkNotes(summary="", action_items=[])
+
+    notes = await asyncio.gather(*(map_chunk(i, chunk) for i, chunk in enumerate(chunks, 1)))
+    return await reduce_notes(notes)
+
+
+async def create_action_item_tickets(action_items: list[str], meeting_key: str = "") -> list[str]:
+    """
+    File every action item as a Linear issue in a single request. Issue IDs are derived from
+    `meeting_key` and the item text, so retrying or rerunning this for the same meeting finds
+    the issues it already created instead of filing them twice.
+    Returns the items with their issue identifiers appended where one was created.
+    """
+    if not action_items or not os.environ.get("LINEAR_API_KEY"):
+        return action_items
+
+    description = f"Action item from the meeting on {date.today().isoformat()}."
+    try:
+        issues = await linear_client.create_issues(
+            [
+                {
+                    "title": item[:255],
+                    "description": description,
+                    "issue_id": linear_issue_id(f"{meeting_key}:action-item:{item}"),
+                }
+                for item in action_items
+            ]
+        )
+    except Exception as e:
+        logger.error(f"Could not create Linear issues for action items: {e}")
+        return action_items
+
+    return [
+        f"{item} ({issue['identifier']})" if issue else item
+        for item, issue in zip(action_items, issues)
+    ]
+
+
+# Rendered once per recipient, so the markup is parsed once at import rather than per send
+EMAIL_TEMPLATE = Template(
+    """
 <html>
 <body style="font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', Roboto, Helvetica, Arial, sans-serif; line-height: 1.6; color: #333; max-width: 800px; margin: 0 auto; padding: 20px;">
+    $greeting
     <h2 style="color: #1d1d1f; font-weight: 500; font-size: 24px; margin-bottom: 24px;">Meeting Summary</h2>
     <div style="background: #f5f5f7; border-radius: 12px; padding: 24px; margin-bottom: 32px;">
-        {summary}
-    </div>
-
-    <h2 style="color: #1d1d1f; font-weight: 500; font-size: 24px; margin-bottom: 24px;">Action Items</h2>
-    <div style="background: #f5f5f7; border-radius: 12px; padding: 24px; margin-bottom: 32px;">
-        {formatted_action_items}
+        $summary
     </div>
-
+$sections
     <p style="color: #666; font-style: italic; margin-top: 30px; border-top: 1px solid #eee; padding-top: 20px; text-align: center; font-size: 0.9em;">
         Generated with ❤️ at the ElevenLabs x a16z Hackathon in SF
     </p>
 </body>
 </html>
 """
+)
+
+SECTION_TEMPLATE = Template(
+    """
+    <h2 style="color: #1d1d1f; font-weight: 500; font-size: 24px; margin-bottom: 24px;">$title</h2>
+    <div style="background: #f5f5f7; border-radius: 12px; padding: 24px; margin-bottom: 32px;">
+        $items
+    </div>
+"""
+)
+
+ACTION_ITEM_TEMPLATE = Template("<div style='margin-bottom: 12px;'>• $item</div>")
+
+POST_MEETING_SUBJECT = "Meeting Summary & Action Items"
+
 
-    google_api = GoogleAPI()
-    google_api.authenticate()
-    google_api.send_email(
-        to="wylansford@gmail.com",
-        subject="Meeting Summary & Action Items",
-        body=email_body,
-        is_html=True,
+@dataclass
+class DeliveryResult:
+    recipient: str
+    success: bool
+    seconds: float
+    error: Optional[str] = None
+
+
+# Shared and role mailboxes, whose local part says nothing about who owns a task
+GENERIC_MAILBOXES = frozenset(
+    {
+        "admin", "all", "billing", "contact", "dev", "devs", "engineering", "everyone", "hello",
+        "help", "hr", "info", "marketing", "me", "noreply", "no-reply", "office", "ops", "sales",
+        "security", "support", "team",
+    }
+)
+
+# An explicit owner field, e.g. "Send the deck (Owner: Lisa, Due: Friday)"
+OWNER_FIELD = re.compile(r"[(,;]\s*owner:\s*([^,;)]+)")
+
+
+def recipient_aliases(email: str) -> set[str]:
+    """
+    Names an action item might use for this recipient as its owner: their directory name and its
+    words, or the whole local part of the address when the directory has no name for them.
+    """
+    name = contact_directory.name_for(email)
+    if name:
+        words = name.lower().split()
+        aliases = {" ".join(words), *words}
+    else:
+        aliases = {email.split("@")[0].lower()}
+    return {alias for alias in aliases if alias not in GENERIC_MAILBOXES}
+
+
+def owns_action_item(item: str, aliases: set[str]) -> bool:
+    """An item is owned by whoever it starts with ("Lisa to send the deck") or names in its Owner field."""
+    text = item.strip().lower()
+    owners = [owner.strip() for owner in OWNER_FIELD.findall(text)]
+    for alias in aliases:
+        if re.match(rf"{re.escape(alias)}(?![\w@.-])", text):
+            return True
+        if any(alias == owner or alias in re.split(r"[\s/&]+", owner) for owner in owners):
+            return True
+    return False
+
+
+def render_post_meeting_email(summary_html: str, item_html: list[tuple[str, str]], recipient: str) -> str:
+    """
+    Fill the template for one recipient, with their own action items first. `item_html` pairs
+    each action item with its already rendered markup, so only the ordering is per recipient.
+    """
+    aliases = recipient_aliases(recipient)
+    mine = [rendered for item, rendered in item_html if owns_action_item(item, aliases)]
+    others = [rendered for item, rendered in item_html if not owns_action_item(item, aliases)]
+
+    if mine:
+        sections = [("Your Action Items", mine), ("Everyone Else's Action Items", others)]
+    else:
+        sections = [("Action Items", others)]
+    name = contact_directory.name_for(recipient)
+    return EMAIL_TEMPLATE.substitute(
+        greeting=f"<p>Hi {html.escape(name.split()[0])},</p>" if name else "",
+        summary=summary_html,
+        sections="".join(
+            SECTION_TEMPLATE.substitute(title=title, items="\n        ".join(items))
+            for title, items in sections
+            if items
+        ),
+    )
+
+
+async def deliver_post_meeting_email(
+    summary: str, action_items: list[str], recipients: list[str]
+) -> list[DeliveryResult]:
+    """Send the minutes to every recipient at once, each personalized, and report how each send went."""
+    summary_html = html.escape(summary).replace("\n", "<br>")
+    item_html = [(item, ACTION_ITEM_TEMPLATE.substitute(item=html.escape(item))) for item in action_items]
+    google_api = await aget_google_api()
+
+    async def deliver(recipient: str) -> DeliveryResult:
+        start = time.perf_counter()
+        error = None
+        try:
+            body = render_post_meeting_email(summary_html, item_html, recipient)
+            if not await google_api.asend_email(
+                to=recipient, subject=POST_MEETING_SUBJECT, body=body, is_html=True
+            ):
+                error = "Gmail did not accept the message"
+        except Exception as e:
+            error = str(e)
+        seconds = time.perf_counter() - start
+
+        metrics.observe("post_meeting_email_seconds", seconds)
+        if error:
+            metrics.increment("post_meeting_email_failures_total")
+            logger.error(f"Post-meeting email to {recipient} failed after {seconds:.2f}s: {error}")
+        return DeliveryResult(recipient=recipient, success=error is None, seconds=seconds, error=error)
+
+    results = await asyncio.gather(*(deliver(recipient) for recipient in recipients))
+    delivered = sum(1 for result in results if result.success)
+    logger.info(
+        f"Post-meeting email delivered to {delivered}/{len(results)} recipients: "
+        + ", ".join(f"{r.recipient} {r.seconds:.2f}s{'' if r.success else ' FAILED'}" for r in results)
     )
+    return results
+
+
+async def send_post_meeting_email(
+    full_transcript, minutes=None, recipients: Optional[list[str]] = None
+) -> list[DeliveryResult]:
+    """
+    Email the meeting summary and action items to every participant. Pass the meeting's
+    LiveMinutes to only summarize what they haven't covered yet, otherwise the whole transcript
+    is summarized now. Recipients default to POST_MEETING_RECIPIENTS (comma-separated).
+    """
+    if recipients is None:
+        recipients = [r.strip() for r in os.getenv("POST_MEETING_RECIPIENTS", "").split(",") if r.strip()]
+    recipients = list(dict.fromkeys(r.lower() for r in recipients))
+    if not recipients:
+        logger.warning("No recipients for the post-meeting email")
+        return []
+
+    notes = None
+    if minutes is not None:
+        try:
+            notes = await minutes.finalize()
+        except Exception as e:
+            logger.warning(f"Live minutes could not be finalized, summarizing the full transcript: {e}")
+    summary, action_items = notes or await summarize_transcript(full_transcript)
+
+    # Same meeting, same key, whether this runs as a scheduled job or is simply run again
+    meeting_key = current_idempotency_key.get() or hashlib.sha1(full_transcript.encode("utf-8")).hexdigest()
+    action_items = await create_action_item_tickets(action_items, meeting_key)
+    return await deliver_post_meeting_email(summary, action_items, recipients)
 
 
 if __name__ == "__main__":
     asyncio.run(
         send_post_meeting_email(
-            "This is a full transcript. Over the day we need to send emails and go to the studio to finish all of our pottery work"
+            "This is a full transcript. Over the day we need to send emails and go to the studio to finish all of our pottery work",
+            recipients=["wylansford@gmail.com"],
         )
     )
@@ -0,0 +1,226 @@
+import asyncio
+import hashlib
+import heapq
+import itertools
+import logging
+import os
+import re
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from email.utils import parsedate_to_datetime
+from typing import Mapping, Optional
+
+from utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Live meeting turns (the agent's reply, web answers, speech) take tokens before background work
+LIVE = 10
+BACKGROUND = 0
+
+request_priority: ContextVar[int] = ContextVar("request_priority", default=BACKGROUND)
+
+# Requests per second and burst size per provider. Override with e.g. RATE_LIMIT_GROQ="0.5,30".
+DEFAULT_LIMITS = {
+    "groq": (5.0, 10),
+    "openai": (5.0, 10),
+    "perplexity": (0.8, 5),  # 50 requests per minute
+    "elevenlabs": (2.0, 5),
+    "deepgram": (2.0, 5),
+    "linear": (0.4, 20),  # 1,500 requests per hour per key
+    "notion": (3.0, 3),  # An average of three requests per second
+    "google": (5.0, 10),
+}
+FALLBACK_LIMIT = (5.0, 10)
+
+# How long to back off after a 429 that came without Retry-After or rate limit headers
+DEFAULT_BACKOFF_SECONDS = 2.0
+
+_DURATION_PART = re.compile(r"(\d+(?:\.\d+)?)(ms|s|m|h)")
+
+
+def limit_for(provider: str) -> tuple[float, int]:
+    value = os.getenv(f"RATE_LIMIT_{provider.upper()}")
+    if value:
+        rate, _, burst = value.partition(",")
+        return float(rate), int(burst or 1)
+    return DEFAULT_LIMITS.get(provider, FALLBACK_LIMIT)
+
+
+def parse_wait_seconds(value: Optional[str]) -> Optional[float]:
+    """
+    Seconds to wait from a Retry-After or rate limit reset header. Accepts plain seconds,
+    Go-style durations ("1m30s", "250ms"), epoch seconds or milliseconds, and HTTP dates.
+    """
+    if value is None:
+        return None
+    value = str(value).strip()
+    try:
+        number = float(value)
+    except ValueError:
+        parts = _DURATION_PART.findall(value)
+        if parts and "".join(n + u for n, u in parts) == value:
+            scale = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+            return sum(float(n) * scale[u] for n, u in parts)
+        try:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+        except (TypeError, ValueError):
+            return None
+    if number > 1e12:  # Epoch milliseconds
+        return max(0.0, number / 1000 - time.time())
+    if number > 1e9:  # Epoch seconds
+        return max(0.0, number - time.time())
+    return max(0.0, number)
+
+
+class TokenBucket:
+    """
+    Token bucket that hands tokens out by priority: a waiting live request is always served
+    before waiting background ones. A provider's 429 or exhausted quota blocks the bucket
+    until the time it said to come back.
+    """
+
+    def __init__(self, name: str, rate: float, capacity: int):
+        self.name = name
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.blocked_until = 0.0
+        self._updated = time.monotonic()
+        self._waiters = []  # (-priority, seq, future)
+        self._seq = itertools.count()
+        self._timer: Optional[asyncio.TimerHandle] = None
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self, priority: Optional[int] = None) -> float:
+        """Take a token, waiting if needed. Returns how long it waited."""
+        priority = request_priority.get() if priority is None else priority
+        now = time.monotonic()
+        self._refill(now)
+        if not self._waiters and now >= self.blocked_until and self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (-priority, next(self._seq), future))
+        self._schedule()
+        try:
+            await future
+        except asyncio.CancelledError:
+            # Cancelled just after _dispatch handed it a token, so give the token back
+            if future.done() and not future.cancelled():
+                self.tokens = min(self.capacity, self.tokens + 1)
+                self._reschedule()
+            raise
+        waited = time.monotonic() - now
+        metrics.observe("rate_limit_wait_seconds", waited, provider=self.name)
+        return waited
+
+    def _dispatch(self) -> None:
+        self._timer = None
+        now = time.monotonic()
+        self._refill(now)
+        while self._waiters and now >= self.blocked_until:
+            if self._waiters[0][2].done():  # Cancelled while waiting
+                heapq.heappop(self._waiters)
+                continue
+            if self.tokens < 1:
+                break
+            self.tokens -= 1
+            heapq.heappop(self._waiters)[2].set_result(None)
+        self._schedule()
+
+    def _reschedule(self) -> None:
+        """Replace the pending dispatch, e.g. after a token was returned or the bucket was blocked."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if self._waiters:
+            self._schedule()
+
+    def _schedule(self) -> None:
+        if self._timer is not None or not self._waiters:
+            return
+        now = time.monotonic()
+        delay = max(self.blocked_until - now, (1 - self.tokens) / self.rate if self.tokens < 1 else 0.0)
+        self._timer = asyncio.get_running_loop().call_later(delay, self._dispatch)
+
+    def block_for(self, seconds: float) -> None:
+        """Hand out nothing for `seconds`, e.g. after a 429."""
+        # Tokens are left alone: the provider's quota is back once the wait is over
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+        self._reschedule()
+
+
+class RateLimiter:
+    """Token buckets per provider and API key, shared by every client in the process."""
+
+    def __init__(self):
+        self._buckets = {}  # (provider, key hash) -> TokenBucket
+
+    def bucket(self, provider: str, key: Optional[str] = None) -> TokenBucket:
+        # Keys are hashed so the table never holds secrets
+        key_id = hashlib.sha1(key.encode()).hexdigest()[:8] if key else ""
+        bucket = self._buckets.get((provider, key_id))
+        if bucket is None:
+            rate, capacity = limit_for(provider)
+            bucket = self._buckets[(provider, key_id)] = TokenBucket(provider, rate, capacity)
+        return bucket
+
+    async def acquire(self, provider: str, key: Optional[str] = None, priority: Optional[int] = None) -> float:
+        return await self.bucket(provider, key).acquire(priority)
+
+    def record_response(
+        self,
+        provider: str,
+        headers: Optional[Mapping[str, str]],
+        status_code: Optional[int] = None,
+        key: Optional[str] = None,
+    ) -> Optional[float]:
+        """
+        Read Retry-After and remaining/reset rate limit headers from a response and block the
+        bucket if the provider says to wait. Returns the wait, if any.
+        """
+        headers = {name.lower(): value for name, value in (headers or {}).items()}
+        wait = parse_wait_seconds(headers.get("retry-after"))
+
+        if wait is None:
+            # OpenAI/Groq (x-ratelimit-*-requests), Linear (x-ratelimit-requests-*) and the IETF draft
+            for remaining_name, reset_name in (
+                ("x-ratelimit-remaining-requests", "x-ratelimit-reset-requests"),
+                ("x-ratelimit-requests-remaining", "x-ratelimit-requests-reset"),
+                ("ratelimit-remaining", "ratelimit-reset"),
+            ):
+                remaining = headers.get(remaining_name)
+                if remaining is not None and remaining.strip() == "0":
+                    wait = parse_wait_seconds(headers.get(reset_name))
+                    break
+
+        if wait is None and status_code == 429:
+            wait = DEFAULT_BACKOFF_SECONDS
+        if wait is None:
+            return None
+
+        if status_code == 429:
+            metrics.increment("rate_limited_total", provider=provider)
+            logger.warning(f"{provider} rate limited, holding requests for {wait:.1f}s")
+        self.bucket(provider, key).block_for(wait)
+        return wait
+
+
+@contextmanager
+def live_priority():
+    """Mark requests made inside the block as part of a live meeting turn."""
+    token = request_priority.set(LIVE)
+    try:
+        yield
+    finally:
+        request_priority.reset(token)
+
+
+# Process-wide limiter
+rate_limiter = RateLimiter()
@@ -0,0 +1,252 @@
+import asyncio
+import heapq
+import importlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from datetime import datetime
+from pathlib import Path
+from typing import Optional, Union
+
+from utils.action_outbox import current_idempotency_key
+from utils.metrics import metrics
+from utils.rate_limits import BACKGROUND, request_priority
+
+logger = logging.getLogger(__name__)
+
+SCHEDULER_PATH = Path(os.getenv("SCHEDULER_PATH", "cache/scheduler.sqlite3"))
+
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"  # Out of attempts
+CANCELLED = "cancelled"
+
+
+def _resolve(target: str):
+    module_name, function_name = target.split(":")
+    return getattr(importlib.import_module(module_name), function_name)
+
+
+class TimerScheduler:
+    """
+    Deferred jobs ("send this later", "remind us at 3pm") kept in SQLite and ordered in memory by
+    a heap of (run_at, job_id). A single task sleeps until the earliest job is due, so pending
+    jobs cost one row and one heap entry each while idle, and are reloaded on start.
+
+    Jobs name their coroutine as "module:function" and pass JSON-serializable keyword arguments.
+    While a job runs, current_idempotency_key is set to its ID, so a job replayed after a crash
+    mid-send reuses the same provider-side IDs as the first attempt. A job that raises or returns
+    False is retried with backoff.
+    """
+
+    def __init__(self, db_path: Path = SCHEDULER_PATH, max_attempts: int = 3, retry_delay: float = 30.0):
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self._heap = []  # (run_at, job_id), stale entries are skipped when popped
+        self._wake: Optional[asyncio.Event] = None
+        self._loop_task: Optional[asyncio.Task] = None
+        self._running = set()
+
+        db_path = Path(db_path)
+        db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(str(db_path))
+        self._db.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                target TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                run_at REAL NOT NULL,
+                status TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                last_error TEXT,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_jobs_due ON jobs (status, run_at);
+            """
+        )
+        self._db.commit()
+
+    def _update(self, job_id: str, **fields) -> None:
+        fields["updated_at"] = time.time()
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        self._db.execute(f"UPDATE jobs SET {assignments} WHERE id = ?", (*fields.values(), job_id))
+        self._db.commit()
+
+    def _push(self, run_at: float, job_id: str) -> None:
+        heapq.heappush(self._heap, (run_at, job_id))
+        # Only an earlier deadline changes how long the loop should sleep
+        if self._wake is not None and self._heap[0][1] == job_id:
+            self._wake.set()
+
+    def start(self) -> None:
+        """Load pending jobs and start the timer loop. Needs a running event loop; safe to call more than once."""
+        if self._loop_task is not None and not self._loop_task.done():
+            return
+        # Anything marked running belongs to a process that is gone
+        interrupted = self._db.execute(
+            "UPDATE jobs SET status = ? WHERE status = ?", (PENDING, RUNNING)
+        ).rowcount
+        self._db.commit()
+        if interrupted:
+            logger.warning(f"Replaying {interrupted} scheduled jobs interrupted by a restart")
+
+        self._heap = self._db.execute("SELECT run_at, id FROM jobs WHERE status = ?", (PENDING,)).fetchall()
+        heapq.heapify(self._heap)
+        if self._heap:
+            logger.info(f"Loaded {len(self._heap)} scheduled jobs, next due in {self._heap[0][0] - time.time():.0f}s")
+        self._wake = asyncio.Event()
+        self._loop_task = asyncio.create_task(self._run_loop())
+
+    def stop(self) -> None:
+        """Stop the loop. Jobs cut off mid-run stay marked running and are replayed on the next start."""
+        if self._loop_task is not None:
+            self._loop_task.cancel()
+            self._loop_task = None
+        for task in list(self._running):
+            task.cancel()
+
+    def schedule_at(
+        self,
+        run_at: Union[datetime, float],
+        target: str,
+        kwargs: Optional[dict] = None,
+        job_id: Optional[str] = None,
+    ) -> str:
+        """
+        Run `await target(**kwargs)` at `run_at` (an aware datetime or epoch seconds). Scheduling
+        again with the same `job_id` is a no-op, so callers replayed by the outbox can pass their
+        idempotency key. Returns the job ID.
+        """
+        if isinstance(run_at, datetime):
+            run_at = run_at.timestamp()
+        job_id = job_id or uuid.uuid4().hex
+        now = time.time()
+        inserted = self._db.execute(
+            """
+            INSERT OR IGNORE INTO jobs (id, target, payload, run_at, status, created_at, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            """,
+            (job_id, target, json.dumps(kwargs or {}), run_at, PENDING, now, now),
+        ).rowcount
+        self._db.commit()
+        if not inserted:
+            logger.info(f"Job {job_id[:12]} is already scheduled")
+            return job_id
+
+        logger.info(f"Scheduled {target} in {run_at - now:.0f}s ({job_id[:12]})")
+        metrics.increment("scheduler_jobs_scheduled_total")
+        if self._wake is not None:
+            self._push(run_at, job_id)
+        return job_id
+
+    def schedule_in(
+        self, delay_seconds: float, target: str, kwargs: Optional[dict] = None, job_id: Optional[str] = None
+    ) -> str:
+        return self.schedule_at(time.time() + delay_seconds, target, kwargs, job_id)
+
+    def cancel(self, job_id: str) -> bool:
+        """Cancel a job that hasn't started yet."""
+        cancelled = self._db.execute(
+            "UPDATE jobs SET status = ?, updated_at = ? WHERE id = ? AND status = ?",
+            (CANCELLED, time.time(), job_id, PENDING),
+        ).rowcount
+        self._db.commit()
+        return cancelled > 0
+
+    def status(self, job_id: str) -> Optional[dict]:
+        row = self._db.execute(
+            "SELECT target, run_at, status, attempts, last_error FROM jobs WHERE id = ?", (job_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        target, run_at, status, attempts, last_error = row
+        return {
+            "job_id": job_id,
+            "target": target,
+            "run_at": run_at,
+            "status": status,
+            "attempts": attempts,
+            "last_error": last_error,
+        }
+
+    def pending_count(self) -> int:
+        return self._db.execute(
+            "SELECT COUNT(*) FROM jobs WHERE status IN (?, ?)", (PENDING, RUNNING)
+        ).fetchone()[0]
+
+    async def _run_loop(self) -> None:
+        """Launch due jobs, then sleep until the next one is due or an earlier one is scheduled."""
+        while True:
+            now = time.time()
+            while self._heap and self._heap[0][0] <= now:
+                _, job_id = heapq.heappop(self._heap)
+                self._launch(job_id, now)
+
+            timeout = self._heap[0][0] - now if self._heap else None
+            self._wake.clear()
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    def _launch(self, job_id: str, now: float) -> None:
+        row = self._db.execute(
+            "SELECT target, payload, run_at, status, attempts FROM jobs WHERE id = ?", (job_id,)
+        ).fetchone()
+        # Cancelled, already run, or rescheduled to a later time since this heap entry was pushed
+        if row is None or row[3] != PENDING or row[2] > now:
+            return
+        target, payload, run_at, _, attempts = row
+        self._update(job_id, status=RUNNING, attempts=attempts + 1)
+        metrics.observe("scheduler_lateness_seconds", now - run_at)
+        task = asyncio.create_task(self._run_job(job_id, target, json.loads(payload), attempts + 1))
+        self._running.add(task)
+        task.add_done_callback(self._running.discard)
+
+    async def _run_job(self, job_id: str, target: str, kwargs: dict, attempt: int) -> None:
+        request_priority.set(BACKGROUND)
+        token = current_idempotency_key.set(job_id)
+        try:
+            result = await _resolve(target)(**kwargs)
+            error = "Job returned False" if result is False else None
+        except Exception as e:
+            logger.exception(f"Scheduled job {target} ({job_id[:12]}) failed")
+            error = str(e)
+        finally:
+            current_idempotency_key.reset(token)
+
+        if error is None:
+            self._update(job_id, status=DONE, last_error=None)
+            metrics.increment("scheduler_jobs_done_total")
+            return
+
+        if attempt >= self.max_attempts:
+            logger.error(f"Giving up on scheduled job {target} ({job_id[:12]}) after {attempt} attempts: {error}")
+            metrics.increment("scheduler_jobs_failed_total")
+            self._update(job_id, status=FAILED, last_error=error)
+            return
+
+        run_at = time.time() + self.retry_delay * 2 ** (attempt - 1)
+        metrics.increment("scheduler_job_retries_total")
+        self._update(job_id, status=PENDING, run_at=run_at, last_error=error)
+        self._push(run_at, job_id)
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler() -> TimerScheduler:
+    """Process-wide scheduler, opened on first use and started by the agent alongside the action outbox."""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = TimerScheduler()
+        return _scheduler
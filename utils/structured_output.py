@@ -0,0 +1,173 @@
+import json
+import logging
+import os
+import re
+from typing import Any, Optional, Type
+
+import litellm
+from pydantic import BaseModel, ValidationError
+
+from utils.llm_router import ModelRouter, llm_router
+from utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Small, fast model used for the single repair attempt
+repair_router = ModelRouter(
+    [os.getenv("LLM_REPAIR_MODEL", "groq/llama-3.1-8b-instant")], timeout=10.0
+)
+
+_CODE_FENCE = re.compile(r"```(?:json)?\s*(.*?)```", re.DOTALL | re.IGNORECASE)
+_TRAILING_COMMA = re.compile(r",\s*([}\]])")
+
+repair_system_prompt = """
+You fix malformed JSON. Return only the corrected JSON with no additional text before or after. Keep the original values, only fix the syntax and structure.
+"""
+
+
+class StructuredOutputError(ValueError):
+    pass
+
+
+def _extract_json_block(text: str) -> Optional[str]:
+    """Return the first balanced {...} or [...] block in the text, ignoring brackets inside strings."""
+    start = next((i for i, c in enumerate(text) if c in "{["), None)
+    if start is None:
+        return None
+
+    depth, in_string, escaped = 0, False, False
+    for i in range(start, len(text)):
+        c = text[i]
+        if in_string:
+            if escaped:
+                escaped = False
+            elif c == "\\":
+                escaped = True
+            elif c == '"':
+                in_string = False
+        elif c == '"':
+            in_string = True
+        elif c in "{[":
+            depth += 1
+        elif c in "}]":
+            depth -= 1
+            if depth == 0:
+                return text[start : i + 1]
+    return text[start:]
+
+
+def parse_json_lenient(text: str) -> Any:
+    """
+    Parse JSON from model output that may be wrapped in prose or code fences,
+    or contain trailing commas. Raises StructuredOutputError if nothing can be recovered.
+    """
+    if text is None:
+        raise StructuredOutputError("Empty response")
+
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError:
+        pass
+
+    fenced = _CODE_FENCE.search(text)
+    candidate = fenced.group(1) if fenced else text
+    block = _extract_json_block(candidate)
+    if block is None:
+        raise StructuredOutputError(f"No JSON found in response: {text[:200]}")
+
+    block = _TRAILING_COMMA.sub(r"\1", block)
+    try:
+        return json.loads(block)
+    except json.JSONDecodeError as e:
+        raise StructuredOutputError(f"Could not parse JSON: {e}") from e
+
+
+def _validate(data: Any, schema: Optional[Type[BaseModel]]):
+    if schema is None:
+        return data
+    try:
+        return schema.model_validate(data)
+    except ValidationError as e:
+        raise StructuredOutputError(str(e)) from e
+
+
+def parse_structured(text: str, prompt_name: str, schema: Optional[Type[BaseModel]] = None):
+    """Parse (and optionally validate) model output without any extra LLM calls, tracking failures per prompt."""
+    metrics.increment("structured_output_requests_total", prompt=prompt_name)
+    try:
+        return _validate(parse_json_lenient(text), schema)
+    except StructuredOutputError:
+        metrics.increment("structured_output_failures_total", prompt=prompt_name)
+        raise
+
+
+def response_format_for(schema: Optional[Type[BaseModel]], model: str) -> dict:
+    """Use a strict JSON schema where the provider supports it, otherwise plain JSON mode."""
+    if schema is not None:
+        try:
+            if litellm.supports_response_schema(model=model):
+                return {
+                    "type": "json_schema",
+                    "json_schema": {"name": schema.__name__, "schema": schema.model_json_schema()},
+                }
+        except Exception:
+            pass
+    return {"type": "json_object"}
+
+
+def parse_failure_rate(prompt_name: str) -> float:
+    requests = metrics.get_counter("structured_output_requests_total", prompt=prompt_name)
+    if not requests:
+        return 0.0
+    return metrics.get_counter("structured_output_failures_total", prompt=prompt_name) / requests
+
+
+async def structured_completion(
+    messages: list[dict],
+    prompt_name: str,
+    schema: Optional[Type[BaseModel]] = None,
+    router: ModelRouter = llm_router,
+    **kwargs,
+):
+    """
+    Get JSON output from the LLM, parsed into a dict (or the given pydantic schema).
+
+    Requests provider-enforced JSON, falls back to the tolerant parser, and makes at most one
+    cheap repair call before giving up with StructuredOutputError.
+    """
+    response = await router.acompletion(
+        messages=messages,
+        response_format=lambda model: response_format_for(schema, model),
+        **kwargs,
+    )
+    content = response.choices[0].message.content
+
+    metrics.increment("structured_output_requests_total", prompt=prompt_name)
+    try:
+        return _validate(parse_json_lenient(content), schema)
+    except StructuredOutputError as e:
+        error = e
+        logger.warning(f"Malformed output for {prompt_name}, attempting repair: {e}")
+
+    metrics.increment("structured_output_repairs_total", prompt=prompt_name)
+    schema_hint = (
+        f"\n\nIt must match this JSON schema:\n{json.dumps(schema.model_json_schema())}"
+        if schema
+        else ""
+    )
+    repair_messages = [
+        {"role": "system", "content": repair_system_prompt},
+        {"role": "user", "content": f"Error: {error}{schema_hint}\n\nJSON:\n{content}"},
+    ]
+    try:
+        repaired = await repair_router.acompletion(
+            messages=repair_messages, response_format={"type": "json_object"}
+        )
+        return _validate(parse_json_lenient(repaired.choices[0].message.content), schema)
+    except Exception as e:
+        metrics.increment("structured_output_failures_total", prompt=prompt_name)
+        logger.error(
+            f"Could not get structured output for {prompt_name} "
+            f"(failure rate {parse_failure_rate(prompt_name):.0%}): {e}"
+        )
+        raise StructuredOutputError(str(e)) from e
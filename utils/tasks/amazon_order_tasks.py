@@ -1,12 +1,12 @@
+import argparse
 import asyncio
-import json
-import os
-from multiprocessing import Process
+import logging
+import time
+from contextlib import contextmanager
+from pathlib import Path
 from typing import Dict, Optional
+from urllib.parse import urlsplit
 
-import openai
-from litellm import acompletion
-from selenium import webdriver
 from selenium.common.exceptions import (
     ElementClickInterceptedException,
     StaleElementReferenceException,
@@ -17,6 +17,23 @@ from selenium.webdriver.common.keys import Keys
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.support.ui import WebDriverWait
 
+from utils.action_schemas import AmazonOrderArgs
+from utils.browser_pool import AMAZON_URL, amazon_browser_pool, setup_headless_chrome
+from utils.llm_router import llm_router
+from utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+FIXTURE_URL = (Path(__file__).resolve().parents[2] / "testing" / "amazon_fixture" / "index.html").as_uri()
+
+# Selectors Amazon shows once an item has been added to the cart
+CART_CONFIRMATION_SELECTORS = [
+    "#NATC_SMART_WAGON_CONF_MSG_SUCCESS",
+    "#sw-atc-details-single-container",
+    "#attachDisplayAddBaseAlert",
+    "#huc-v2-order-row-confirm-text",
+]
+
 
 async def extract_search_details(query: str) -> Dict[str, str]:
     """Use LLM to extract search parameters from the query."""
@@ -33,53 +50,57 @@ async def extract_search_details(query: str) -> Dict[str, str]:
     Return only the search term, with no additional text or formatting.
     """
 
-    response = await acompletion(
-        model="groq/llama-3.3-70b-versatile",
+    response = await llm_router.acompletion(
         messages=[{"role": "system", "content": system_prompt}, {"role": "user", "content": query}],
-        api_key=os.getenv("GROQ_API_KEY"),
     )
 
     search_term = response.choices[0].message.content.strip()
     return {"search_term": search_term, "quantity": 1, "max_price": None}
 
 
-def setup_chrome():
-    """Configure and return ChromeDriver with appropriate options"""
-    options = webdriver.ChromeOptions()
+class StepTrace:
+    """Times each step of a browser flow and reports the durations to the log and metrics."""
 
-    # Add headless mode
-    options.add_argument("--headless=new")  # Using the new headless mode
+    def __init__(self, flow: str):
+        self.flow = flow
+        self.steps = {}
+        self._start = time.perf_counter()
 
-    # Rest of the existing Chrome options
-    options.add_argument("--disable-infobars")
-    options.add_argument("--disable-blink-features=AutomationControlled")
-    options.add_argument("--no-sandbox")
-    options.add_argument("--disable-dev-shm-usage")
-    options.add_argument("--start-maximized")
+    @contextmanager
+    def step(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self.steps[name] = elapsed
+            metrics.observe("browser_step_seconds", elapsed, flow=self.flow, step=name)
 
-    # Set preferences to avoid detection
-    prefs = {
-        "profile.default_content_setting_values.notifications": 2,
-    }
-    options.add_experimental_option("prefs", prefs)
-    options.add_experimental_option("excludeSwitches", ["enable-automation"])
-    options.add_experimental_option("useAutomationExtension", False)
+    @property
+    def total(self) -> float:
+        return time.perf_counter() - self._start
 
-    return webdriver.Chrome(options=options)
+    def summary(self) -> str:
+        steps = ", ".join(f"{name} {elapsed:.2f}s" for name, elapsed in self.steps.items())
+        return f"{self.flow}: {steps}, total {self.total:.2f}s"
 
 
-async def click_with_retry(driver, element, max_retries=3):
+def page_ready(driver) -> bool:
+    return driver.execute_script("return document.readyState") == "complete"
+
+
+def click_with_retry(driver, element, max_retries=3):
     """Attempt to click an element with multiple retry strategies"""
     for attempt in range(max_retries):
         try:
-            # Scroll element into view
-            driver.execute_script("arguments[0].scrollIntoView(true);", element)
-            await asyncio.sleep(0.5)
+            # Scrolling is synchronous, so the element is in view as soon as this returns
+            driver.execute_script("arguments[0].scrollIntoView({block: 'center'});", element)
+            WebDriverWait(driver, 5).until(EC.element_to_be_clickable(element))
 
             # Try regular click first
             element.click()
             return True
-        except ElementClickInterceptedException:
+        except (ElementClickInterceptedException, TimeoutException):
             try:
                 # Try JavaScript click if regular click fails
                 driver.execute_script("arguments[0].click();", element)
@@ -87,72 +108,69 @@ async def click_with_retry(driver, element, max_retries=3):
             except Exception:
                 if attempt == max_retries - 1:
                     raise
-                await asyncio.sleep(1)
         except StaleElementReferenceException:
             if attempt == max_retries - 1:
                 raise
-            await asyncio.sleep(1)
     return False
 
 
-async def add_to_amazon_cart(query: str, max_retries: int = 3) -> Dict[str, str]:
-    """
-    Opens a browser using Selenium, searches Amazon, and adds item to cart.
-    Returns status, any error messages, the product title, and product URL.
-    """
-    driver = None
-    try:
-        # Extract search details using LLM
-        search_details = await extract_search_details(query)
-        print(f"Search details extracted: {search_details}")
+def cart_updated(previous_count: str):
+    """Wait condition: the cart badge count changed or a confirmation message is showing."""
+
+    def condition(driver):
+        for selector in CART_CONFIRMATION_SELECTORS:
+            if driver.find_elements(By.CSS_SELECTOR, selector):
+                return True
+        counts = driver.find_elements(By.ID, "nav-cart-count")
+        return bool(counts) and counts[0].text.strip() != previous_count
+
+    return condition
 
-        # Setup Chrome with anti-detection measures
-        driver = setup_chrome()
-        wait = WebDriverWait(driver, 10)
 
-        # Go to Amazon
-        print("Navigating to Amazon...")
-        driver.get("https://www.amazon.com")
+def _add_to_cart(driver, search_term: str, base_url: str = AMAZON_URL) -> Dict[str, str]:
+    """Run the Amazon search and add-to-cart flow on a leased browser (blocking)."""
+    wait = WebDriverWait(driver, 10, poll_frequency=0.1)
+    trace = StepTrace("amazon_cart")
+
+    with trace.step("load"):
+        # Pooled sessions are already on the warm URL, and the search box is on every page
+        current, base = urlsplit(driver.current_url), urlsplit(base_url)
+        if (current.scheme, current.netloc) != (base.scheme, base.netloc):
+            print("Navigating to Amazon...")
+            driver.get(base_url)
+        wait.until(page_ready)
         print(f"Current URL: {driver.current_url}")
-        await asyncio.sleep(3)  # Wait for page to fully load
 
-        # Search for the item
+    # Search for the item
+    with trace.step("search"):
         print("Searching for item...")
-        search_box = wait.until(EC.presence_of_element_located((By.ID, "twotabsearchtextbox")))
-        await asyncio.sleep(1)
-        search_box.send_keys(search_details["search_term"])
-        await asyncio.sleep(0.5)
+        search_box = wait.until(EC.element_to_be_clickable((By.ID, "twotabsearchtextbox")))
+        search_box.clear()
+        search_box.send_keys(search_term)
         search_box.send_keys(Keys.RETURN)
+        wait.until(EC.staleness_of(search_box))
         print(f"Search results URL: {driver.current_url}")
-        await asyncio.sleep(3)
 
-        # Find any product link that wraps an s-image
-        product_selectors = [
-            ".s-result-item .s-image",  # Find the image first
-        ]
+    # Find any product link that wraps an s-image
+    product_selectors = [
+        ".s-result-item .s-image",  # Find the image first
+    ]
 
-        product_found = False
+    product_found = False
+    with trace.step("open_product"):
         for selector in product_selectors:
             try:
                 print(f"Trying selector: {selector}")
                 # Find all product images
-                images = wait.until(
-                    EC.presence_of_all_elements_located((By.CSS_SELECTOR, selector))
-                )
+                images = wait.until(EC.presence_of_all_elements_located((By.CSS_SELECTOR, selector)))
 
                 # Try clicking each product until one works
                 for image in images[:5]:  # Try first 5 products
                     try:
                         # Get the parent link of the image
                         parent_link = image.find_element(By.XPATH, "./ancestor::a[1]")
-
-                        # Ensure element is in viewport
-                        driver.execute_script("arguments[0].scrollIntoView(true);", parent_link)
-                        await asyncio.sleep(1)
-
-                        # Check if link is visible and clickable
-                        if parent_link.is_displayed() and parent_link.is_enabled():
-                            await click_with_retry(driver, parent_link)
+                        if parent_link.is_enabled():
+                            click_with_retry(driver, parent_link)
                             product_found = True
                             break
                     except (StaleElementReferenceException, ElementClickInterceptedException):
@@ -167,99 +185,136 @@ async def add_to_amazon_cart(query: str, max_retries: int = 3) -> Dict[str, str]
         if not product_found:
             raise Exception("Could not find any clickable product")
 
-        # After clicking product, get the product URL
-        product_url = driver.current_url
-        print(f"Product page URL: {product_url}")
-        await asyncio.sleep(3)
+        wait.until(EC.staleness_of(parent_link))
+        wait.until(page_ready)
 
-        # Try different selectors for product title
-        title_selectors = [
-            (By.ID, "productTitle"),
-            (By.CSS_SELECTOR, "h1.product-title-word-break"),
-        ]
+    # After clicking product, get the product URL
+    product_url = driver.current_url
+    print(f"Product page URL: {product_url}")
 
-        product_title = None
+    # Try different selectors for product title
+    title_selectors = [
+        (By.ID, "productTitle"),
+        (By.CSS_SELECTOR, "h1.product-title-word-break"),
+    ]
+
+    product_title = None
+    with trace.step("read_title"):
         for selector_type, selector_value in title_selectors:
             try:
-                title_element = wait.until(
-                    EC.presence_of_element_located((selector_type, selector_value))
-                )
+                title_element = wait.until(EC.presence_of_element_located((selector_type, selector_value)))
                 product_title = title_element.text.strip()
                 break
             except TimeoutException:
                 continue
 
-        if not product_title:
-            product_title = "Unknown Product"
+    if not product_title:
+        product_title = "Unknown Product"
 
-        # Try different selectors for Add to Cart button
-        cart_button_selectors = [
-            (By.ID, "add-to-cart-button"),
-            (By.NAME, "submit.add-to-cart"),
-            (By.CSS_SELECTOR, "#add-to-cart-button-ubb"),
-        ]
+    # Try different selectors for Add to Cart button
+    cart_button_selectors = [
+        (By.ID, "add-to-cart-button"),
+        (By.NAME, "submit.add-to-cart"),
+        (By.CSS_SELECTOR, "#add-to-cart-button-ubb"),
+    ]
 
-        cart_button = None
+    cart_button = None
+    with trace.step("find_cart_button"):
         for selector_type, selector_value in cart_button_selectors:
             try:
-                cart_button = wait.until(
-                    EC.element_to_be_clickable((selector_type, selector_value))
-                )
+                cart_button = wait.until(EC.element_to_be_clickable((selector_type, selector_value)))
                 break
             except TimeoutException:
                 continue
 
-        if not cart_button:
-            raise Exception("Could not find Add to Cart button")
-
-        # Click Add to Cart
-        await click_with_retry(driver, cart_button)
-        await asyncio.sleep(2)
+    if not cart_button:
+        raise Exception("Could not find Add to Cart button")
 
-        # Wait for cart confirmation
-        wait.until(EC.presence_of_element_located((By.ID, "nav-cart-count")))
+    # Click Add to Cart and wait for the cart to reflect it
+    with trace.step("add_to_cart"):
+        counts = driver.find_elements(By.ID, "nav-cart-count")
+        previous_count = counts[0].text.strip() if counts else ""
+        click_with_retry(driver, cart_button)
+        wait.until(cart_updated(previous_count))
         print("Successfully added to cart!")
-        await asyncio.sleep(2)
-
-        result = {
-            "status": "success",
-            "message": f"Successfully added {search_details['search_term']} to cart",
-            "product_title": product_title,
-            "product_url": product_url,
-        }
 
-    except Exception as e:
-        print(f"Error occurred: {str(e)}")
-        result = {"status": "error", "message": str(e), "product_title": None, "product_url": None}
-
-    finally:
-        if driver:
-            print("Closing browser...")
-            await asyncio.sleep(1)
-            driver.quit()
+    logger.info(trace.summary())
+    return {
+        "status": "success",
+        "message": f"Successfully added {search_term} to cart",
+        "product_title": product_title,
+        "product_url": product_url,
+        "timings": dict(trace.steps, total=trace.total),
+    }
 
-        return result
 
+async def add_to_amazon_cart(query: str) -> Dict[str, str]:
+    """
+    Searches Amazon on a pooled headless browser and adds the item to the cart.
+    Returns status, any error messages, the product title, and product URL.
+    """
+    try:
+        # Extract search details using LLM
+        search_details = await extract_search_details(query)
+        print(f"Search details extracted: {search_details}")
 
-# Move the process_wrapper function outside of run_amazon_cart_process
-def process_wrapper(query: str):
-    async def wrapper():
-        return await add_to_amazon_cart(query)
+        async with amazon_browser_pool.lease() as session:
+            # Selenium blocks, so drive the browser from a worker thread
+            return await asyncio.to_thread(
+                _add_to_cart, session.driver, search_details["search_term"]
+            )
 
-    return asyncio.run(wrapper())
+    except Exception as e:
+        print(f"Error occurred: {str(e)}")
+        return {"status": "error", "message": str(e), "product_title": None, "product_url": None}
 
 
 async def run_amazon_cart_process(query: str) -> bool:
     """
-    Runs the Amazon cart addition in a separate background process.
-    Returns the Process object for tracking.
+    Adds the requested item to the Amazon cart. Already runs as a background action,
+    so this simply awaits the pooled browser flow.
     """
-    process = Process(target=process_wrapper, args=(query,))
-    process.start()
-    print(f"Amazon cart process started: {process}")
-    return True
+    result = await add_to_amazon_cart(query)
+    return result["status"] == "success"
+
+
+async def handle_amazon_order(
+    transcript: str, participant_emails: list[str], arguments: Optional[AmazonOrderArgs] = None
+) -> bool:
+    """Action handler: use the extracted product query, or let the LLM find it in the transcript."""
+    return await run_amazon_cart_process(arguments.query if arguments else transcript)
+
+
+def run_fixture(search_term: str = "blue water bottle") -> Dict[str, str]:
+    """Run the cart flow against the local HTML fixture in testing/amazon_fixture and print its timings."""
+    driver = setup_headless_chrome()
+    try:
+        result = _add_to_cart(driver, search_term, base_url=FIXTURE_URL)
+    finally:
+        driver.quit()
+    for step, elapsed in result["timings"].items():
+        print(f"{step:>16}: {elapsed:.2f}s")
+    return result
 
 
 if __name__ == "__main__":
-    result = asyncio.run(add_to_amazon_cart("Find me a blue water bottle under $20"))
-    print(result.get("message"))
+    parser = argparse.ArgumentParser(description="Add an item to the Amazon cart")
+    parser.add_argument("query", nargs="?", default="Find me a blue water bottle under $20")
+    parser.add_argument(
+        "--fixture",
+        action="store_true",
+        help="Run against the local HTML fixture instead of amazon.com (no LLM call)",
+    )
+    args = parser.parse_args()
+
+    if args.fixture:
+        logging.basicConfig(level=logging.INFO)
+        print(run_fixture().get("message"))
+    else:
+
+        async def example():
+            result = await add_to_amazon_cart(args.query)
+            print(result.get("message"))
+            await amazon_browser_pool.stop()
+
+        asyncio.run(example())
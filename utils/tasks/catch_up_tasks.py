@@ -1,15 +1,48 @@
-import os
+import time
+from typing import Optional
 
-import litellm
+from utils.action_schemas import CatchMeUpArgs
+from utils.llm_router import llm_router
+from utils.meeting_segments import current_segments
 
 
-async def handle_catch_me_up(transcript: str) -> None:
+def catch_up_material(transcript: str, since: Optional[float] = None) -> str:
+    """
+    What to summarize: cached segment summaries plus the verbatim unsummarized tail, so the
+    prompt stays about the same size however long the meeting runs. Without live segments
+    (e.g. a transcript passed in directly) it's the transcript itself.
+    """
+    segments = current_segments.get()
+    if not segments:
+        return transcript
+
+    summarized, tail = segments.window(since)
+    parts = [
+        f"[minute {segments.minute_of(segment.start)}-{segments.minute_of(segment.end)}] {segment.summary}"
+        for segment in summarized
+    ]
+    material = ""
+    if parts:
+        material += "Summaries of the discussion, oldest first:\n" + "\n".join(parts) + "\n\n"
+    if tail:
+        material += "Most recent discussion, verbatim:\n" + "\n".join(u.text for u in tail)
+    return material or "Nothing has been said in that time."
+
+
+async def handle_catch_me_up(
+    transcript: str, participant_emails: Optional[list[str]] = None, arguments: Optional[CatchMeUpArgs] = None
+) -> Optional[str]:
     catch_up_prompt = """You are a helpful assistant that creates extremely concise meeting summaries. 
     Focus only on the key decisions and major points that a colleague would care about.
     Write like a human would message their coworker - be casual but professional.
     Limit your response to 2 sentences maximum.
     Don't use phrases like "In this meeting" or "The discussion covered" - just get straight to the point."""
 
+    # "Catch me up on the last 10 minutes" only covers that window
+    minutes = getattr(arguments, "minutes", None)
+    since = time.time() - minutes * 60 if minutes else None
+    material = catch_up_material(transcript, since)
+
     messages = [
         {
             "role": "system",
@@ -17,16 +50,12 @@ async def handle_catch_me_up(transcript: str) -> None:
         },
         {
             "role": "user",
-            "content": transcript,
+            "content": material,
         },
     ]
 
-    response = await litellm.acompletion(
-        model="groq/mixtral-8x7b-32768",  # or your preferred model
-        messages=messages,
-        api_key=os.getenv("GROQ_API_KEY"),
-    )
-
+    # No response cache: the material is already small, and a catch-up has to reflect what was just said
+    response = await llm_router.acompletion(messages=messages)
     return response.choices[0].message.content
 
 
@@ -1,9 +1,12 @@
 from re import T
-import litellm
-import json
-import os
 import logging
-from utils.api.google import GoogleAPI
+from typing import Optional
+from utils.action_outbox import PermanentActionError, calendar_event_id, current_idempotency_key, gmail_message_id
+from utils.action_schemas import CalendarEventArgs, EmailArgs
+from utils.api.google import aget_google_api
+from utils.contact_directory import contact_directory
+from utils.scheduler import get_scheduler
+from utils.structured_output import StructuredOutputError, structured_completion
 from datetime import datetime, timezone
 
 logger = logging.getLogger(__name__)
@@ -19,8 +22,11 @@ You must respond JSON format only with no additional text before or after. Use t
 {
     "to": [string],
     "subject": string,
-    "body": string
+    "body": string,
+    "send_at": string or null
 }
+
+Only set "send_at" if the user asked for the email to go out later (e.g. "send it at 3pm", "remind us tomorrow morning"). Use ISO format (e.g., "YYYY-MM-DDTHH:MM:SS+HH:MM").
 """
 
 calendar_system_prompt = """
@@ -45,73 +51,103 @@ You must respond JSON format only with no additional text before or after. Use t
 - ISO format (e.g., "YYYY-MM-DDTHH:MM:SS+HH:MM")
 """
 
-async def handle_email_creation(transcript: str) -> bool:
+async def handle_email_creation(
+    transcript: str, participant_emails: list[str], arguments: Optional[EmailArgs] = None
+) -> bool:
     try:
         logger.info("Processing email creation request")
-        current_time = datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
-        
-        logger.info("Calling LLM...")
-        messages = [
-            {
-                "role": "system",
-                "content": email_system_prompt,
-            },
-            {"role": "user", "content": f"The current UTC time is: {current_time}\n\n{transcript}"},
-        ]
-
-        response = litellm.completion(
-            model = "groq/llama-3.3-70b-versatile",
-            messages=messages,
-            api_key=os.getenv("GROQ_API_KEY")
-        )
-        
-        response_content = response.choices[0].message.content
-        response_json = json.loads(response_content)
+
+        if arguments is not None:
+            # The agent already extracted validated arguments, skip the second LLM call
+            response_json = arguments.model_dump()
+        else:
+            current_time = datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+
+            logger.info("Calling LLM...")
+            messages = [
+                {
+                    "role": "system",
+                    "content": email_system_prompt,
+                },
+                {"role": "user", "content": f"The current UTC time is: {current_time}\n\nParticipant Emails: {participant_emails}\n\nTranscript: {transcript}"},
+            ]
+
+            extracted = await structured_completion(messages, "email_creation", EmailArgs)
+            response_json = extracted.model_dump()
         
         to = response_json.get("to", [])
         subject = response_json.get("subject", None)
         body = response_json.get("body", None)
         
         if not (to and subject and body):
-            logger.error("Missing required fields in response")
-            return False
-        
-        google_api = GoogleAPI()
-        authenticated = google_api.authenticate()
-        if not authenticated:
-            logger.error("Failed to authenticate with Google")
-            return False
-        
-        google_api.send_email(to, subject, body)
-        logger.info("Email sent successfully")
-        
-        return True
+            raise PermanentActionError("Missing required fields in response")
+
+        # Spoken names ("send it to Lisa") are resolved from the preloaded contact directory
+        to, unresolved = contact_directory.resolve_all(to)
+        if unresolved:
+            raise PermanentActionError(f"Could not resolve recipients: {unresolved}")
+
+        send_at = response_json.get("send_at")
+        if send_at:
+            when = datetime.fromisoformat(send_at.replace("Z", "+00:00"))
+            if when.tzinfo is None:
+                when = when.replace(tzinfo=timezone.utc)
+            if when > datetime.now(timezone.utc):
+                # Keyed on the outbox entry, so a replayed action doesn't schedule a second send
+                get_scheduler().schedule_at(
+                    when,
+                    "utils.tasks.google_tasks:deliver_email",
+                    {"to": to, "subject": subject, "body": body},
+                    job_id=current_idempotency_key.get(),
+                )
+                logger.info(f"Email scheduled for {when.isoformat()}")
+                return True
+
+        return await deliver_email(to, subject, body)
+    except (PermanentActionError, StructuredOutputError):
+        raise
     except Exception as e:
         logger.exception(f"Error processing email creation: {e}")
         return False
 
-async def handle_calendar_event(transcript: str, participant_emails: list[str]) -> bool:
+
+async def deliver_email(to: list[str], subject: str, body: str) -> bool:
+    """Send an email right away. Also the scheduler target for emails sent later."""
+    # Replays of the same outbox entry or scheduled job reuse the Message-ID, so Gmail never gets it twice
+    key = current_idempotency_key.get()
+    google_api = await aget_google_api()
+    if not await google_api.asend_email(
+        to, subject, body, message_id=gmail_message_id(key) if key else None
+    ):
+        logger.error("Failed to send email")
+        return False
+    logger.info("Email sent successfully")
+    return True
+
+
+async def handle_calendar_event(
+    transcript: str, participant_emails: list[str], arguments: Optional[CalendarEventArgs] = None
+) -> bool:
     try:
         logger.info("Processing calendar event creation request")
-        current_time = datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
-        
-        logger.info("Calling LLM...")
-        messages = [
-            {
-                "role": "system",
-                "content": calendar_system_prompt,
-            },
-            {"role": "user", "content": f"The current UTC time is: {current_time}\n\nParticipant Emails: {participant_emails}\n\nTranscript: {transcript}"},
-        ]
-
-        response = litellm.completion(
-            model = "groq/llama-3.3-70b-versatile",
-            messages=messages,
-            api_key=os.getenv("GROQ_API_KEY")
-        )
-        
-        response_content = response.choices[0].message.content
-        response_json = json.loads(response_content)
+
+        if arguments is not None:
+            # The agent already extracted validated arguments, skip the second LLM call
+            response_json = arguments.model_dump()
+        else:
+            current_time = datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+
+            logger.info("Calling LLM...")
+            messages = [
+                {
+                    "role": "system",
+                    "content": calendar_system_prompt,
+                },
+                {"role": "user", "content": f"The current UTC time is: {current_time}\n\nParticipant Emails: {participant_emails}\n\nTranscript: {transcript}"},
+            ]
+
+            extracted = await structured_completion(messages, "calendar_event", CalendarEventArgs)
+            response_json = extracted.model_dump()
         
         title = response_json.get("title", None)
         location = response_json.get("location", None)
@@ -129,19 +165,30 @@ async def handle_calendar_event(transcript: str, participant_emails: list[str])
                 'attendee_emails': attendee_emails
             }
             missing_fields = [field for field, value in field_checks.items() if not value]
-            logger.error(f"Missing required fields in response: {missing_fields}")
-            return False
+            raise PermanentActionError(f"Missing required fields in response: {missing_fields}")
+
+        attendee_emails, unresolved = contact_directory.resolve_all(attendee_emails)
+        if unresolved:
+            raise PermanentActionError(f"Could not resolve attendees: {unresolved}")
         
-        google_api = GoogleAPI()
-        authenticated = google_api.authenticate()
-        if not authenticated:
-            logger.error("Failed to authenticate with Google")
+        key = current_idempotency_key.get()
+        google_api = await aget_google_api()
+        if not await google_api.acreate_event(
+            title,
+            location,
+            description,
+            start_time,
+            end_time,
+            attendee_emails,
+            event_id=calendar_event_id(key) if key else None,
+        ):
+            logger.error("Failed to create calendar event")
             return False
-        
-        google_api.create_event(title, location, description, start_time, end_time, attendee_emails)
         logger.info("Calendar event created successfully")
         
         return True
+    except (PermanentActionError, StructuredOutputError):
+        raise
     except Exception as e:
         logger.exception(f"Error processing email creation: {e}")
         return False
\ No newline at end of file
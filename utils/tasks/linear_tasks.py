@@ -1,8 +1,9 @@
-import litellm
-import json
-import os
 import logging
-from utils.api.linear import create_linear_issue
+from typing import Optional
+from utils.action_schemas import LinearTaskArgs
+from utils.action_outbox import PermanentActionError, current_idempotency_key, linear_issue_id
+from utils.api.linear import linear_client
+from utils.structured_output import StructuredOutputError, structured_completion
 from datetime import datetime, timezone
 
 logger = logging.getLogger(__name__)
@@ -32,41 +33,51 @@ Date format:
 - ISO 8601 format (e.g., "2024-03-25")
 """
 
-async def handle_new_linear_task(transcript: str) -> bool:
+async def handle_new_linear_task(
+    transcript: str, participant_emails: list[str], arguments: Optional[LinearTaskArgs] = None
+) -> bool:
     try:
         logger.info("Processing new linear task creation request")
-        current_time = datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
-        
-        print("Calling LLM...")
-        messages = [
-            {
-                "role": "system",
-                "content": new_task_system_prompt,
-            },
-            {"role": "user", "content": f"The current UTC time is: {current_time}\n\n{transcript}"},
-        ]
 
-        response = litellm.completion(
-            model = "groq/llama-3.3-70b-versatile",
-            messages=messages,
-            api_key=os.getenv("GROQ_API_KEY")
-        )
-        
-        response_content = response.choices[0].message.content
-        response_json = json.loads(response_content)
+        if arguments is not None:
+            # The agent already extracted validated arguments, skip the second LLM call
+            response_json = arguments.model_dump()
+        else:
+            current_time = datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+
+            print("Calling LLM...")
+            messages = [
+                {
+                    "role": "system",
+                    "content": new_task_system_prompt,
+                },
+                {"role": "user", "content": f"The current UTC time is: {current_time}\n\n{transcript}"},
+            ]
+
+            extracted = await structured_completion(messages, "linear_task", LinearTaskArgs)
+            response_json = extracted.model_dump()
         
         title = response_json.get("title", None)
         description = response_json.get("description", None)
         priority = response_json.get("priority", None)
         due_date = response_json.get("due_date", None)
         
-        if not (title and description and priority and due_date):
-            logger.error("Missing required fields in response")
-            return False
+        if not (title and description and priority is not None and due_date):
+            raise PermanentActionError("Missing required fields in response")
         
-        create_linear_issue(title, description, priority, due_date)
+        key = current_idempotency_key.get()
+        issue = await linear_client.create_issue(
+            title,
+            description=description,
+            priority=priority,
+            due_date=due_date,
+            issue_id=linear_issue_id(key) if key else None,
+        )
+        logger.info(f"Created Linear issue {issue['identifier']}")
         
         return True
+    except (PermanentActionError, StructuredOutputError):
+        raise
     except Exception as e:
         logger.exception(f"Error processing new linear task creation: {e}")
         return False
\ No newline at end of file
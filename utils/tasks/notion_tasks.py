@@ -1,8 +1,9 @@
-import litellm
-import json
-import os
 import logging
+from typing import Optional
+from utils.action_outbox import PermanentActionError
+from utils.action_schemas import NoteArgs
 from utils.api.notion import create_note
+from utils.structured_output import StructuredOutputError, structured_completion
 
 logger = logging.getLogger(__name__)
 
@@ -19,38 +20,39 @@ You must respond JSON format only with no additional text before or after. Use t
 }
 """
 
-async def handle_new_notion_note(transcript: str) -> bool:
+async def handle_new_notion_note(
+    transcript: str, participant_emails: list[str], arguments: Optional[NoteArgs] = None
+) -> bool:
     try:
         logger.info("Processing new notion note creation request")
-        
-        print("Calling LLM...")
-        messages = [
-            {
-                "role": "system",
-                "content": new_note_system_prompt,
-            },
-            {"role": "user", "content": transcript},
-        ]
 
-        response = litellm.completion(
-            model = "groq/llama-3.3-70b-versatile",
-            messages=messages,
-            api_key=os.getenv("GROQ_API_KEY")
-        )
-        
-        response_content = response.choices[0].message.content
-        response_json = json.loads(response_content)
+        if arguments is not None:
+            # The agent already extracted validated arguments, skip the second LLM call
+            response_json = arguments.model_dump()
+        else:
+            print("Calling LLM...")
+            messages = [
+                {
+                    "role": "system",
+                    "content": new_note_system_prompt,
+                },
+                {"role": "user", "content": transcript},
+            ]
+
+            extracted = await structured_completion(messages, "note_creation", NoteArgs)
+            response_json = extracted.model_dump()
         
         title = response_json.get("title", None)
         content = response_json.get("content", None)
         
         if not (title and content):
-            logger.error("Missing required fields in response")
-            return False
+            raise PermanentActionError("Missing required fields in response")
         
-        create_note(title, content)
+        await create_note(title, content)
         
         return True
+    except (PermanentActionError, StructuredOutputError):
+        raise
     except Exception as e:
-        logger.exception(f"Error processing new linear task creation: {e}")
+        logger.exception(f"Error processing new notion note creation: {e}")
         return False
\ No newline at end of file